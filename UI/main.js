@@ -172,6 +172,8 @@ const app = {
                     videos: c.videos || null,
                     question: (c.check && c.check.question) ? c.check.question : '',
                     keywords: (c.check && c.check.keywords) ? c.check.keywords : [],
+                    synonyms: (c.check && c.check.synonyms) ? c.check.synonyms : null,
+                    version: c.version || null,
                     desired_answer: (c.check && c.check.desired_answer) ? c.check.desired_answer : ''
                 }))
             }));
@@ -429,6 +431,8 @@ const app = {
             const TEST_URL = 'https://cdnjs.cloudflare.com/ajax/libs/three.js/r128/three.min.js'; // ~600KB
             let totalSpeed = 0;
             let successCount = 0;
+            let totalBytes = 0;
+            let totalSeconds = 0;
 
             console.log(`[SpeedTest] Starting ${SAMPLES}-sample test...`);
 
@@ -452,6 +456,8 @@ const app = {
                     console.log(`[SpeedTest] Sample ${i + 1}: ${sampleSpeed.toFixed(2)} MB/s`);
                     totalSpeed += sampleSpeed;
                     successCount++;
+                    totalBytes += blob.size;
+                    totalSeconds += durationInSeconds;
 
                     // Small breather to avoid saturating buffer
                     await new Promise(r => setTimeout(r, 100));
@@ -471,6 +477,17 @@ const app = {
             // LOW: < 0.4 (~3 Mbps)
             // AVERAGE: 0.4 - 1.2 (~3 - 10 Mbps)
             // HIGH: > 1.2 (~10+ Mbps)
+            // Let the engine's background sync plan around the same measurement
+            try {
+                await fetch(`${API_BASE}/api/network/sample`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ bytes: totalBytes, seconds: totalSeconds })
+                });
+            } catch (err) {
+                console.warn('[SpeedTest] Could not report sample to engine:', err);
+            }
+
             if (this.speedMBps < 0.4) {
                 this.networkQuality = 'LOW';
             } else if (this.speedMBps < 1.2) {
@@ -833,12 +850,32 @@ const app = {
         const keywords = concept.keywords;
         const feedback = document.getElementById('feedback');
 
-        // Case-insensitive matching: lowercase both for comparison
-        const missing = keywords.filter(k => !input.includes(k.toLowerCase().trim()));
-        const correct = missing.length === 0;
+        // The engine's verdict (keywords, synonyms, similarity) decides; plain substring matching is the offline fallback
+        let missing, correct, confidence = null;
+        try {
+            const res = await fetch(`${API_BASE}/api/check_answer`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    concept_id: concept.id,
+                    version: concept.version,
+                    keywords,
+                    synonyms: concept.synonyms,
+                    answer: input
+                })
+            });
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            const data = await res.json();
+            missing = data.missing || [];
+            correct = Boolean(data.correct);
+            confidence = data.confidence ?? null;
+        } catch (e) {
+            missing = keywords.filter(k => !input.includes(k.toLowerCase().trim()));
+            correct = missing.length === 0;
+        }
 
         if (!correct) {
-            console.log(`❌ [Debug] Answer mismatch. Missing keywords:`, missing);
+            console.log(`❌ [Debug] Answer mismatch (confidence ${confidence ?? 'n/a'}). Missing keywords:`, missing);
             console.log(`📥 [Debug] User input was: "${input}"`);
         }
 
@@ -973,7 +1010,16 @@ const app = {
                 })
             });
 
-            const data = await res.json();
+            let data = await res.json();
+            // Generation runs as a background job; long-poll until it settles
+            while (data.status === 'queued' || data.status === 'running') {
+                const jobRes = await fetch(`${API_BASE}/api/jobs/${data.job_id || data.id}?wait=25`);
+                const job = (await jobRes.json()).job;
+                if (!job) throw new Error('Generation job was lost');
+                data = job.status === 'done'
+                    ? { status: 'ok', ...job.result }
+                    : (job.status === 'failed' ? { error: job.error } : job);
+            }
             if (data.status === 'ok') {
                 console.log(`✨ [AI] Content Ready: ${data.lesson_id}`);
                 // Hot refresh lessons and start
@@ -1381,6 +1427,13 @@ const app = {
                 return;
             }
 
+            const installBtn = document.createElement('button');
+            installBtn.className = 'add-btn';
+            installBtn.style.marginBottom = '1rem';
+            installBtn.textContent = 'DOWNLOAD COURSE';
+            installBtn.onclick = () => this.installCourse(course.id, installBtn);
+            container.appendChild(installBtn);
+
             subjects.forEach((subject, idx) => {
                 const subjDiv = document.createElement('div');
                 subjDiv.style.border = '1px solid var(--border)';
@@ -1638,6 +1691,36 @@ const app = {
         };
     },
 
+    /**
+     * Install a whole course in one engine-side job, polling its aggregate progress
+     */
+    installCourse: async function (courseId, button) {
+        button.disabled = true;
+        try {
+            const res = await fetch(`${API_BASE}/api/courses/${courseId}/install`, { method: 'POST' });
+            if (!res.ok) throw new Error('Failed to start course download');
+            let progress = (await res.json()).progress || {};
+            while (['resolving', 'downloading', 'installing'].includes(progress.phase)) {
+                button.textContent = progress.phase === 'downloading' && progress.files_total
+                    ? `DOWNLOADING ${progress.files_done}/${progress.files_total}...`
+                    : `${progress.phase.toUpperCase()}...`;
+                await new Promise(r => setTimeout(r, 1000));
+                const poll = await fetch(`${API_BASE}/api/courses/${courseId}/install`);
+                progress = (await poll.json()).progress || {};
+            }
+            if (progress.phase === 'failed') throw new Error(progress.error || 'Course download failed');
+            button.textContent = progress.status === 'installed'
+                ? 'COURSE DOWNLOADED'
+                : `PARTIAL (${progress.lessons}/${progress.lessons_total}) - RETRY`;
+            this.loadLessons();
+        } catch (err) {
+            button.textContent = 'DOWNLOAD COURSE';
+            alert(err.message);
+        } finally {
+            button.disabled = false;
+        }
+    },
+
     downloadCloudItem: async function (id, type, title) {
         alert(`Download request queued for "${title}". Check the Updates tab or refresh soon.`);
         try {
@@ -1658,6 +1741,7 @@ const app = {
      */
     tutorHistory: [],
     tutorFileContent: null,
+    tutorDocumentId: null,
     tutorSelectedLessonContext: null,
 
     initAITutor: async function () {
@@ -1717,19 +1801,41 @@ const app = {
         const file = event.target.files[0];
         if (!file) return;
 
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            this.tutorFileContent = e.target.result.substring(0, 5000); // Limit size
+        const showPreview = () => {
             const preview = document.getElementById('file-preview-area');
             const previewText = preview.querySelector('.preview-text');
             preview.style.display = 'flex';
             if (previewText) previewText.textContent = `Attached: ${file.name} (${Math.round(file.size / 1024)}KB)`;
         };
+
+        // Upload once to the engine's document library; chat turns then send only the id
+        if (this.currentUser) {
+            const url = `${API_BASE}/api/ai_tutor/documents?user_id=${encodeURIComponent(this.currentUser.id)}&name=${encodeURIComponent(file.name)}`;
+            fetch(url, { method: 'POST', headers: { 'Content-Type': 'text/plain' }, body: file })
+                .then(res => res.ok ? res.json() : Promise.reject(res.status))
+                .then(data => {
+                    this.tutorDocumentId = data.document.id;
+                    this.tutorFileContent = null;
+                    showPreview();
+                })
+                .catch(() => this.readTutorFileInline(file, showPreview));
+            return;
+        }
+        this.readTutorFileInline(file, showPreview);
+    },
+
+    readTutorFileInline: function (file, onDone) {
+        const reader = new FileReader();
+        reader.onload = (e) => {
+            this.tutorFileContent = e.target.result.substring(0, 5000); // Limit size
+            onDone();
+        };
         reader.readAsText(file);
     },
 
     removeTutorFile: function () {
         this.tutorFileContent = null;
+        this.tutorDocumentId = null;
         document.getElementById('file-preview-area').style.display = 'none';
         document.getElementById('tutor-file-upload').value = '';
     },
@@ -1817,10 +1923,11 @@ const app = {
                 user_id: this.currentUser.id,
                 prompt: text,
                 lesson_context: this.tutorSelectedLessonContext,
-                file_text: this.tutorFileContent
+                file_text: this.tutorFileContent,
+                document_id: this.tutorDocumentId
             };
 
-            const res = await fetch(`${API_BASE}/api/ai_tutor/chat`, {
+            const res = await fetch(`${API_BASE}/api/ai_tutor/chat/stream`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(payload)
@@ -1828,22 +1935,32 @@ const app = {
 
             if (!res.ok) throw new Error(await res.text());
 
-            const data = await res.json();
+            // Render AI reply token by token as SSE frames arrive
+            const reply = { role: 'assistant', content: '' };
+            let started = false;
+            await this.readChatStream(res, (delta) => {
+                if (!started) {
+                    started = true;
+                    const loadingEl = document.getElementById('chat-loading');
+                    if (loadingEl) loadingEl.remove();
+                    this.tutorHistory.push(reply);
+                }
+                reply.content += delta;
+                this.renderChatHistory();
+            });
 
-            // Remove loading
+            // Remove loading (empty stream)
             const loadingEl = document.getElementById('chat-loading');
             if (loadingEl) loadingEl.remove();
 
-            // Render AI reply
-            this.tutorHistory.push({ role: 'assistant', content: data.reply });
-            this.renderChatHistory();
-
-            // Clear file attach after sending
-            this.tutorFileContent = null;
-            const previewArea = document.getElementById('file-preview-area');
-            if (previewArea) previewArea.style.display = 'none';
-            const uploadInput = document.getElementById('tutor-file-upload');
-            if (uploadInput) uploadInput.value = '';
+            // Inline attachments are one-shot; stored documents stay attached
+            if (!this.tutorDocumentId) {
+                this.tutorFileContent = null;
+                const previewArea = document.getElementById('file-preview-area');
+                if (previewArea) previewArea.style.display = 'none';
+                const uploadInput = document.getElementById('tutor-file-upload');
+                if (uploadInput) uploadInput.value = '';
+            }
 
         } catch (e) {
             const loader = document.getElementById('chat-loading');
@@ -1858,6 +1975,27 @@ const app = {
         }
     },
 
+    readChatStream: async function (res, onDelta) {
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                if (frame.startsWith('event: done')) return;
+                const dataLine = frame.split('\n').find(l => l.startsWith('data:'));
+                if (!dataLine) continue;
+                const msg = JSON.parse(dataLine.slice(5));
+                if (msg.delta) onDelta(msg.delta);
+            }
+        }
+    },
+
     /**
      * EXAM STUDY SCHEDULER WIZARD
      */
@@ -161,6 +161,88 @@ class AdaptiveService:
 
             return {"status": "ok", "new_mastery": p_new}
 
+    def _get_local_many(self, user_id, concept_ids):
+        conn = sqlite3.connect(self.local_db)
+        cur = conn.cursor()
+        placeholders = ",".join("?" * len(concept_ids))
+        cur.execute(
+            f"SELECT concept_id, mastery_probability FROM local_mastery WHERE user_id=? AND concept_id IN ({placeholders})",
+            [str(user_id)] + list(concept_ids)
+        )
+        rows = dict(cur.fetchall())
+        conn.close()
+        return rows
+
+    def _get_cloud_many(self, user_id, concept_ids):
+        """Cloud mastery for several concepts in one request; {} when offline."""
+        ids = ",".join(f'"{cid}"' for cid in concept_ids)
+        try:
+            res = requests.get(
+                f"{self.url}/rest/v1/delivery_user_profiles?user_id=eq.{user_id}&concept_id=in.({ids})&select=concept_id,mastery_probability",
+                headers=self.headers,
+                timeout=2
+            )
+            if res.ok:
+                return {row['concept_id']: row['mastery_probability'] for row in res.json()}
+        except Exception:
+            print(f"📡 [Adaptive] Cloud unavailable, grading session against Local storage.")
+        return {}
+
+    def log_session(self, user_id, answers):
+        """
+        Apply a whole session of graded answers ({'concept_id', 'correct', ...})
+        in order. Starting mastery is read once, every update is applied in
+        memory and the final values are written in a single transaction.
+        Returns (per-answer results, final mastery by concept).
+        """
+        concept_ids = list(dict.fromkeys(str(a['concept_id']) for a in answers))
+        if not concept_ids:
+            return [], {}
+        mastery = self._get_local_many(user_id, concept_ids)
+        mastery.update(self._get_cloud_many(user_id, concept_ids))
+
+        results = []
+        for a in answers:
+            cid = str(a['concept_id'])
+            before = mastery.get(cid, 0.1)
+            mastery[cid] = BKTModel.simple_update(before, a.get('correct', False))
+            results.append({"concept_id": cid, "mastery_before": before, "mastery_after": mastery[cid]})
+        final = {cid: mastery[cid] for cid in concept_ids}
+
+        # 1. Always Save Locally First (Offline-Ready), all or nothing
+        now = datetime.now().isoformat()
+        conn = sqlite3.connect(self.local_db)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO local_mastery (user_id, concept_id, mastery_probability, last_updated)
+                    VALUES (?, ?, ?, ?)
+                """, [(str(user_id), cid, p, now) for cid, p in final.items()])
+        finally:
+            conn.close()
+        print(f"🧮 [Adaptive] Session of {len(answers)} answers applied for user {user_id}")
+
+        # 2. Try to sync logs and final mastery to Supabase, one request each
+        try:
+            events = [{**a, "user_id": user_id, "event_type": "answer"} for a in answers]
+            log_res = requests.post(f"{self.url}/rest/v1/delivery_interaction_logs",
+                                    headers=self.headers, json=events, timeout=5)
+            if not log_res.ok:
+                print(f"⚠️ [Adaptive] Cloud Log failed: {log_res.text}")
+            m_res = requests.post(
+                f"{self.url}/rest/v1/delivery_user_profiles",
+                headers={**self.headers, "Prefer": "resolution=merge-duplicates"},
+                json=[{"user_id": str(user_id), "concept_id": cid, "mastery_probability": p, "last_updated": "now()"}
+                      for cid, p in final.items()],
+                timeout=5
+            )
+            if not m_res.ok:
+                print(f"❌ [Adaptive] Cloud sync failed: {m_res.text}")
+        except Exception:
+            print(f"📡 [Adaptive] No internet connection. Session mastery saved locally only.")
+
+        return results, final
+
     def reset_mastery(self, user_id):
         """Wipe all local mastery records for a user."""
         try:
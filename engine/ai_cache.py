@@ -0,0 +1,144 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+# Cached replies older than this are treated as misses and dropped
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Upper bound on stored replies; least recently used entries are evicted first
+CACHE_MAX_ENTRIES = 2000
+
+
+def normalize_prompt(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key."""
+    text = (text or "").lower()
+    text = re.sub(r"[^\w\s]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _digest(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model, prompt, lesson_context=None, file_text=None, document_hash=None, history=None):
+    """
+    Key a reply by model, normalized prompt and a hash of each context
+    source, including the prior conversation (`history`, a list of
+    {'role', 'content'}) the reply was generated from.
+    """
+    parts = [model, normalize_prompt(prompt), _digest(lesson_context), _digest(file_text)]
+    if document_hash:
+        parts.append(document_hash)
+    if history:
+        parts.append(_digest("\x1e".join(f"{m['role']}:{m['content']}" for m in history)))
+    return _digest("\x1f".join(parts))
+
+
+class AIResponseCache:
+    """Persistent SQLite cache for AI replies with TTL expiry and LRU eviction."""
+
+    def __init__(self, db_path, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "stores": 0}
+        self._init_db()
+
+    def _init_db(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_response_cache_access
+                ON ai_response_cache (last_access)
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error initializing AI response cache: {e}")
+
+    def _bump(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def get(self, key):
+        """Return the cached reply for `key`, or None on a miss or expired entry."""
+        try:
+            now = time.time()
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute('SELECT reply, created_at FROM ai_response_cache WHERE cache_key = ?', (key,))
+            row = cur.fetchone()
+            if row and now - row[1] > self.ttl:
+                cur.execute('DELETE FROM ai_response_cache WHERE cache_key = ?', (key,))
+                conn.commit()
+                self._bump("expired")
+                row = None
+            if row:
+                cur.execute(
+                    'UPDATE ai_response_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                    (now, key)
+                )
+                conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error reading AI response cache: {e}")
+            row = None
+
+        self._bump("hits" if row else "misses")
+        return row[0] if row else None
+
+    def put(self, key, model, reply):
+        """Store a reply and evict least recently used entries beyond max_entries."""
+        try:
+            now = time.time()
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute('''
+                INSERT OR REPLACE INTO ai_response_cache (cache_key, model, reply, created_at, last_access, hit_count)
+                VALUES (?, ?, ?, ?, ?, 0)
+            ''', (key, model, reply, now, now))
+            cur.execute('SELECT COUNT(*) FROM ai_response_cache')
+            overflow = cur.fetchone()[0] - self.max_entries
+            if overflow > 0:
+                cur.execute('''
+                    DELETE FROM ai_response_cache WHERE cache_key IN (
+                        SELECT cache_key FROM ai_response_cache ORDER BY last_access ASC LIMIT ?
+                    )
+                ''', (overflow,))
+                self._bump("evictions", overflow)
+            conn.commit()
+            conn.close()
+            self._bump("stores")
+        except Exception as e:
+            print(f"Error writing AI response cache: {e}")
+
+    def stats(self):
+        """Hit/miss counters since startup plus current cache size."""
+        with self._lock:
+            out = dict(self._stats)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute('SELECT COUNT(*) FROM ai_response_cache')
+            out["entries"] = cur.fetchone()[0]
+            conn.close()
+        except Exception:
+            out["entries"] = None
+        out["max_entries"] = self.max_entries
+        out["ttl_seconds"] = self.ttl
+        return out
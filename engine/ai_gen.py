@@ -1,6 +1,13 @@
 import requests
 import json
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_metrics import estimate_prompt_tokens, estimate_tokens, metrics, outcome_for
+from llm_output import JSONStreamParser, iter_sse_deltas, parse_json
+from model_router import AllModelsFailed, Cancelled, ModelRouter, cancelled, models_from_env
 
 # Load environment variables for local development
 try:
@@ -18,87 +25,262 @@ except Exception:
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "").strip()
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL = os.environ.get("OPENROUTER_MODEL", "google/gemini-2.0-flash-lite-preview-02-05:free").strip()
+# Upper bound on a single generation request; hedging covers the slow tail
+GENERATION_TIMEOUT = 120
+
+# Parallel per-concept calls per lesson, and extra attempts for a concept that fails validation
+CONCEPT_CONCURRENCY = int(os.environ.get("AI_GEN_CONCEPT_CONCURRENCY", "4"))
+CONCEPT_RETRIES = 2
+
+router = ModelRouter(models_from_env(MODEL))
+
+MODE_RULES = {
+    "Beginner": (
+        "1. Simplify explanations. Use analogies and very clear language.\n"
+        "2. Focus on foundational concepts.\n"
+        "3. Make questions easier but still testing core concepts.\n"
+        "4. Keywords must be in lowercase."
+    ),
+    "Advance": (
+        "1. Add deeper technical details or more complex applications.\n"
+        "2. Make questions significantly more challenging (multi-step or critical thinking).\n"
+        "3. Keywords must be in lowercase."
+    ),
+}
+
+SYSTEM_MSG = "You are a specialized educational content generator. You output only structured JSON."
+
+CONCEPT_SCHEMA = """{
+    "name": "Concept Name",
+    "explain": "...",
+    "example": "...",
+    "check": {
+        "question": "...",
+        "desired_answer": "...",
+        "keywords": ["lowercase_key1", "lowercase_key2"]
+    }
+}"""
+
+
+def _compact(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _parse(feature, content):
+    """Recover the JSON value from model output, logging when it needed repair."""
+    value, repaired = parse_json(content, openers="{")
+    if repaired:
+        print(f"🩹 [{feature}] Repaired malformed JSON output")
+    return value
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "_", (text or "").lower()).strip("_") or "concept"
+
+
+def validate_concept(concept):
+    """Return a list of problems with a generated concept (empty when valid)."""
+    if not isinstance(concept, dict):
+        return ["not an object"]
+    problems = [f"missing {k}" for k in ("name", "explain", "example") if not isinstance(concept.get(k), str) or not concept[k].strip()]
+    check = concept.get("check")
+    if not isinstance(check, dict):
+        return problems + ["missing check"]
+    for k in ("question", "desired_answer"):
+        if not isinstance(check.get(k), str) or not check[k].strip():
+            problems.append(f"missing check.{k}")
+    keywords = check.get("keywords")
+    if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) and k.strip() for k in keywords):
+        problems.append("check.keywords must be a non-empty list of strings")
+    return problems
+
+
+def _call(feature, prompt):
+    """
+    One routed, metered, streamed completion; returns the raw message
+    content, read only up to the end of the first JSON value.
+    """
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "http://localhost:8000",
+        "Referer": "http://localhost:8000",
+        "X-Title": "Bright Study Local",
+        "Origin": "http://localhost:8000",
+        "Content-Type": "application/json"
+    }
+    messages = [
+        {"role": "system", "content": SYSTEM_MSG},
+        {"role": "user", "content": prompt}
+    ]
+
+    def send(model):
+        start = time.monotonic()
+        usage = {}
+        # Every generation prompt asks for an object
+        parser = JSONStreamParser(openers="{")
+        parts = []
+        try:
+            response = requests.post(
+                OPENROUTER_URL,
+                headers=headers,
+                json={"model": model, "messages": messages, "stream": True,
+                      "stream_options": {"include_usage": True}},
+                timeout=GENERATION_TIMEOUT,
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+                for delta in iter_sse_deltas(response, usage):
+                    # Another model already answered: stop paying for this one
+                    if cancelled():
+                        raise Cancelled(f"{model} lost the race")
+                    parts.append(delta)
+                    # Anything after the closing brace is prose we don't need
+                    if parser.feed(delta):
+                        break
+            finally:
+                response.close()
+            content = "".join(parts)
+            if not content:
+                raise ValueError("Empty completion")
+        except Exception as e:
+            metrics.record(feature, model, time.monotonic() - start,
+                           "cancelled" if isinstance(e, Cancelled) else outcome_for(e),
+                           estimate_prompt_tokens(messages))
+            raise
+        metrics.record(feature, model, time.monotonic() - start, "ok",
+                       usage.get("prompt_tokens") or estimate_prompt_tokens(messages),
+                       usage.get("completion_tokens") or estimate_tokens(content))
+        return content
+
+    model, content = router.call(send)
+    print(f"🧠 [{feature}] answered by {model}")
+    return content
+
 
 class AIGenService:
+    @staticmethod
+    def generate_outline(original_lesson, mode):
+        """
+        Lesson-level fields for the new variant: title, intro, outro and, in
+        'Advance' mode, names of 1-2 new related concepts.
+        """
+        summary = {
+            "title": original_lesson.get("title"),
+            "intro": original_lesson.get("intro"),
+            "outro": original_lesson.get("outro"),
+            "concepts": [c.get("name") or c.get("id") for c in original_lesson.get("concepts", []) if isinstance(c, dict)],
+        }
+        extra = (
+            '"new_concepts": ["Name of a related advanced concept"] (1-2 entries)'
+            if mode == "Advance" else '"new_concepts": []'
+        )
+        prompt = (
+            f"Rewrite the lesson-level text of this lesson for a student in '{mode}' mode.\n"
+            f"Append ' ({mode})' to the title.\n"
+            "Return ONLY valid JSON: "
+            f'{{"title": "...", "intro": "...", "outro": "...", {extra}}}\n\n'
+            f"LESSON: {_compact(summary)}"
+        )
+        outline = _parse("lesson_outline", _call("lesson_outline", prompt))
+        if not isinstance(outline, dict) or not outline.get("title"):
+            raise ValueError("Outline is missing a title")
+        return outline
+
+    @staticmethod
+    def generate_concept(concept, mode, lesson_title, feedback=None):
+        """
+        Rewrite one concept (or, given only a name, write a new one) for
+        `mode`. `feedback` names what was wrong with a previous attempt.
+        """
+        prompt = (
+            f"Rewrite this concept from the lesson '{lesson_title}' for a student in '{mode}' mode.\n"
+            f"RULES:\n{MODE_RULES[mode]}\n"
+            f"Return ONLY valid JSON with exactly this structure:\n{CONCEPT_SCHEMA}\n\n"
+            f"CONCEPT: {_compact(concept)}"
+        )
+        if feedback:
+            prompt += f"\n\nYour previous answer was rejected ({feedback}). Return the complete JSON object."
+        generated = _parse("concept_generation", _call("concept_generation", prompt))
+        problems = validate_concept(generated)
+        if problems:
+            raise ValueError("; ".join(problems))
+        generated["check"]["keywords"] = [k.strip().lower() for k in generated["check"]["keywords"]]
+        return generated
+
+    @staticmethod
+    def _generate_concept_with_retry(concept, mode, lesson_title):
+        feedback = None
+        for attempt in range(1 + CONCEPT_RETRIES):
+            try:
+                return AIGenService.generate_concept(concept, mode, lesson_title, feedback)
+            except AllModelsFailed as e:
+                print(f"❌ Concept generation failed: all models failed ({e})")
+                return None
+            except Exception as e:
+                print(f"⚠️ Concept '{concept.get('name') or concept.get('id')}' attempt {attempt + 1} rejected: {e}")
+                feedback = str(e)
+        return None
+
     @staticmethod
     def generate_adaptive_lesson(original_lesson, mode):
         """
         Generates a new lesson JSON based on the original lesson and the requested mode.
         Modes: 'Beginner' (Simplified) or 'Advance' (Challenging)
-        """
-        
-        prompt = f"""
-        You are an expert tutor. I will give you a JSON representation of a lesson.
-        Your task is to generate a new version of this lesson intended for a student in '{mode}' mode.
-
-        RULES for 'Beginner':
-        1. Simplify explanations. Use analogies and very clear language.
-        2. Focus on foundational concepts.
-        3. Make questions easier but still testing core concepts.
-        4. Append ' (Beginner)' to the title.
-        5. Keywords must be in lowercase.
-
-        RULES for 'Advance':
-        1. Add deeper technical details or more complex applications.
-        2. Introduce 1-2 new, related 'Advanced Concepts'.
-        3. Make questions significantly more challenging (multi-step or critical thinking).
-        4. Append ' (Advance)' to the title.
-        5. Keywords must be in lowercase.
-
-        OUTPUT FORMAT:
-        Return ONLY valid JSON. The structure must match exactly:
-        {{
-            "title": "...",
-            "intro": "...",
-            "outro": "...",
-            "concepts": [
-                {{
-                    "id": "concept_unique_id",
-                    "name": "Concept Name",
-                    "explain": "...",
-                    "example": "...",
-                    "check": {{
-                        "question": "...",
-                        "desired_answer": "...",
-                        "keywords": ["lowercase_key1", "lowercase_key2"]
-                    }}
-                }}
-            ]
-        }}
 
-        ORIGINAL LESSON JSON:
-        {json.dumps(original_lesson, indent=2)}
+        Work is split into one compact outline call plus one call per concept,
+        run in parallel. Concepts are validated individually and only the
+        failing ones are retried; a concept that still fails keeps its
+        original content.
         """
+        mode = "Advance" if str(mode).lower() == "advance" else "Beginner"
+        title = original_lesson.get("title", "")
+        concepts = [c for c in original_lesson.get("concepts", []) if isinstance(c, dict)]
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "HTTP-Referer": "http://localhost:8000",
-            "Referer": "http://localhost:8000",
-            "X-Title": "Bright Study Local",
-            "Origin": "http://localhost:8000",
-            "Content-Type": "application/json"
-        }
+        with ThreadPoolExecutor(max_workers=CONCEPT_CONCURRENCY) as pool:
+            outline_future = pool.submit(AIGenService.generate_outline, original_lesson, mode)
+            concept_futures = [
+                pool.submit(AIGenService._generate_concept_with_retry, c, mode, title) for c in concepts
+            ]
 
-        payload = {
-            "model": MODEL,
-            "messages": [
-                {"role": "system", "content": "You are a specialized educational content generator. You output only structured JSON."},
-                {"role": "user", "content": prompt}
+            try:
+                outline = outline_future.result()
+            except Exception as e:
+                print(f"⚠️ Outline generation failed, keeping original lesson text: {e}")
+                outline = {"title": f"{title} ({mode})", "intro": original_lesson.get("intro", ""),
+                           "outro": original_lesson.get("outro", ""), "new_concepts": []}
+
+            # New advanced concepts only become known once the outline is back
+            new_names = [n for n in (outline.get("new_concepts") or []) if isinstance(n, str)][:2]
+            new_futures = [
+                pool.submit(AIGenService._generate_concept_with_retry, {"name": n}, mode, title) for n in new_names
             ]
-        }
 
-        try:
-            response = requests.post(OPENROUTER_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            content = response.json()['choices'][0]['message']['content']
-            
-            # Clean possible markdown wrap
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            return json.loads(content)
-        except Exception as e:
-            print(f"❌ AI Generation Error: {e}")
+            merged = []
+            generated_count = 0
+            for original, future in zip(concepts, concept_futures):
+                result = future.result()
+                base_id = original.get("id") or _slug(original.get("name"))
+                if result:
+                    generated_count += 1
+                    result["id"] = f"{base_id}_{mode.lower()}"
+                    merged.append(result)
+                else:
+                    merged.append(original)
+            for name, future in zip(new_names, new_futures):
+                result = future.result()
+                if result:
+                    generated_count += 1
+                    result["id"] = f"{_slug(name)}_{mode.lower()}"
+                    merged.append(result)
+
+        if concepts and generated_count == 0:
+            print("❌ AI Generation Error: no concept could be generated")
             return None
+
+        return {
+            "title": outline.get("title") or f"{title} ({mode})",
+            "intro": outline.get("intro", ""),
+            "outro": outline.get("outro", ""),
+            "concepts": merged,
+        }
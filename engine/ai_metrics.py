@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+import requests
+
+# Only calls from the last hour feed the rolling view
+WINDOW_SECONDS = 3600
+MAX_EVENTS = 10000
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+
+
+def estimate_tokens(text):
+    """Rough token count for providers that don't report usage (~4 characters per token)."""
+    return len(text or "") // 4
+
+
+def usage_from_response(data):
+    """(prompt_tokens, completion_tokens) from an OpenAI-compatible response body, or (None, None)."""
+    usage = (data or {}).get("usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+def outcome_for(exc):
+    """Short outcome label for a failed call: 'timeout', 'http_<status>' or 'error'."""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return "timeout"
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return f"http_{response.status_code}"
+    return "error"
+
+
+def estimate_prompt_tokens(messages):
+    return sum(estimate_tokens(m.get("content")) for m in messages)
+
+
+class AIMetrics:
+    """In-memory recorder for AI calls with rolling per-model and per-feature aggregates."""
+
+    def __init__(self, window=WINDOW_SECONDS, max_events=MAX_EVENTS):
+        self.window = window
+        self._events = deque(maxlen=max_events)
+        self._totals = {"calls": 0, "errors": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+
+    def record(self, feature, model, latency, outcome="ok", prompt_tokens=None,
+               completion_tokens=None, cache="miss"):
+        """
+        Record one AI call. `feature` names the caller (e.g. 'tutor_chat'),
+        `outcome` is 'ok' or a short error label, `cache` is 'hit', 'miss'
+        or 'bypass'.
+        """
+        event = {
+            "ts": time.time(),
+            "feature": feature,
+            "model": model,
+            "latency": latency,
+            "outcome": outcome,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cache": cache,
+        }
+        with self._lock:
+            self._events.append(event)
+            self._totals["calls"] += 1
+            self._totals["errors"] += outcome != "ok"
+            self._totals["cache_hits"] += cache == "hit"
+            self._totals["prompt_tokens"] += event["prompt_tokens"]
+            self._totals["completion_tokens"] += event["completion_tokens"]
+
+    def _recent(self):
+        cutoff = time.time() - self.window
+        with self._lock:
+            return [e for e in self._events if e["ts"] >= cutoff]
+
+    def snapshot(self):
+        """Totals since startup plus rolling-window aggregates grouped by model and by feature."""
+        events = self._recent()
+        with self._lock:
+            totals = dict(self._totals)
+        return {
+            "window_seconds": self.window,
+            "totals": totals,
+            "by_model": _aggregate(events, "model"),
+            "by_feature": _aggregate(events, "feature"),
+            "latency_buckets": LATENCY_BUCKETS,
+        }
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _aggregate(events, key):
+    groups = {}
+    for e in events:
+        groups.setdefault(e[key], []).append(e)
+
+    out = {}
+    for name, group in groups.items():
+        # Cache hits never reach the provider, so they'd drag the latency view down
+        live = [e for e in group if e["cache"] != "hit"]
+        latencies = sorted(e["latency"] for e in live)
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for lat in latencies:
+            idx = next((i for i, bound in enumerate(LATENCY_BUCKETS) if lat <= bound), len(LATENCY_BUCKETS))
+            histogram[idx] += 1
+        prompt_tokens = sum(e["prompt_tokens"] for e in live)
+        out[name] = {
+            "calls": len(group),
+            "errors": sum(1 for e in group if e["outcome"] != "ok"),
+            "cache_hits": len(group) - len(live),
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+            "latency_max": latencies[-1] if latencies else None,
+            "latency_histogram": histogram,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(e["completion_tokens"] for e in live),
+            "avg_prompt_tokens": round(prompt_tokens / len(live), 1) if live else 0,
+        }
+    return out
+
+
+# Shared recorder for every AI call made by this engine process
+metrics = AIMetrics()
@@ -1,8 +1,16 @@
 import os
 import json
 import sqlite3
+import threading
+import time
 import requests
 
+from ai_cache import AIResponseCache, make_cache_key
+from ai_metrics import estimate_prompt_tokens, estimate_tokens, metrics, outcome_for, usage_from_response
+from llm_output import iter_sse_deltas
+from model_router import AllModelsFailed, ModelRouter, models_from_env
+from retrieval import build_context
+
 # Load environment variables for local development
 try:
     from dotenv import load_dotenv
@@ -34,11 +42,24 @@ else:
 import sys
 sys.stdout.flush()
 
+# Number of prior turns sent to the model on every chat call
+MAX_HISTORY = 20
+# Default page size for /api/ai_tutor/history
+HISTORY_PAGE_SIZE = 50
+# Turns kept hot per user; anything older is compacted into the archive table
+ARCHIVE_KEEP_LAST = 200
+ARCHIVE_INTERVAL_SECONDS = 3600
+
 
 class AITutorService:
-    def __init__(self, db_path):
+    def __init__(self, db_path, documents=None, router=None):
         self.db_path = db_path
         self._init_db()
+        self.cache = AIResponseCache(db_path)
+        # Hedged routing across OPENROUTER_MODEL and its fallbacks
+        self.router = router or ModelRouter(models_from_env(OPENROUTER_MODEL))
+        # Optional DocumentStore for uploaded documents referenced by id
+        self.documents = documents
 
     def _init_db(self):
         """Initialize a local SQLite table for chat history per user."""
@@ -54,23 +75,124 @@ class AITutorService:
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            # Every read is "latest turns for one user", so (user_id, id) serves them all
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_tutor_history_user
+                ON ai_tutor_history (user_id, id)
+            ''')
+            # Cold storage: one row per archived batch, turns packed as JSON
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS ai_tutor_history_archive (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    first_id INTEGER NOT NULL,
+                    last_id INTEGER NOT NULL,
+                    turns TEXT NOT NULL,
+                    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_tutor_history_archive_user
+                ON ai_tutor_history_archive (user_id, last_id)
+            ''')
             conn.commit()
             conn.close()
         except Exception as e:
             print(f"Error initializing AI Tutor DB: {e}")
 
-    def get_history(self, user_id):
-        """Retrieve the chat history for a given user."""
+    def get_history(self, user_id, before_id=None, limit=HISTORY_PAGE_SIZE):
+        """
+        Retrieve one page of chat history for a given user, oldest first.
+        Pages are keyed on message id: pass the returned `next_before` as
+        `before_id` to fetch the page preceding it. Returns (messages, next_before);
+        next_before is None once the start of the history is reached.
+        """
         try:
             conn = sqlite3.connect(self.db_path)
             cur = conn.cursor()
-            cur.execute('SELECT role, content FROM ai_tutor_history WHERE user_id = ? ORDER BY timestamp ASC', (user_id,))
+            if before_id is None:
+                cur.execute(
+                    'SELECT id, role, content FROM ai_tutor_history WHERE user_id = ? ORDER BY id DESC LIMIT ?',
+                    (user_id, limit + 1)
+                )
+            else:
+                cur.execute(
+                    'SELECT id, role, content FROM ai_tutor_history WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                    (user_id, before_id, limit + 1)
+                )
             rows = cur.fetchall()
             conn.close()
-            return [{"role": r[0], "content": r[1]} for r in rows]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            rows.reverse()
+            messages = [{"id": r[0], "role": r[1], "content": r[2]} for r in rows]
+            next_before = rows[0][0] if has_more and rows else None
+            return messages, next_before
         except Exception as e:
             print(f"Error getting history: {e}")
-            return []
+            return [], None
+
+    def get_recent_history(self, user_id, limit=MAX_HISTORY):
+        """Retrieve the last `limit` turns for a user, oldest first."""
+        messages, _ = self.get_history(user_id, limit=limit)
+        return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+    def archive_old_turns(self, keep_last=ARCHIVE_KEEP_LAST):
+        """
+        Move every turn older than the newest `keep_last` per user into
+        ai_tutor_history_archive, packed as one JSON batch per user.
+        Returns the number of turns archived.
+        """
+        archived = 0
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute(
+                'SELECT user_id FROM ai_tutor_history GROUP BY user_id HAVING COUNT(*) > ?',
+                (keep_last,)
+            )
+            user_ids = [r[0] for r in cur.fetchall()]
+            for user_id in user_ids:
+                # The newest turn that falls outside the hot window
+                cur.execute(
+                    'SELECT id FROM ai_tutor_history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?',
+                    (user_id, keep_last)
+                )
+                row = cur.fetchone()
+                if not row:
+                    continue
+                cutoff = row[0]
+                cur.execute(
+                    'SELECT id, role, content, timestamp FROM ai_tutor_history WHERE user_id = ? AND id <= ? ORDER BY id ASC',
+                    (user_id, cutoff)
+                )
+                turns = cur.fetchall()
+                cur.execute(
+                    'INSERT INTO ai_tutor_history_archive (user_id, first_id, last_id, turns) VALUES (?, ?, ?, ?)',
+                    (user_id, turns[0][0], turns[-1][0], json.dumps(
+                        [{"id": t[0], "role": t[1], "content": t[2], "timestamp": t[3]} for t in turns]
+                    ))
+                )
+                cur.execute('DELETE FROM ai_tutor_history WHERE user_id = ? AND id <= ?', (user_id, cutoff))
+                conn.commit()
+                archived += len(turns)
+            conn.close()
+            if archived:
+                print(f"🗄️ [AI Tutor] Archived {archived} old turns for {len(user_ids)} user(s)")
+        except Exception as e:
+            print(f"Error archiving history: {e}")
+        return archived
+
+    def start_archiver(self, interval=ARCHIVE_INTERVAL_SECONDS, keep_last=ARCHIVE_KEEP_LAST):
+        """Run archive_old_turns periodically on a daemon thread."""
+        def _loop():
+            while True:
+                self.archive_old_turns(keep_last)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=_loop, daemon=True)
+        thread.start()
+        return thread
 
     def _save_message(self, user_id, role, content):
         """Save a single message to the database."""
@@ -83,19 +205,41 @@ class AITutorService:
         except Exception as e:
             print(f"Error saving message: {e}")
 
-    def chat(self, user_id, prompt, lesson_context=None, file_text=None):
+    def _begin_turn(self, user_id, prompt, lesson_context, file_text, document_id):
         """
-        Process a chat message using the requests library (bypasses openai SDK issues).
-        lesson_context is a snippet of text from the currently viewed lesson.
-        file_text is the content of any uploaded text document.
+        Save the user's message and work out how to answer it.
+        Returns (cache_key, early_reply, messages): early_reply is set (and
+        already saved) when the turn is answered without calling the model.
         """
         # Save user message
         self._save_message(user_id, "user", prompt)
 
+        document_index, document_hash = None, None
+        if document_id and self.documents:
+            meta = self.documents.get(document_id)
+            if meta and meta["user_id"] == str(user_id):
+                document_index = self.documents.get_index(document_id)
+                document_hash = meta["sha256"]
+
+        # Retrieve only the window of prior history the prompt actually uses,
+        # excluding the message we just saved
+        history = self.get_recent_history(user_id, MAX_HISTORY)[:-1]
+
+        # Identical questions in the same conversation and context are answered from cache
+        cache_key = make_cache_key(OPENROUTER_MODEL, prompt, lesson_context, file_text, document_hash, history)
+        start = time.monotonic()
+        cached_reply = self.cache.get(cache_key)
+        if cached_reply is not None:
+            metrics.record("tutor_chat", OPENROUTER_MODEL, time.monotonic() - start, cache="hit")
+            self._save_message(user_id, "assistant", cached_reply)
+            print(f"⚡ [AI Tutor] Cache hit ({len(cached_reply)} chars)")
+            sys.stdout.flush()
+            return cache_key, cached_reply, None
+
         if not OPENROUTER_API_KEY:
             fallback_msg = "⚠️ AI Tutor is not configured. Please set OPENROUTER_API_KEY in backend/.env"
             self._save_message(user_id, "assistant", fallback_msg)
-            return fallback_msg
+            return cache_key, fallback_msg, None
 
         # Build system prompt dynamically based on context
         system_msg = (
@@ -104,27 +248,28 @@ class AITutorService:
             "Respond in a friendly, encouraging tone. Do not give away direct answers immediately if prompted for homework; guide the student instead.\n\n"
         )
 
-        if lesson_context:
-            system_msg += f"The student is currently looking at this lesson content:\n\"\"\"{lesson_context}\"\"\"\nBase your answer heavily on this context.\n"
+        # Only the passages relevant to this question go into the prompt
+        context = build_context(prompt, lesson_context, file_text, document_index)
 
-        if file_text:
-            system_msg += f"The student has uploaded a document with the following text to provide context:\n\"\"\"{file_text}\"\"\"\nUse this to help answer their question.\n"
+        if context["lesson"]:
+            system_msg += f"The student is currently looking at this lesson content:\n\"\"\"{context['lesson']}\"\"\"\nBase your answer heavily on this context.\n"
 
-        # Retrieve prior history
-        history = self.get_history(user_id)
+        if context["document"]:
+            system_msg += f"The student has uploaded a document with the following text to provide context:\n\"\"\"{context['document']}\"\"\"\nUse this to help answer their question.\n"
 
         # Build messages list
         messages = [{"role": "system", "content": system_msg}]
 
-        # Append recent history (excluding the message we just saved)
-        MAX_HISTORY = 20
-        recent_history = history[-(MAX_HISTORY):]
-        for msg in recent_history[:-1]:  # exclude the last user message we just added
+        # Append recent history
+        for msg in history:
             messages.append({"role": msg["role"], "content": msg["content"]})
 
         # Add the latest prompt
         messages.append({"role": "user", "content": prompt})
+        return cache_key, None, messages
 
+    def _request(self, messages, model, stream=False):
+        """POST the chat completion for `model` to OpenRouter."""
         # Use requests library directly — same as ai_gen.py, avoids openai SDK issues
         headers = {
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -134,48 +279,153 @@ class AITutorService:
         }
 
         payload = {
-            "model": OPENROUTER_MODEL,
+            "model": model,
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 600
         }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
 
-        print(f"📡 [AI Tutor] Sending request → model: {OPENROUTER_MODEL}")
+        print(f"📡 [AI Tutor] Sending request → model: {model}{' (stream)' if stream else ''}")
         sys.stdout.flush()
 
-        try:
-            response = requests.post(
-                OPENROUTER_URL,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+        response = requests.post(
+            OPENROUTER_URL,
+            headers=headers,
+            json=payload,
+            timeout=30,
+            stream=stream
+        )
 
-            print(f"📬 [AI Tutor] Response status: {response.status_code}")
-            sys.stdout.flush()
+        print(f"📬 [AI Tutor] Response status: {response.status_code} ({model})")
+        sys.stdout.flush()
+        return response
 
+    def _complete(self, messages, model):
+        """One non-streaming completion; raises on any non-200 so the router can fall back."""
+        start = time.monotonic()
+        try:
+            response = self._request(messages, model)
             if response.status_code != 200:
-                error_detail = response.text
-                print(f"❌ [AI Tutor] Error from OpenRouter: {error_detail}")
-                sys.stdout.flush()
-                error_msg = f"Sorry, I encountered an error. Error: {response.status_code} - {error_detail}"
-                self._save_message(user_id, "assistant", error_msg)
-                return error_msg
-
+                raise requests.HTTPError(f"{response.status_code} from {model}", response=response)
             data = response.json()
-            ai_reply = data["choices"][0]["message"]["content"].strip()
+            reply = data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            metrics.record("tutor_chat", model, time.monotonic() - start, outcome_for(e),
+                           estimate_prompt_tokens(messages))
+            raise
+        prompt_tokens, completion_tokens = usage_from_response(data)
+        metrics.record("tutor_chat", model, time.monotonic() - start, "ok",
+                       prompt_tokens or estimate_prompt_tokens(messages),
+                       completion_tokens or estimate_tokens(reply))
+        return reply
 
-            # Save AI response
-            self._save_message(user_id, "assistant", ai_reply)
-            print(f"✅ [AI Tutor] Got reply ({len(ai_reply)} chars)")
-            sys.stdout.flush()
-            return ai_reply
+    def _error_reply(self, user_id, response):
+        error_detail = response.text
+        print(f"❌ [AI Tutor] Error from OpenRouter: {error_detail}")
+        sys.stdout.flush()
+        error_msg = f"Sorry, I encountered an error. Error: {response.status_code} - {error_detail}"
+        self._save_message(user_id, "assistant", error_msg)
+        return error_msg
 
-        except requests.exceptions.Timeout:
-            error_msg = "Sorry, the AI took too long to respond. Please try again."
-            self._save_message(user_id, "assistant", error_msg)
-            return error_msg
-        except Exception as e:
-            error_msg = f"Sorry, I encountered an error connecting to my brain. Error: {str(e)}"
+    def chat(self, user_id, prompt, lesson_context=None, file_text=None, document_id=None):
+        """
+        Process a chat message using the requests library (bypasses openai SDK issues).
+        lesson_context is a snippet of text from the currently viewed lesson.
+        file_text is the content of any uploaded text document.
+        document_id references a document previously stored in self.documents.
+        """
+        cache_key, early_reply, messages = self._begin_turn(user_id, prompt, lesson_context, file_text, document_id)
+        if early_reply is not None:
+            return early_reply
+
+        try:
+            model, ai_reply = self.router.call(lambda m: self._complete(messages, m))
+        except AllModelsFailed as e:
+            err = e.last_error
+            if isinstance(err, requests.HTTPError) and err.response is not None:
+                return self._error_reply(user_id, err.response)
+            if isinstance(err, requests.exceptions.Timeout):
+                error_msg = "Sorry, the AI took too long to respond. Please try again."
+            else:
+                error_msg = f"Sorry, I encountered an error connecting to my brain. Error: {str(err)}"
             self._save_message(user_id, "assistant", error_msg)
             return error_msg
+
+        # Save AI response
+        self._save_message(user_id, "assistant", ai_reply)
+        self.cache.put(cache_key, model, ai_reply)
+        print(f"✅ [AI Tutor] Got reply from {model} ({len(ai_reply)} chars)")
+        sys.stdout.flush()
+        return ai_reply
+
+    def chat_stream(self, user_id, prompt, lesson_context=None, file_text=None, document_id=None):
+        """
+        Streaming variant of chat(): a generator of reply text fragments as
+        the provider produces them. The assistant message is saved once the
+        stream ends. Closing the generator early closes the upstream
+        connection, which stops generation; the partial reply is kept.
+        """
+        cache_key, early_reply, messages = self._begin_turn(user_id, prompt, lesson_context, file_text, document_id)
+        if early_reply is not None:
+            yield early_reply
+            return
+
+        # A stream can't be hedged once tokens flow, so fall back in order on
+        # connection errors and non-200 responses only
+        response, error_msg, model = None, None, None
+        for model in self.router.ordered_models():
+            start = time.monotonic()
+            try:
+                response = self._request(messages, model, stream=True)
+            except Exception as e:
+                self.router.record(model, time.monotonic() - start, False)
+                metrics.record("tutor_chat_stream", model, time.monotonic() - start, outcome_for(e),
+                               estimate_prompt_tokens(messages))
+                if isinstance(e, requests.exceptions.Timeout):
+                    error_msg = "Sorry, the AI took too long to respond. Please try again."
+                else:
+                    error_msg = f"Sorry, I encountered an error connecting to my brain. Error: {str(e)}"
+                continue
+            self.router.record(model, time.monotonic() - start, response.status_code == 200)
+            if response.status_code == 200:
+                break
+            metrics.record("tutor_chat_stream", model, time.monotonic() - start,
+                           f"http_{response.status_code}", estimate_prompt_tokens(messages))
+            response.close()
+            error_response, response, error_msg = response, None, None
+
+        if response is None:
+            if error_msg is None:
+                error_msg = self._error_reply(user_id, error_response)
+            else:
+                self._save_message(user_id, "assistant", error_msg)
+            yield error_msg
+            return
+
+        parts = []
+        usage = {}
+        completed = False
+        try:
+            for delta in iter_sse_deltas(response, usage):
+                parts.append(delta)
+                yield delta
+            completed = True
+        except requests.exceptions.RequestException as e:
+            parts.append(f"\n\n[Connection lost: {e}]")
+            yield parts[-1]
+        finally:
+            response.close()
+            ai_reply = "".join(parts).strip()
+            if ai_reply:
+                self._save_message(user_id, "assistant", ai_reply)
+            if completed and ai_reply:
+                self.cache.put(cache_key, model, ai_reply)
+            metrics.record("tutor_chat_stream", model, time.monotonic() - start,
+                           "ok" if completed else "cancelled",
+                           usage.get("prompt_tokens") or estimate_prompt_tokens(messages),
+                           usage.get("completion_tokens") or estimate_tokens(ai_reply))
+            print(f"{'✅' if completed else '🛑'} [AI Tutor] Streamed reply ({len(ai_reply)} chars)")
+            sys.stdout.flush()
@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+import time
+
+from catalog import LESSON
+
+# Disk budget for downloaded videos and thumbnails (0 disables eviction)
+BUDGET_MB = int(os.environ.get("ASSET_CACHE_BUDGET_MB", "4096"))
+# Eviction stops once usage is back under this share of the budget, so one
+# new download doesn't trigger another eviction straight away
+LOW_WATERMARK = 0.9
+# Unreferenced files and partial downloads younger than this are left alone,
+# since a sync may still be writing the metadata that references them
+ORPHAN_GRACE_SECONDS = 3600
+
+ASSET_DIRS = (os.path.join("assets", "videos"), os.path.join("assets", "thumbnails"))
+
+
+class AssetCache:
+    """
+    Keeps downloaded assets under pune_content/assets within a disk budget.
+    The static server records when each asset was last served; reference
+    counts come from the content catalog. Unreferenced files, stale partial
+    downloads and variants of uninstalled lessons are collected as orphans.
+    Over budget, videos are evicted least recently used first, starting
+    with videos only used by lessons learners have completed. Evicted
+    videos keep their metadata and are restored from their source URL the
+    next time they are requested.
+    """
+
+    def __init__(self, db_path, content_dir, catalog, progress_db, budget_bytes=BUDGET_MB * 1024 * 1024,
+                 download=None):
+        self.db_path = db_path
+        self.content_dir = content_dir
+        self.catalog = catalog
+        self.progress_db = progress_db
+        self.budget_bytes = budget_bytes
+        self.download = download
+        self._lock = threading.Lock()
+        self._restoring = set()
+        self._ready = False
+
+    def _init_db(self):
+        if self._ready:
+            return
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS asset_access (
+                asset TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS asset_evictions (
+                asset TEXT PRIMARY KEY,
+                evicted_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+        self._ready = True
+
+    def _full_path(self, asset):
+        return os.path.join(self.content_dir, *asset.split("/"))
+
+    # ---------- bookkeeping ----------
+
+    def touch(self, asset, now=None):
+        """Record that `asset` (a content-relative path like 'assets/videos/x.mp4') was just served."""
+        if not asset.startswith("assets/"):
+            return
+        self._init_db()
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO asset_access (asset, last_access) VALUES (?, ?)",
+                         (asset, now or time.time()))
+        conn.close()
+
+    def _last_access(self):
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT asset, last_access FROM asset_access")
+        rows = dict(cur.fetchall())
+        conn.close()
+        return rows
+
+    def files(self):
+        """{asset path: os.stat_result} for every file in the asset folders."""
+        out = {}
+        for rel_dir in ASSET_DIRS:
+            directory = os.path.join(self.content_dir, rel_dir)
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.endswith(".json"):
+                    out[f"{rel_dir.replace(os.sep, '/')}/{entry.name}"] = entry.stat()
+        return out
+
+    def usage(self):
+        return sum(st.st_size for st in self.files().values())
+
+    def _completed_lessons(self):
+        try:
+            conn = sqlite3.connect(self.progress_db)
+            cur = conn.cursor()
+            cur.execute("SELECT DISTINCT item_id FROM user_progress WHERE item_type = 'lesson' AND status = 'completed'")
+            done = {r[0] for r in cur.fetchall()}
+            conn.close()
+            return done
+        except sqlite3.Error:
+            return set()
+
+    # ---------- orphans ----------
+
+    def orphans(self, now=None):
+        """Asset files nothing references and partial downloads, once older than ORPHAN_GRACE_SECONDS."""
+        now = now or time.time()
+        refs = self.catalog.asset_references()
+        found = []
+        for asset, st in self.files().items():
+            if (asset.endswith(".tmp") or asset not in refs) and now - st.st_mtime > ORPHAN_GRACE_SECONDS:
+                found.append(asset)
+        return sorted(found)
+
+    def _orphan_variants(self):
+        """(variant lesson id, path) for generated variants whose root lesson is gone."""
+        installed = {l["lesson_id"] for l in self.catalog.lesson_index()}
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT root_lesson_id, lesson_id FROM lesson_variants")
+            rows = cur.fetchall()
+        except sqlite3.Error:
+            rows = []
+        conn.close()
+        lessons_dir = self.catalog.dirs[LESSON]
+        return [(vid, os.path.join(lessons_dir, f"{vid}.json")) for root, vid in rows if root not in installed]
+
+    def collect_orphans(self, dry_run=False):
+        """Delete orphaned assets and variants; returns {'assets': [...], 'variants': [...], 'freed_bytes'}."""
+        with self._lock:
+            self._init_db()
+            assets, freed = [], 0
+            for asset in self.orphans():
+                path = self._full_path(asset)
+                try:
+                    size = os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+                except OSError:
+                    continue
+                assets.append(asset)
+                freed += size
+
+            variants = []
+            for vid, path in self._orphan_variants():
+                variants.append(vid)
+                if dry_run:
+                    continue
+                if os.path.exists(path):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    self.catalog.index_file(path)
+                conn = sqlite3.connect(self.db_path)
+                with conn:
+                    conn.execute("DELETE FROM lesson_variants WHERE lesson_id = ?", (vid,))
+                conn.close()
+
+            if assets and not dry_run:
+                conn = sqlite3.connect(self.db_path)
+                with conn:
+                    conn.executemany("DELETE FROM asset_access WHERE asset = ?", [(a,) for a in assets])
+                conn.close()
+        if assets or variants:
+            print(f"🧹 [AssetCache] {'Would collect' if dry_run else 'Collected'} {len(assets)} orphaned file(s), {len(variants)} variant(s)")
+        return {"assets": assets, "variants": variants, "freed_bytes": freed}
+
+    # ---------- eviction ----------
+
+    def eviction_order(self):
+        """
+        Evictable videos as (asset, size), first to go first: videos whose
+        lessons are all completed, then everything else, each least
+        recently used first. Never-served files count from their download.
+        """
+        refs = self.catalog.asset_references()
+        completed = self._completed_lessons()
+        last_access = self._last_access()
+        candidates = []
+        for asset, st in self.files().items():
+            ref = refs.get(asset)
+            if not ref or not asset.startswith("assets/videos/") or asset.endswith(".tmp"):
+                continue
+            done = bool(ref["lessons"]) and ref["lessons"] <= completed
+            candidates.append((0 if done else 1, last_access.get(asset, st.st_mtime), asset, st.st_size))
+        candidates.sort()
+        return [(asset, size) for _, _, asset, size in candidates]
+
+    def evict(self, target_bytes=None):
+        """Evict videos until usage is at most `target_bytes` (default: LOW_WATERMARK of the budget)."""
+        if not self.budget_bytes and target_bytes is None:
+            return []
+        if target_bytes is None:
+            target_bytes = int(self.budget_bytes * LOW_WATERMARK)
+        with self._lock:
+            self._init_db()
+            usage = self.usage()
+            evicted = []
+            for asset, size in self.eviction_order():
+                if usage <= target_bytes:
+                    break
+                try:
+                    os.remove(self._full_path(asset))
+                except OSError:
+                    continue
+                usage -= size
+                evicted.append((asset, time.time(), size))
+            if evicted:
+                conn = sqlite3.connect(self.db_path)
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO asset_evictions (asset, evicted_at, size) VALUES (?, ?, ?)", evicted)
+                conn.close()
+        if evicted:
+            print(f"🧹 [AssetCache] Evicted {len(evicted)} video(s), {sum(e[2] for e in evicted) // (1024 * 1024)} MB")
+        return [e[0] for e in evicted]
+
+    def enforce(self):
+        """Collect orphans, then evict down to the budget if still over it."""
+        report = self.collect_orphans()
+        report["evicted"] = []
+        if self.budget_bytes and self.usage() > self.budget_bytes:
+            report["evicted"] = self.evict()
+        return report
+
+    def stats(self):
+        self._init_db()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM asset_evictions")
+        evicted, evicted_bytes = cur.fetchone()
+        conn.close()
+        files = self.files()
+        return {"budget_bytes": self.budget_bytes, "usage_bytes": sum(st.st_size for st in files.values()),
+                "files": len(files), "evicted": evicted, "evicted_bytes": evicted_bytes}
+
+    # ---------- restore ----------
+
+    def is_evicted(self, asset):
+        self._init_db()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM asset_evictions WHERE asset = ?", (asset,))
+        row = cur.fetchone()
+        conn.close()
+        return row is not None and not os.path.exists(self._full_path(asset))
+
+    def restore(self, asset):
+        """Re-download an evicted asset from the URL its metadata points at. Returns True on success."""
+        url = (self.catalog.asset_references().get(asset) or {}).get("url")
+        if not url or not self.download:
+            return False
+        with self._lock:
+            if asset in self._restoring:
+                return False
+            self._restoring.add(asset)
+        try:
+            # A download the sync policy deferred isn't on disk yet
+            if not self.download(url, self._full_path(asset)) or not os.path.exists(self._full_path(asset)):
+                return False
+            conn = sqlite3.connect(self.db_path)
+            with conn:
+                conn.execute("DELETE FROM asset_evictions WHERE asset = ?", (asset,))
+            conn.close()
+            self.touch(asset)
+            return True
+        finally:
+            with self._lock:
+                self._restoring.discard(asset)
@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Weight of the newest sample in the rolling estimates
+EWMA_ALPHA = 0.3
+# Transfers smaller than this are dominated by latency and don't update throughput
+MIN_THROUGHPUT_SAMPLE_BYTES = 64 * 1024
+
+# Assets up to this size are always fetched during background sync
+SMALL_ASSET_BYTES = 5 * 1024 * 1024
+# Larger ones only if the estimated transfer takes at most this long (and the link isn't metered)
+MAX_BACKGROUND_TRANSFER_SECONDS = int(os.environ.get("SYNC_MAX_TRANSFER_SECONDS", "300"))
+METERED = os.environ.get("SYNC_METERED", "").lower() in ("1", "true", "yes")
+
+# While a learner used the UI this recently, background downloads get only
+# BACKGROUND_SHARE of the measured throughput (never less than MIN_BACKGROUND_BPS)
+FOREGROUND_WINDOW_SECONDS = 30
+BACKGROUND_SHARE = 0.5
+MIN_BACKGROUND_BPS = 32 * 1024
+
+SLOW_BPS = 256 * 1024
+FAST_BPS = 2 * 1024 * 1024
+
+
+class LinkEstimator:
+    """Rolling (EWMA) estimates of download throughput and request latency from real transfers."""
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.throughput_bps = None
+        self.latency_s = None
+        self.samples = 0
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    def _blend(self, old, new):
+        return new if old is None else self.alpha * new + (1 - self.alpha) * old
+
+    def record_transfer(self, nbytes, seconds):
+        if nbytes < MIN_THROUGHPUT_SAMPLE_BYTES or seconds <= 0:
+            return
+        with self._lock:
+            self.throughput_bps = self._blend(self.throughput_bps, nbytes / seconds)
+            self.samples += 1
+            self.updated_at = time.time()
+
+    def record_latency(self, seconds):
+        if seconds < 0:
+            return
+        with self._lock:
+            self.latency_s = self._blend(self.latency_s, seconds)
+            self.updated_at = time.time()
+
+    def link_class(self):
+        if self.throughput_bps is None:
+            return "unknown"
+        if self.throughput_bps < SLOW_BPS:
+            return "slow"
+        return "fast" if self.throughput_bps >= FAST_BPS else "medium"
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "throughput_bps": round(self.throughput_bps) if self.throughput_bps is not None else None,
+                "latency_ms": round(self.latency_s * 1000, 1) if self.latency_s is not None else None,
+                "samples": self.samples,
+                "link": self.link_class(),
+                "updated_at": self.updated_at,
+            }
+
+
+class SyncPolicy:
+    """
+    Decides what background sync fetches now and how fast. Metadata and
+    assets up to SMALL_ASSET_BYTES always go through; larger videos only
+    when the measured link moves them within MAX_BACKGROUND_TRANSFER_SECONDS
+    and the link isn't metered, otherwise they are queued (persisted in
+    `deferred_downloads`) for a better moment. While the UI is in use,
+    background transfers are throttled to a share of the link. Downloads
+    a learner asks for directly are never deferred or throttled.
+    """
+
+    def __init__(self, link, db_path, metered=METERED):
+        self.link = link
+        self.db_path = db_path
+        self.metered = metered
+        self._last_foreground = 0.0
+        self._local = threading.local()
+        self._ready = False
+
+    def _init_db(self):
+        if self._ready:
+            return
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS deferred_downloads (
+                dest TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                size INTEGER,
+                deferred_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+        self._ready = True
+
+    # ---------- modes ----------
+
+    def touch(self):
+        """Record foreground (learner) activity."""
+        self._last_foreground = time.time()
+
+    def foreground_active(self):
+        return time.time() - self._last_foreground < FOREGROUND_WINDOW_SECONDS
+
+    def background(self):
+        """Context manager marking downloads on this thread as background sync."""
+        policy = self
+
+        class _Background:
+            def __enter__(self):
+                policy._local.background = getattr(policy._local, "background", 0) + 1
+
+            def __exit__(self, *exc):
+                policy._local.background -= 1
+
+        return _Background()
+
+    def in_background(self):
+        return getattr(self._local, "background", 0) > 0
+
+    # ---------- decisions ----------
+
+    def should_defer(self, size):
+        """True if a background download of `size` bytes (0 = unknown) should wait."""
+        if not self.in_background() or not size or size <= SMALL_ASSET_BYTES:
+            return False
+        if self.metered:
+            return True
+        bps = self.link.throughput_bps
+        # No estimate yet: this transfer will provide one
+        return bps is not None and size / bps > MAX_BACKGROUND_TRANSFER_SECONDS
+
+    def rate_limit(self):
+        """Bytes/second cap for the current download, or None for no cap."""
+        if not self.in_background() or not self.foreground_active() or self.link.throughput_bps is None:
+            return None
+        return max(MIN_BACKGROUND_BPS, self.link.throughput_bps * BACKGROUND_SHARE)
+
+    def throttle(self, received, started, cap):
+        """Sleep so `received` bytes since `started` (monotonic) stay under `cap`; returns seconds slept."""
+        if not cap:
+            return 0.0
+        ahead = received / cap - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+            return ahead
+        return 0.0
+
+    # ---------- deferred queue ----------
+
+    def defer(self, url, dest, size):
+        self._init_db()
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO deferred_downloads (dest, url, size, deferred_at) VALUES (?, ?, ?, ?)",
+                         (dest, url, size, time.time()))
+        conn.close()
+
+    def _select(self, sql, params=()):
+        # Reads never create the queue: until something is deferred the database is left untouched
+        if not self._ready and not os.path.exists(self.db_path):
+            return []
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+
+    def pending(self):
+        """[(dest, url, size)] smallest first, so the most files land per byte."""
+        return self._select("SELECT dest, url, size FROM deferred_downloads ORDER BY COALESCE(size, 0), deferred_at")
+
+    def deferred_url(self, dest):
+        rows = self._select("SELECT url FROM deferred_downloads WHERE dest = ?", (dest,))
+        return rows[0][0] if rows else None
+
+    def done(self, dest):
+        """Drop `dest` from the queue; a no-op (and no write) when it was never deferred."""
+        if self.deferred_url(dest) is None:
+            return
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("DELETE FROM deferred_downloads WHERE dest = ?", (dest,))
+        conn.close()
+
+    def status(self):
+        pending = self.pending()
+        return {
+            **self.link.snapshot(),
+            "metered": self.metered,
+            "foreground_active": self.foreground_active(),
+            "deferred": len(pending),
+            "deferred_bytes": sum(p[2] or 0 for p in pending),
+        }
@@ -0,0 +1,349 @@
+import json
+import os
+import sqlite3
+import threading
+
+import content_store
+
+LESSON = "lesson"
+CONCEPT = "concept"
+VIDEO = "video"
+
+
+def _concept_assets(concept):
+    """(asset path, source url) for each video a concept embeds, as the updater stores them."""
+    return [(f"assets/videos/{v['id']}.mp4", v.get("url"))
+            for v in concept.get("videos") or [] if isinstance(v, dict) and v.get("id")]
+
+
+class ContentCatalog:
+    """
+    Indexed SQLite view of the installed JSON content tree: lessons with
+    their concept references resolved (through content_aliases), concepts
+    and video metadata. Files are only re-parsed when their mtime or size
+    changes, and a directory is only listed when its own mtime changes, so
+    a read on an unchanged tree costs a few stat calls plus the lookup.
+    """
+
+    def __init__(self, db_path, lessons_dir, concepts_dir, videos_dir):
+        self.db_path = db_path
+        self.dirs = {LESSON: lessons_dir, CONCEPT: concepts_dir, VIDEO: videos_dir}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _init_db(self):
+        # Deferred to first use so importing the updater doesn't touch the database
+        if self._ready:
+            return
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog_asset_refs'")
+        has_refs = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_files (
+                path TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        cur.execute("CREATE TABLE IF NOT EXISTS catalog_dirs (kind TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_lessons (
+                path TEXT PRIMARY KEY,
+                lesson_id TEXT NOT NULL,
+                title TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_catalog_lessons_id ON catalog_lessons (lesson_id)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_lesson_concepts (
+                lesson_path TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                concept_ref TEXT,
+                data TEXT,
+                PRIMARY KEY (lesson_path, position)
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_catalog_lesson_concepts_ref ON catalog_lesson_concepts (concept_ref)")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_concepts (
+                concept_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                version TEXT,
+                data TEXT NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_videos (
+                video_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                title TEXT,
+                thumb TEXT,
+                url TEXT,
+                length TEXT
+            )
+        """)
+        # Downloadable files (videos, thumbnails) each content file points at
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_asset_refs (
+                path TEXT NOT NULL,
+                asset TEXT NOT NULL,
+                url TEXT
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_catalog_asset_refs_path ON catalog_asset_refs (path)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_catalog_asset_refs_asset ON catalog_asset_refs (asset)")
+        if not has_refs:
+            # Catalog predates asset references: make the next refresh re-parse everything
+            cur.execute("DELETE FROM catalog_files")
+            cur.execute("DELETE FROM catalog_dirs")
+        # Same shape as engine.init_db; aliases are resolved at query time
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS content_aliases (
+                alias TEXT PRIMARY KEY,
+                canonical TEXT
+            )
+        """)
+        conn.commit()
+        conn.close()
+        self._ready = True
+
+    # ---------- maintenance ----------
+
+    def _kind_for(self, path):
+        parent = os.path.abspath(os.path.dirname(path))
+        for kind, d in self.dirs.items():
+            if os.path.abspath(d) == parent:
+                return kind
+        return None
+
+    def _remove(self, cur, path):
+        cur.execute("DELETE FROM catalog_files WHERE path = ?", (path,))
+        cur.execute("DELETE FROM catalog_lessons WHERE path = ?", (path,))
+        cur.execute("DELETE FROM catalog_lesson_concepts WHERE lesson_path = ?", (path,))
+        cur.execute("DELETE FROM catalog_concepts WHERE path = ?", (path,))
+        cur.execute("DELETE FROM catalog_videos WHERE path = ?", (path,))
+        cur.execute("DELETE FROM catalog_asset_refs WHERE path = ?", (path,))
+
+    def _index(self, cur, kind, path, st):
+        """(Re)index one file inside the caller's transaction; unreadable files are dropped."""
+        self._remove(cur, path)
+        try:
+            data = content_store.load_json(path)
+        except Exception as e:
+            print(f"⚠️ [Catalog] Skipping {os.path.basename(path)}: {e}")
+            return
+        if not isinstance(data, dict):
+            return
+        stem = os.path.basename(path)[:-5]
+        refs = []
+
+        if kind == LESSON:
+            lesson_id = data.get("lesson_id") or data.get("id") or stem
+            cur.execute("INSERT INTO catalog_lessons (path, lesson_id, title, data) VALUES (?, ?, ?, ?)",
+                        (path, lesson_id, data.get("title"), json.dumps(data, ensure_ascii=False)))
+            rows = []
+            for pos, c in enumerate(data.get("concepts") or []):
+                if isinstance(c, dict):
+                    rows.append((path, pos, c.get("id"), json.dumps(c, ensure_ascii=False)))
+                    refs.extend(_concept_assets(c))
+                else:
+                    rows.append((path, pos, str(c), None))
+            cur.executemany("INSERT INTO catalog_lesson_concepts (lesson_path, position, concept_ref, data) VALUES (?, ?, ?, ?)", rows)
+        elif kind == CONCEPT:
+            cur.execute("INSERT OR REPLACE INTO catalog_concepts (concept_id, path, version, data) VALUES (?, ?, ?, ?)",
+                        (stem, path, str(data.get("version")), json.dumps(data, ensure_ascii=False)))
+            refs.extend(_concept_assets(data))
+        elif kind == VIDEO:
+            meta = data.get("metadata")
+            if isinstance(meta, str):
+                try:
+                    meta = json.loads(meta)
+                except ValueError:
+                    meta = None
+            cur.execute("""
+                INSERT OR REPLACE INTO catalog_videos (video_id, path, title, thumb, url, length)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (data.get("id") or stem, path, data.get("title", "Untitled Video"), data.get("local_thumb", ""),
+                  data.get("local_video", ""), (meta or {}).get("length", "0:00")))
+            if data.get("local_video"):
+                refs.append((data["local_video"], data.get("url")))
+            if data.get("local_thumb"):
+                refs.append((data["local_thumb"], data.get("thumbnail_url")))
+        cur.executemany("INSERT INTO catalog_asset_refs (path, asset, url) VALUES (?, ?, ?)",
+                        [(path, asset, url) for asset, url in refs])
+        cur.execute("INSERT OR REPLACE INTO catalog_files (path, kind, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                    (path, kind, st.st_mtime_ns, st.st_size))
+
+    def _sync_dir(self, cur, kind, directory):
+        on_disk = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".json") and entry.is_file():
+                on_disk[entry.path] = entry.stat()
+        cur.execute("SELECT path, mtime_ns, size FROM catalog_files WHERE kind = ?", (kind,))
+        known = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+        changed = 0
+        for path in known.keys() - on_disk.keys():
+            self._remove(cur, path)
+            changed += 1
+        for path, st in on_disk.items():
+            if known.get(path) != (st.st_mtime_ns, st.st_size):
+                self._index(cur, kind, path, st)
+                changed += 1
+        return changed
+
+    def refresh(self, force=False):
+        """
+        Bring the catalog in line with the content directories. Only
+        directories whose mtime moved are listed, and only changed files
+        are parsed. Returns the number of files (re)indexed or removed.
+        """
+        with self._lock:
+            self._init_db()
+            conn = sqlite3.connect(self.db_path)
+            changed = 0
+            try:
+                with conn:
+                    cur = conn.cursor()
+                    cur.execute("SELECT kind, mtime_ns FROM catalog_dirs")
+                    seen = dict(cur.fetchall())
+                    for kind, directory in self.dirs.items():
+                        try:
+                            mtime = os.stat(directory).st_mtime_ns
+                        except OSError:
+                            continue
+                        if not force and seen.get(kind) == mtime:
+                            continue
+                        changed += self._sync_dir(cur, kind, directory)
+                        cur.execute("INSERT OR REPLACE INTO catalog_dirs (kind, mtime_ns) VALUES (?, ?)", (kind, mtime))
+            finally:
+                conn.close()
+        if changed:
+            print(f"📚 [Catalog] Indexed {changed} changed file(s)")
+        return changed
+
+    def index_file(self, path):
+        """Index (or drop, if it is gone) a single content file right after it was written."""
+        kind = self._kind_for(path)
+        if kind is None:
+            return
+        path = os.path.join(self.dirs[kind], os.path.basename(path))
+        with self._lock:
+            self._init_db()
+            conn = sqlite3.connect(self.db_path)
+            try:
+                with conn:
+                    cur = conn.cursor()
+                    if os.path.exists(path):
+                        self._index(cur, kind, path, os.stat(path))
+                    else:
+                        self._remove(cur, path)
+            finally:
+                conn.close()
+
+    # ---------- reads ----------
+
+    def _resolved_concepts(self, cur, where="", params=()):
+        """lesson_path -> [concept, ...] with embedded concepts as-is and references resolved."""
+        cur.execute(f"""
+            SELECT lc.lesson_path, COALESCE(lc.data, c.data)
+            FROM catalog_lesson_concepts lc
+            LEFT JOIN content_aliases a ON a.alias = lc.concept_ref AND lc.data IS NULL
+            LEFT JOIN catalog_concepts c ON c.concept_id = COALESCE(a.canonical, lc.concept_ref) AND lc.data IS NULL
+            {where}
+            ORDER BY lc.lesson_path, lc.position
+        """, params)
+        out = {}
+        for path, data in cur.fetchall():
+            if data is not None:
+                out.setdefault(path, []).append(json.loads(data))
+        return out
+
+    def _lesson_rows(self, where="", params=()):
+        self.refresh()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute(f"SELECT path, lesson_id, data FROM catalog_lessons {where} ORDER BY path", params)
+        rows = cur.fetchall()
+        concept_where = f"WHERE lc.lesson_path IN (SELECT path FROM catalog_lessons {where})" if where else ""
+        concepts = self._resolved_concepts(cur, concept_where, params)
+        conn.close()
+
+        lessons = []
+        for path, lesson_id, data in rows:
+            lesson = json.loads(data)
+            lesson["lesson_id"] = lesson_id
+            lesson["concepts"] = concepts.get(path, [])
+            lessons.append(lesson)
+        return lessons
+
+    def lessons(self):
+        """Every installed lesson, concepts resolved, in file-name order."""
+        return self._lesson_rows()
+
+    def lesson(self, lesson_id):
+        rows = self._lesson_rows("WHERE lesson_id = ?", (lesson_id,))
+        return rows[0] if rows else None
+
+    def lesson_index(self):
+        """[{'lesson_id', 'title', 'path'}] without loading lesson bodies."""
+        self.refresh()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT lesson_id, title, path FROM catalog_lessons ORDER BY path")
+        rows = cur.fetchall()
+        conn.close()
+        return [{"lesson_id": r[0], "title": r[1] or os.path.basename(r[2]), "path": os.path.basename(r[2])} for r in rows]
+
+    def concept(self, concept_id):
+        """A concept by id or alias, or None."""
+        self.refresh()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.data FROM catalog_concepts c
+            WHERE c.concept_id = COALESCE((SELECT canonical FROM content_aliases WHERE alias = ?), ?)
+        """, (concept_id, concept_id))
+        row = cur.fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    def videos(self):
+        self.refresh()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT title, video_id, thumb, url, length FROM catalog_videos ORDER BY path")
+        rows = cur.fetchall()
+        conn.close()
+        return [{"title": r[0], "id": r[1], "thumb": r[2], "url": r[3], "length": r[4]} for r in rows]
+
+    def asset_references(self):
+        """
+        {asset path: {'refs', 'url', 'lessons'}} for every asset the content
+        points at: how many content files reference it, where it can be
+        downloaded from, and which lessons use it (directly or through a
+        referenced concept).
+        """
+        self.refresh()
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT asset, COUNT(*), MAX(url) FROM catalog_asset_refs GROUP BY asset")
+        out = {r[0]: {"refs": r[1], "url": r[2], "lessons": set()} for r in cur.fetchall()}
+        cur.execute("""
+            SELECT r.asset, l.lesson_id FROM catalog_asset_refs r
+            JOIN catalog_lessons l ON l.path = r.path
+            UNION
+            SELECT r.asset, l.lesson_id FROM catalog_lesson_concepts lc
+            JOIN catalog_lessons l ON l.path = lc.lesson_path
+            LEFT JOIN content_aliases a ON a.alias = lc.concept_ref
+            JOIN catalog_concepts c ON c.concept_id = COALESCE(a.canonical, lc.concept_ref)
+            JOIN catalog_asset_refs r ON r.path = c.path
+            WHERE lc.data IS NULL
+        """)
+        for asset, lesson_id in cur.fetchall():
+            out[asset]["lessons"].add(lesson_id)
+        conn.close()
+        return out
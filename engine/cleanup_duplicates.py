@@ -3,55 +3,163 @@
 Usage:
   python cleanup_duplicates.py       # dry-run, shows duplicates
   python cleanup_duplicates.py --apply   # apply deletions and remapping
+  python cleanup_duplicates.py --near   # also merge near-duplicates (MinHash estimate)
 
 Behavior:
 - Groups concept JSON files by content fingerprint (ignoring 'id' and 'version').
+- With --near, also groups near-duplicates: concepts whose explain/example/
+  question text shares most of its word shingles (MinHash estimate >=
+  NEAR_DUP_THRESHOLD). Opt-in, since merging deletes files on an estimate.
 - For each group with multiple files, chooses a canonical file (prefer non-UUID id).
+- Files are fingerprinted in a process pool when there are many of them.
 - In --apply mode:
-  - Deletes duplicate files (non-canonical)
-  - Updates `installed_content` table to point to canonical id
-  - Updates lesson files that reference deleted concept ids
+  - Rewrites every affected lesson once (atomically) with all remappings applied
+  - Updates `installed_content` concept rows to point to canonical id (dropping
+    the old row where the canonical concept is already installed)
+  - Deletes duplicate files (non-canonical) once no lesson references them
 """
 import os
+import re
 import json
 import hashlib
 import argparse
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from content_validator import PARALLEL_THRESHOLD
 
 PROJECT = os.path.dirname(os.path.dirname(__file__))
 CONCEPTS_DIR = os.path.join(PROJECT, 'content', 'concepts')
 LESSONS_DIR = os.path.join(PROJECT, 'content', 'lessons')
 DB_PATH = os.path.join(PROJECT, 'database', 'progress.db')
 
+# Near-duplicate matching: word shingle size, MinHash signature length and
+# LSH banding (BANDS * ROWS must equal NUM_PERM)
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = 4
+NEAR_DUP_THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+# Fixed permutations so signatures are comparable across runs and processes
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f'a{i}'.encode(), digest_size=8).digest(), 'big') % (_PRIME - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f'b{i}'.encode(), digest_size=8).digest(), 'big') % _PRIME)
+    for i in range(NUM_PERM)
+]
+
 def fingerprint(obj):
     # remove id and version then canonicalize
     o = {k:v for k,v in obj.items() if k not in ('id','version')}
     s = json.dumps(o, sort_keys=True, ensure_ascii=False)
     return hashlib.sha1(s.encode('utf-8')).hexdigest()
 
+def shingles(obj):
+    """Word shingles over the concept's explain, example and question text."""
+    check = obj.get('check') if isinstance(obj.get('check'), dict) else {}
+    text = ' '.join(str(t) for t in (obj.get('explain'), obj.get('example'), check.get('question')) if t)
+    words = re.sub(r'[^\w\s]', ' ', text.lower()).split()
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(shingle_set):
+    if not shingle_set:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingle_set]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+def estimated_similarity(sig_a, sig_b):
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
 def is_uuid(s):
-    import re
     return bool(re.match(r'^[0-9a-fA-F\-]{36}$', s))
 
 def load_json(path):
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def find_duplicates():
-    files = [f for f in os.listdir(CONCEPTS_DIR) if f.endswith('.json')]
+def save_json_atomic(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+def _fingerprint_file(path):
+    """(file name, data, exact fingerprint, MinHash signature), or None if unreadable."""
+    try:
+        data = load_json(path)
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return os.path.basename(path), data, fingerprint(data), minhash(shingles(data))
+
+def _fingerprint_all(paths, workers=None):
+    if len(paths) > PARALLEL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_fingerprint_file, paths, chunksize=32))
+    else:
+        results = [_fingerprint_file(p) for p in paths]
+    return [r for r in results if r]
+
+def find_duplicates(include_near=False, workers=None):
+    """
+    {group_key: (files, datas)} for every group of duplicate concepts. Exact
+    groups are keyed by fingerprint; groups that include near-duplicates
+    are keyed 'near:<fingerprint of first file>'.
+    """
+    files = sorted(f for f in os.listdir(CONCEPTS_DIR) if f.endswith('.json'))
+    records = _fingerprint_all([os.path.join(CONCEPTS_DIR, f) for f in files], workers)
+
+    # Union-find over file indexes: exact matches first, then LSH candidates
+    parent = list(range(len(records)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    def union(i, j):
+        parent[find(i)] = find(j)
+
+    by_fp = {}
+    for i, (_, _, fp, _) in enumerate(records):
+        if fp in by_fp:
+            union(i, by_fp[fp])
+        else:
+            by_fp[fp] = i
+
+    near = set()
+    if include_near:
+        buckets = {}
+        for i, (_, _, _, sig) in enumerate(records):
+            if sig is None:
+                continue
+            for band in range(BANDS):
+                buckets.setdefault((band, sig[band * ROWS:(band + 1) * ROWS]), []).append(i)
+        checked = set()
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pair = (members[x], members[y])
+                    if pair in checked or find(pair[0]) == find(pair[1]):
+                        continue
+                    checked.add(pair)
+                    if estimated_similarity(records[pair[0]][3], records[pair[1]][3]) >= NEAR_DUP_THRESHOLD:
+                        union(*pair)
+                        near.update(pair)
+
     groups = {}
-    meta = {}
-    for fn in files:
-        path = os.path.join(CONCEPTS_DIR, fn)
-        try:
-            data = load_json(path)
-        except Exception:
+    for i in range(len(records)):
+        groups.setdefault(find(i), []).append(i)
+    dup = {}
+    for members in groups.values():
+        if len(members) < 2:
             continue
-        fp = fingerprint(data)
-        groups.setdefault(fp, []).append(fn)
-        meta[fn] = data
-    # filter groups with >1
-    dup = {fp: (groups[fp], [meta[f] for f in groups[fp]]) for fp in groups if len(groups[fp])>1}
+        key = records[members[0]][2]
+        if any(m in near for m in members):
+            key = 'near:' + key
+        dup[key] = ([records[m][0] for m in members], [records[m][1] for m in members])
     return dup
 
 def show_preview(dup):
@@ -61,68 +169,109 @@ def show_preview(dup):
     print('Duplicate groups:')
     for fp, (files, datas) in dup.items():
         print('\nGroup fingerprint:', fp)
+        base = minhash(shingles(datas[0]))
         for fn, d in zip(files, datas):
             cid = d.get('id')
             ver = d.get('version')
-            print(f' - {fn}    id={cid}   version={ver}')
+            sig = minhash(shingles(d))
+            sim = f'   similarity~{estimated_similarity(base, sig):.2f}' if fp.startswith('near:') and base and sig else ''
+            print(f' - {fn}    id={cid}   version={ver}{sim}')
+
+def choose_canonical(files, datas):
+    """Prefer a non-UUID id; otherwise the first file of the group."""
+    choices = list(zip(files, datas))
+    for fn, d in choices:
+        if not is_uuid(d.get('id', '')):
+            return fn, d
+    return choices[0]
+
+def build_reverse_index(lessons_dir=None):
+    """concept id -> [lesson file names], plus the parsed lessons, from one pass over the lessons."""
+    lessons_dir = lessons_dir or LESSONS_DIR
+    index, lessons = {}, {}
+    for lf in sorted(os.listdir(lessons_dir)):
+        if not lf.endswith('.json'):
+            continue
+        try:
+            ld = load_json(os.path.join(lessons_dir, lf))
+        except Exception:
+            continue
+        lessons[lf] = ld
+        for c in ld.get('concepts', []):
+            if isinstance(c, str):
+                index.setdefault(c, []).append(lf)
+    return index, lessons
+
+def remap_concepts(concepts, remap):
+    """
+    Apply an old->canonical id map, dropping only the repeats the merge
+    creates; a lesson that repeats an id on purpose keeps its repeats.
+    """
+    out, present, merged = [], set(), set()
+    for c in concepts:
+        if isinstance(c, str):
+            target = remap.get(c, c)
+            # A remapped id landing on one already listed, or the canonical id following its merged copy
+            if target in present and (c in remap or target in merged):
+                continue
+            if c in remap:
+                merged.add(target)
+            present.add(target)
+            c = target
+        out.append(c)
+    return out
 
 def apply_cleanup(dup):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    remap, doomed = {}, []
     for fp, (files, datas) in dup.items():
-        # choose canonical: prefer non-uuid id
-        choices = list(zip(files,datas))
-        canonical_fn, canonical_data = None, None
-        for fn,d in choices:
-            if not is_uuid(d.get('id','')):
-                canonical_fn, canonical_data = fn,d
-                break
-        if not canonical_fn:
-            canonical_fn, canonical_data = choices[0]
-
+        canonical_fn, canonical_data = choose_canonical(files, datas)
         canonical_id = canonical_data.get('id')
-        # remove others
-        for fn,d in choices:
+        for fn, d in zip(files, datas):
             if fn == canonical_fn:
                 continue
-            old_id = d.get('id')
-            old_path = os.path.join(CONCEPTS_DIR, fn)
-            print(f'Deleting duplicate file: {old_path} (id={old_id})')
-            try:
-                os.remove(old_path)
-            except Exception as e:
-                print('  failed to delete:', e)
-            # update installed_content table: replace old_id with canonical_id
-            try:
-                cur.execute('UPDATE installed_content SET content_id = ? WHERE content_id = ?', (canonical_id, old_id))
-            except Exception:
-                pass
-            # update lessons referencing old_id
-            for lf in os.listdir(LESSONS_DIR):
-                if not lf.endswith('.json'):
-                    continue
-                lp = os.path.join(LESSONS_DIR, lf)
-                try:
-                    ld = load_json(lp)
-                except Exception:
-                    continue
-                changed = False
-                concepts = ld.get('concepts', [])
-                new_concepts = [canonical_id if c==old_id else c for c in concepts]
-                if new_concepts != concepts:
-                    ld['concepts'] = new_concepts
-                    with open(lp, 'w', encoding='utf-8') as f:
-                        json.dump(ld, f, indent=2, ensure_ascii=False)
-                    print(f'  updated lesson {lf} replacing {old_id} -> {canonical_id}')
-    conn.commit()
-    conn.close()
+            remap[d.get('id')] = canonical_id
+            doomed.append((fn, d.get('id')))
+
+    # 1. Every affected lesson is rewritten once, atomically, with all remaps applied
+    reverse, lessons = build_reverse_index()
+    affected = sorted({lf for old_id in remap for lf in reverse.get(old_id, [])})
+    for lf in affected:
+        ld = lessons[lf]
+        ld['concepts'] = remap_concepts(ld.get('concepts', []), remap)
+        save_json_atomic(os.path.join(LESSONS_DIR, lf), ld)
+        print(f'  updated lesson {lf}')
+
+    # 2. update installed_content table: replace old ids with canonical ids in one transaction
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        with conn:
+            for old, new in remap.items():
+                # Canonical id already installed: merge by dropping the old row instead of colliding with it
+                if conn.execute("SELECT 1 FROM installed_content WHERE content_id = ? AND type = 'concept'", (new,)).fetchone():
+                    conn.execute("DELETE FROM installed_content WHERE content_id = ? AND type = 'concept'", (old,))
+                else:
+                    conn.execute("UPDATE installed_content SET content_id = ? WHERE content_id = ? AND type = 'concept'", (new, old))
+        conn.close()
+    except sqlite3.Error as e:
+        print('  failed to update installed_content:', e)
+
+    # 3. Only now that nothing references them, remove the duplicate files
+    for fn, old_id in doomed:
+        old_path = os.path.join(CONCEPTS_DIR, fn)
+        print(f'Deleting duplicate file: {old_path} (id={old_id} -> {remap[old_id]})')
+        try:
+            os.remove(old_path)
+        except Exception as e:
+            print('  failed to delete:', e)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--apply', action='store_true')
+    parser.add_argument('--near', action='store_true', help='also merge near-duplicate concepts (MinHash estimate)')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: CPU count)')
     args = parser.parse_args()
 
-    dup = find_duplicates()
+    dup = find_duplicates(include_near=args.near, workers=args.workers)
     show_preview(dup)
     if args.apply:
         if not dup:
@@ -0,0 +1,387 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tarfile
+import time
+import uuid
+
+import content_store
+from content_validator import validate_concept, validate_lesson, validate_payload
+
+PACK_FORMAT = "brightstudy-content-pack"
+PACK_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Largest manifest accepted on import
+MAX_MANIFEST_BYTES = 16 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+# Archive paths mirror the pune_content layout
+LESSONS = "lessons"
+CONCEPTS = "concepts"
+VIDEOS = "assets/videos"
+THUMBNAILS = "assets/thumbnails"
+_ALLOWED_DIRS = (LESSONS, CONCEPTS, VIDEOS, THUMBNAILS)
+
+
+class PackError(Exception):
+    pass
+
+
+class _LimitedReader:
+    """File-like view of the first `length` bytes of a stream (an HTTP body must not be over-read)."""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _newer_or_same(installed, version):
+    try:
+        return installed is not None and installed >= version
+    except TypeError:
+        return installed == version
+
+
+class ContentPacks:
+    """
+    Export installed lessons (with their concepts, videos and thumbnails)
+    as one tar stream, and install such a stream on another device. The
+    manifest is the first member and lists every file with its SHA-256,
+    so the importer verifies each file as it arrives without holding the
+    archive in memory. Nothing goes live unless the whole pack verifies
+    and validates; installed versions are then recorded in one transaction.
+    """
+
+    def __init__(self, content_dir, db_path, catalog):
+        self.content_dir = content_dir
+        self.db_path = db_path
+        self.catalog = catalog
+
+    def _path(self, rel_path):
+        return os.path.join(self.content_dir, *rel_path.split("/"))
+
+    def _db(self):
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        # Same shapes as updater.get_db and the catalog
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS cached_content (
+                id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (id, type)
+            )
+        """)
+        cur.execute("CREATE TABLE IF NOT EXISTS content_aliases (alias TEXT PRIMARY KEY, canonical TEXT)")
+        conn.commit()
+        return conn
+
+    def _installed(self):
+        """({(id, type): version}, {alias: canonical}) from the local database."""
+        conn = self._db()
+        cur = conn.cursor()
+        cur.execute("SELECT id, type, version FROM cached_content")
+        versions = {(r[0], r[1]): r[2] for r in cur.fetchall()}
+        cur.execute("SELECT alias, canonical FROM content_aliases")
+        aliases = dict(cur.fetchall())
+        conn.close()
+        return versions, aliases
+
+    # ---------- export ----------
+
+    def plan_export(self, lesson_ids, course=None):
+        """
+        Resolve lessons to every file the pack needs and checksum them.
+        Raises LookupError naming lessons that are not installed. The
+        returned plan is passed to write_pack().
+        """
+        versions, aliases = self._installed()
+        missing = [l for l in lesson_ids if not os.path.exists(self._path(f"{LESSONS}/{l}.json"))]
+        if missing:
+            raise LookupError(f"Lessons not installed: {', '.join(missing)}")
+
+        json_entries, asset_paths = {}, []
+        manifest = {
+            "format": PACK_FORMAT, "format_version": PACK_FORMAT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "course": course or {}, "lessons": [], "concepts": [], "videos": [], "aliases": {}, "files": [],
+        }
+
+        def add_json(rel_path, data):
+            json_entries[rel_path] = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        def add_videos(concept):
+            for v in concept.get("videos") or []:
+                vid = v.get("id") if isinstance(v, dict) else None
+                if not vid or vid in manifest["videos"]:
+                    continue
+                manifest["videos"].append(vid)
+                if os.path.exists(self._path(f"{VIDEOS}/{vid}.mp4")):
+                    asset_paths.append(f"{VIDEOS}/{vid}.mp4")
+                meta_path = self._path(f"{VIDEOS}/{vid}.json")
+                if os.path.exists(meta_path):
+                    meta = content_store.load_json(meta_path)
+                    add_json(f"{VIDEOS}/{vid}.json", meta)
+                    if meta.get("local_thumb") and os.path.exists(self._path(meta["local_thumb"])):
+                        asset_paths.append(meta["local_thumb"])
+
+        for lesson_id in lesson_ids:
+            lesson = content_store.load_json(self._path(f"{LESSONS}/{lesson_id}.json"))
+            add_json(f"{LESSONS}/{lesson_id}.json", lesson)
+            manifest["lessons"].append({"id": lesson_id, "version": versions.get((lesson_id, "lesson"), 1)})
+            for c in lesson.get("concepts") or []:
+                if isinstance(c, dict):
+                    add_videos(c)
+                    continue
+                cid = aliases.get(c, c)
+                if cid != c:
+                    manifest["aliases"][c] = cid
+                if f"{CONCEPTS}/{cid}.json" in json_entries:
+                    continue
+                cpath = self._path(f"{CONCEPTS}/{cid}.json")
+                if not os.path.exists(cpath):
+                    raise LookupError(f"Lesson {lesson_id} references missing concept '{c}'")
+                concept = content_store.load_json(cpath)
+                add_json(f"{CONCEPTS}/{cid}.json", concept)
+                manifest["concepts"].append({"id": cid, "version": versions.get((cid, "concept"), concept.get("version") or 1)})
+                add_videos(concept)
+
+        for rel_path, data in json_entries.items():
+            manifest["files"].append({"path": rel_path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+        for rel_path in dict.fromkeys(asset_paths):
+            full = self._path(rel_path)
+            manifest["files"].append({"path": rel_path, "size": os.path.getsize(full), "sha256": _sha256_file(full)})
+        return {"manifest": manifest, "json": json_entries}
+
+    def write_pack(self, plan, out):
+        """Stream a planned pack as an uncompressed tar (videos are already compressed) to `out`."""
+        manifest = plan["manifest"]
+        now = time.time()
+
+        def add(name, size, fileobj):
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = now
+            info.mode = 0o644
+            tar.addfile(info, fileobj)
+
+        with tarfile.open(fileobj=out, mode="w|") as tar:
+            data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+            add(MANIFEST_NAME, len(data), io.BytesIO(data))
+            for entry in manifest["files"]:
+                if entry["path"] in plan["json"]:
+                    add(entry["path"], entry["size"], io.BytesIO(plan["json"][entry["path"]]))
+                else:
+                    with open(self._path(entry["path"]), "rb") as f:
+                        add(entry["path"], entry["size"], f)
+        print(f"📦 [Packs] Exported {len(manifest['lessons'])} lesson(s), {len(manifest['concepts'])} concept(s), "
+              f"{len(manifest['videos'])} video(s)")
+        return manifest
+
+    def export(self, lesson_ids, out_path, course=None):
+        plan = self.plan_export(lesson_ids, course)
+        with open(out_path + ".tmp", "wb") as f:
+            manifest = self.write_pack(plan, f)
+        os.replace(out_path + ".tmp", out_path)
+        return manifest
+
+    # ---------- import ----------
+
+    def _read_manifest(self, tar):
+        member = tar.next()
+        if member is None or member.name != MANIFEST_NAME or not member.isfile():
+            raise PackError("Pack must start with manifest.json")
+        if member.size > MAX_MANIFEST_BYTES:
+            raise PackError("Manifest is too large")
+        try:
+            manifest = json.loads(tar.extractfile(member).read().decode("utf-8"))
+        except ValueError as e:
+            raise PackError(f"Manifest is not valid JSON: {e}")
+        if manifest.get("format") != PACK_FORMAT:
+            raise PackError("Not a content pack")
+        if manifest.get("format_version") != PACK_FORMAT_VERSION:
+            raise PackError(f"Unsupported pack version {manifest.get('format_version')}")
+        files = {}
+        for entry in manifest.get("files") or []:
+            path = entry.get("path") or ""
+            parts = path.split("/")
+            if "/".join(parts[:-1]) not in _ALLOWED_DIRS or parts[-1] in ("", ".", "..") or "\\" in path:
+                raise PackError(f"Illegal path in manifest: {path!r}")
+            files[path] = entry
+        # Ids become file names on install: each must name a file the pack actually carries
+        for key, rel_dir in (("lessons", LESSONS), ("concepts", CONCEPTS)):
+            for item in manifest.get(key) or []:
+                item_id = item.get("id") if isinstance(item, dict) else None
+                if not isinstance(item_id, str) or item_id in ("", ".") or any(s in item_id for s in ("/", "\\", "..")):
+                    raise PackError(f"Illegal {key[:-1]} id in manifest: {item_id!r}")
+                if f"{rel_dir}/{item_id}.json" not in files:
+                    raise PackError(f"Manifest lists {key[:-1]} {item_id!r} without its file")
+        return manifest, files
+
+    def _stage(self, tar, files, staging):
+        """Copy members into `staging`, hashing as they stream; every listed file must arrive intact."""
+        seen = set()
+        # next(), not iteration: iterating a stream-mode tar replays the manifest member
+        for member in iter(tar.next, None):
+            entry = files.get(member.name)
+            if entry is None or not member.isfile():
+                raise PackError(f"Unexpected member {member.name!r}")
+            if member.name in seen:
+                raise PackError(f"Duplicate member {member.name!r}")
+            if member.size != entry["size"]:
+                raise PackError(f"{member.name}: size mismatch")
+            dest = os.path.join(staging, *member.name.split("/"))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            digest = hashlib.sha256()
+            src = tar.extractfile(member)
+            with open(dest, "wb") as f:
+                for block in iter(lambda: src.read(READ_SIZE), b""):
+                    digest.update(block)
+                    f.write(block)
+            if digest.hexdigest() != entry["sha256"]:
+                raise PackError(f"{member.name}: checksum mismatch")
+            seen.add(member.name)
+        absent = set(files) - seen
+        if absent:
+            raise PackError(f"Pack is truncated; missing {len(absent)} file(s)")
+
+    def import_pack(self, stream, length=None):
+        """
+        Verify and install a pack read from `stream` (a file object; pass
+        `length` for an HTTP body). Returns {'lessons', 'concepts', 'videos',
+        'skipped'}; raises PackError if the pack is damaged or invalid, in
+        which case nothing is installed.
+        """
+        if length is not None:
+            stream = _LimitedReader(stream, length)
+        staging = os.path.join(self.content_dir, ".pack_staging", uuid.uuid4().hex)
+        os.makedirs(staging)
+        try:
+            try:
+                with tarfile.open(fileobj=stream, mode="r|*") as tar:
+                    manifest, files = self._read_manifest(tar)
+                    self._stage(tar, files, staging)
+            except tarfile.TarError as e:
+                raise PackError(f"Not a readable archive: {e}")
+            return self._install(manifest, files, staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _install(self, manifest, files, staging):
+        versions, aliases = self._installed()
+        aliases = {**aliases, **(manifest.get("aliases") or {})}
+
+        def staged(kind, item_id):
+            with open(os.path.join(staging, *kind.split("/"), f"{item_id}.json"), "rb") as f:
+                return json.loads(f.read().decode("utf-8"))
+
+        concepts = {c["id"]: (c.get("version") or 1, staged(CONCEPTS, c["id"])) for c in manifest.get("concepts") or []}
+        lessons = {l["id"]: (l.get("version") or 1, staged(LESSONS, l["id"])) for l in manifest.get("lessons") or []}
+
+        # Validate everything before anything is installed
+        problems = []
+        for cid, (_, concept) in concepts.items():
+            problems.extend(f"concept {cid}: {p}" for p in validate_concept(concept))
+        for lid, (_, lesson) in lessons.items():
+            problems.extend(f"lesson {lid}: {p}" for p in validate_lesson(lesson))
+            pack_concepts = {cid: c for cid, (_, c) in concepts.items()}
+            problems.extend(f"lesson {lid}: {p}" for p in validate_payload(lesson, pack_concepts, self._path(CONCEPTS), aliases))
+        if problems:
+            raise PackError("; ".join(problems))
+
+        report = {"lessons": [], "concepts": [], "videos": [], "skipped": []}
+        # Assets first, then concepts, then lessons: a lesson never goes live before what it uses
+        for path in files:
+            if path.startswith(("assets/videos/", "assets/thumbnails/")):
+                dest = self._path(path)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                if path.endswith(".json"):
+                    content_store.save_json(dest, staged(VIDEOS, os.path.basename(path)[:-5]))
+                    self.catalog.index_file(dest)
+                else:
+                    os.replace(os.path.join(staging, *path.split("/")), dest)
+                    if path.startswith(VIDEOS):
+                        report["videos"].append(os.path.basename(path)[:-4])
+
+        rows = []
+        for kind, items in (("concept", concepts), ("lesson", lessons)):
+            rel_dir = CONCEPTS if kind == "concept" else LESSONS
+            for item_id, (version, data) in items.items():
+                dest = self._path(f"{rel_dir}/{item_id}.json")
+                if _newer_or_same(versions.get((item_id, kind)), version) and os.path.exists(dest):
+                    report["skipped"].append({"id": item_id, "type": kind, "installed": versions[(item_id, kind)]})
+                    continue
+                content_store.save_json(dest, data)
+                self.catalog.index_file(dest)
+                rows.append((item_id, kind, version))
+                report[f"{kind}s"].append(item_id)
+
+        conn = self._db()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO content_aliases (alias, canonical) VALUES (?, ?)",
+                             list((manifest.get("aliases") or {}).items()))
+            conn.executemany("INSERT OR REPLACE INTO cached_content (id, type, version) VALUES (?, ?, ?)", rows)
+        conn.close()
+        print(f"📦 [Packs] Installed {len(report['lessons'])} lesson(s), {len(report['concepts'])} concept(s), "
+              f"{len(report['videos'])} video(s); {len(report['skipped'])} already up to date")
+        return report
+
+
+def main(argv=None):
+    from updater import PUNE_CONTENT_DIR, DB_PATH, catalog, fetch_course_lessons, download_specific_item
+
+    parser = argparse.ArgumentParser(description="Export or import offline content packs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="bundle installed lessons into a pack")
+    exp.add_argument("output")
+    exp.add_argument("--course", help="export every lesson of this course (needs internet to resolve it)")
+    exp.add_argument("--lessons", nargs="*", default=[], help="lesson ids to export")
+    imp = sub.add_parser("import", help="verify and install a pack")
+    imp.add_argument("pack")
+    args = parser.parse_args(argv)
+
+    packs = ContentPacks(PUNE_CONTENT_DIR, DB_PATH, catalog)
+    try:
+        if args.command == "import":
+            with open(args.pack, "rb") as f:
+                print(json.dumps(packs.import_pack(f), indent=2))
+            return 0
+        lesson_ids, course = list(args.lessons), None
+        if args.course:
+            course = {"id": args.course}
+            lesson_ids += [l for l in fetch_course_lessons(args.course) if l not in lesson_ids]
+            # Fetch whatever this device doesn't have yet, so the pack is complete
+            for lesson_id in lesson_ids:
+                if not os.path.exists(os.path.join(PUNE_CONTENT_DIR, LESSONS, f"{lesson_id}.json")):
+                    download_specific_item(lesson_id, "lesson")
+        packs.export(lesson_ids, args.output, course)
+        return 0
+    except (PackError, LookupError) as e:
+        print(f"❌ {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 'plain' writes pretty-printed JSON as before; 'compressed' writes compact,
+# dictionary-compressed JSON. Both are always readable.
+STORAGE_MODE = os.environ.get("CONTENT_STORAGE", "plain")
+DICT_DIR = os.environ.get("CONTENT_DICT_DIR", os.path.join(BASE_DIR, "pune_content", "dictionaries"))
+# zlib only looks back 32 KB, so a longer dictionary is wasted
+DICT_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 9
+# Decoded JSON text kept in memory, in characters
+CACHE_CHARS = 8 * 1024 * 1024
+
+# File header: magic, then the 8-byte id of the dictionary the body was compressed with
+MAGIC = b"PZC1"
+NO_DICT = b"\0" * 8
+
+# Quoted strings (keys with their colon) are the fragments worth sharing across files
+_FRAGMENT = re.compile(r'"(?:[^"\\]|\\.){1,64}"[:,]?')
+
+_cache = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+_dicts = {}
+
+
+def is_compressed(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# ---------- dictionaries ----------
+
+def _dict_path(dict_id):
+    return os.path.join(DICT_DIR, f"{dict_id.hex()}.zdict")
+
+
+def _load_dictionary(dict_id):
+    zdict = _dicts.get(dict_id)
+    if zdict is None:
+        with open(_dict_path(dict_id), "rb") as f:
+            zdict = _dicts[dict_id] = f.read()
+    return zdict
+
+
+def current_dictionary():
+    """(id, bytes) of the dictionary new files are compressed with, or (NO_DICT, None)."""
+    try:
+        with open(os.path.join(DICT_DIR, "current"), "r", encoding="utf-8") as f:
+            dict_id = bytes.fromhex(f.read().strip())
+        return dict_id, _load_dictionary(dict_id)
+    except (OSError, ValueError):
+        return NO_DICT, None
+
+
+def train_dictionary(samples, size=DICT_SIZE):
+    """
+    Build a zlib preset dictionary from sample JSON texts: the quoted
+    strings that recur across samples, the most valuable (count x length)
+    placed last, where zlib finds them at the shortest distance.
+    """
+    counts = Counter()
+    for text in samples:
+        counts.update(set(_FRAGMENT.findall(text)))
+    ranked = sorted((f for f, c in counts.items() if c > 1), key=lambda f: (counts[f] * len(f), f), reverse=True)
+    picked, used = [], 0
+    for fragment in ranked:
+        data = fragment.encode("utf-8")
+        if used + len(data) > size:
+            break
+        picked.append(data)
+        used += len(data)
+    return b"".join(reversed(picked))
+
+
+def train(directories):
+    """Train a dictionary on every JSON file in `directories` and make it current. Returns its id."""
+    samples = [_dumps(load_json(p), compact=True) for p in _json_files(directories)]
+    zdict = train_dictionary(samples)
+    dict_id = hashlib.sha1(zdict).digest()[:8]
+    os.makedirs(DICT_DIR, exist_ok=True)
+    # Dictionaries are never overwritten: files compressed with an older one must stay readable
+    if not os.path.exists(_dict_path(dict_id)):
+        with open(_dict_path(dict_id) + ".tmp", "wb") as f:
+            f.write(zdict)
+        os.replace(_dict_path(dict_id) + ".tmp", _dict_path(dict_id))
+    with open(os.path.join(DICT_DIR, "current.tmp"), "w", encoding="utf-8") as f:
+        f.write(dict_id.hex())
+    os.replace(os.path.join(DICT_DIR, "current.tmp"), os.path.join(DICT_DIR, "current"))
+    _dicts[dict_id] = zdict
+    print(f"🗜️ [ContentStore] Trained {len(zdict)} byte dictionary {dict_id.hex()} on {len(samples)} file(s)")
+    return dict_id
+
+
+# ---------- encode / decode ----------
+
+def _dumps(data, compact):
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def encode(data, compress=None):
+    """File bytes for `data`: compact and compressed, or pretty-printed plain JSON."""
+    if compress is None:
+        compress = STORAGE_MODE == "compressed"
+    if not compress:
+        return _dumps(data, compact=False).encode("utf-8")
+    dict_id, zdict = current_dictionary()
+    c = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESSION_LEVEL)
+    return MAGIC + dict_id + c.compress(_dumps(data, compact=True).encode("utf-8")) + c.flush()
+
+
+def decode(raw):
+    """JSON text from file bytes in either format."""
+    if not raw.startswith(MAGIC):
+        return raw.decode("utf-8-sig")
+    dict_id = raw[len(MAGIC):len(MAGIC) + 8]
+    body = raw[len(MAGIC) + 8:]
+    d = zlib.decompressobj(zdict=_load_dictionary(dict_id)) if dict_id != NO_DICT else zlib.decompressobj()
+    return (d.decompress(body) + d.flush()).decode("utf-8")
+
+
+# ---------- read / write ----------
+
+def read_text(path):
+    """
+    Decoded JSON text of a content file, plain or compressed. Decoded text
+    is cached per (path, mtime, size), so repeat reads of an unchanged file
+    skip the read and the decompression.
+    """
+    global _cache_chars
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            _cache.move_to_end(path)
+            return cached[1]
+    with open(path, "rb") as f:
+        text = decode(f.read())
+    with _cache_lock:
+        old = _cache.pop(path, None)
+        if old:
+            _cache_chars -= len(old[1])
+        if len(text) <= CACHE_CHARS:
+            _cache[path] = (key, text)
+            _cache_chars += len(text)
+        while _cache_chars > CACHE_CHARS:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _cache_chars -= len(evicted)
+    return text
+
+
+def load_json(path):
+    return json.loads(read_text(path))
+
+
+def save_json(path, data, compress=None):
+    """Write a content file atomically, compressed when STORAGE_MODE (or `compress`) says so."""
+    with open(path + ".tmp", "wb") as f:
+        f.write(encode(data, compress))
+    os.replace(path + ".tmp", path)
+
+
+# ---------- migration ----------
+
+def _json_files(directories):
+    for directory in directories:
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    yield os.path.join(directory, name)
+
+
+def migrate(directories, compress=True):
+    """
+    Rewrite every JSON file in `directories` into the requested format.
+    Files already in that format (and, when compressing, already using
+    the current dictionary) are left alone. Returns the number rewritten.
+    """
+    dict_id, _ = current_dictionary()
+    changed = 0
+    for path in _json_files(directories):
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + 8)
+        if compress == (head[:len(MAGIC)] == MAGIC) and (not compress or head[len(MAGIC):] == dict_id):
+            continue
+        try:
+            data = load_json(path)
+        except (ValueError, OSError, zlib.error) as e:
+            print(f"⚠️ [ContentStore] Skipping {os.path.basename(path)}: {e}")
+            continue
+        save_json(path, data, compress)
+        changed += 1
+    print(f"🗜️ [ContentStore] {'Compressed' if compress else 'Decompressed'} {changed} file(s)")
+    return changed
+
+
+def main(argv=None):
+    from updater import LESSONS_DIR, CONCEPTS_DIR, VIDEOS_DIR, catalog
+
+    parser = argparse.ArgumentParser(description="Compress or decompress installed lesson/concept JSON.")
+    parser.add_argument("--train", action="store_true", help="train a new shared dictionary first")
+    parser.add_argument("--decompress", action="store_true", help="rewrite everything as plain JSON")
+    args = parser.parse_args(argv)
+
+    dirs = [LESSONS_DIR, CONCEPTS_DIR, VIDEOS_DIR]
+    if args.train:
+        train(dirs)
+    migrate(dirs, compress=not args.decompress)
+    catalog.refresh()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
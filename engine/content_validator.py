@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import content_store
+
+# Below this many files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+
+
+def _non_empty_str(value):
+    return isinstance(value, str) and value.strip() != ""
+
+
+def _soft(warnings, problem):
+    if warnings is not None:
+        warnings.append(problem)
+
+
+def validate_concept(concept, warnings=None, embedded=False):
+    """
+    Structural problems for an installed concept (empty list when valid).
+    Empty text that only makes the concept less useful is appended to
+    `warnings` instead, so content already in use keeps syncing. An
+    `embedded` concept lives inside its lesson and needs no id.
+    """
+    if not isinstance(concept, dict):
+        return ["concept is not an object"]
+    problems = []
+    if not _non_empty_str(concept.get("id")):
+        if not embedded:
+            problems.append("missing id")
+    if concept.get("explain") is not None and not isinstance(concept["explain"], str):
+        problems.append("explain must be a string")
+    elif not _non_empty_str(concept.get("explain")):
+        _soft(warnings, "missing explain")
+    check = concept.get("check")
+    if check is None:
+        _soft(warnings, "missing check")
+    elif not isinstance(check, dict):
+        problems.append("check must be an object")
+    else:
+        question, keywords = check.get("question"), check.get("keywords")
+        if question is not None and not isinstance(question, str):
+            problems.append("check.question must be a string")
+        elif not _non_empty_str(question):
+            _soft(warnings, "missing check.question")
+        if keywords is not None and not (isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)):
+            problems.append("check.keywords must be a list of strings")
+        # grading.grade_answer falls back to similarity with desired_answer
+        elif not any(_non_empty_str(k) for k in keywords or []) and not _non_empty_str(check.get("desired_answer")):
+            _soft(warnings, "check has no keywords or desired_answer to grade against")
+        synonyms = check.get("synonyms")
+        if synonyms is not None and not (isinstance(synonyms, dict) and all(isinstance(v, list) for v in synonyms.values())):
+            problems.append("check.synonyms must map keywords to lists")
+    videos = concept.get("videos")
+    if videos is not None:
+        if not isinstance(videos, list):
+            problems.append("videos must be a list")
+        else:
+            for i, v in enumerate(videos):
+                if not isinstance(v, dict) or not _non_empty_str(v.get("id")):
+                    problems.append(f"videos[{i}] is missing id")
+    return problems
+
+
+def validate_lesson(lesson, warnings=None):
+    """Structural problems for a lesson; embedded concepts are checked too."""
+    if not isinstance(lesson, dict):
+        return ["lesson is not an object"]
+    problems = []
+    if not _non_empty_str(lesson.get("lesson_id") or lesson.get("id")):
+        problems.append("missing lesson_id")
+    if lesson.get("title") is not None and not isinstance(lesson["title"], str):
+        problems.append("title must be a string")
+    elif not _non_empty_str(lesson.get("title")):
+        _soft(warnings, "missing title")
+    concepts = lesson.get("concepts")
+    if concepts is not None and not isinstance(concepts, list):
+        problems.append("concepts must be a list")
+        return problems
+    if not concepts:
+        _soft(warnings, "lesson has no concepts")
+        return problems
+    for i, c in enumerate(concepts):
+        if isinstance(c, dict):
+            soft = []
+            problems.extend(f"concepts[{i}]: {p}" for p in validate_concept(c, soft, embedded=True))
+            for p in soft:
+                _soft(warnings, f"concepts[{i}]: {p}")
+        elif not _non_empty_str(c):
+            problems.append(f"concepts[{i}] must be a concept id or object")
+    return problems
+
+
+def validate_video(video):
+    if not isinstance(video, dict):
+        return ["video is not an object"]
+    problems = []
+    if not _non_empty_str(video.get("id")):
+        problems.append("missing id")
+    if not _non_empty_str(video.get("local_video")):
+        problems.append("missing local_video")
+    return problems
+
+
+def _concept_video_refs(concept):
+    return [v["id"] for v in concept.get("videos") or [] if isinstance(v, dict) and v.get("id") and v.get("url")]
+
+
+def check_file(kind, path):
+    """
+    Parse and schema-check one content file. Returns a picklable dict with
+    the file's problems and the references it makes, so the cross-file
+    checks can run in the parent after a parallel scan.
+    """
+    out = {"kind": kind, "path": path, "id": os.path.basename(path)[:-5], "problems": [], "warnings": [],
+           "concept_refs": [], "video_refs": [], "asset_refs": []}
+    try:
+        data = content_store.load_json(path)
+    except Exception as e:
+        out["problems"].append(f"unreadable JSON: {e}")
+        return out
+
+    if kind == "lesson":
+        out["problems"] = validate_lesson(data, out["warnings"])
+        for c in (data.get("concepts") or []) if isinstance(data, dict) else []:
+            if isinstance(c, dict):
+                out["video_refs"].extend(_concept_video_refs(c))
+            elif _non_empty_str(c):
+                out["concept_refs"].append(c)
+    elif kind == "concept":
+        out["problems"] = validate_concept(data, out["warnings"])
+        if isinstance(data, dict):
+            out["video_refs"] = _concept_video_refs(data)
+            if data.get("id") and data["id"] != out["id"]:
+                out["problems"].append(f"id '{data['id']}' does not match file name")
+    else:
+        out["problems"] = validate_video(data)
+        if isinstance(data, dict) and _non_empty_str(data.get("local_video")):
+            out["asset_refs"].append(data["local_video"])
+    return out
+
+
+def _check_file_args(args):
+    return check_file(*args)
+
+
+def _list_json(directory):
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".json"))
+
+
+def validate_tree(lessons_dir, concepts_dir, videos_dir, aliases=None, workers=None):
+    """
+    Validate every lesson, concept and video JSON file and the references
+    between them. Files are checked in a process pool when there are more
+    than PARALLEL_THRESHOLD of them. Returns a JSON-serializable report:
+    {'ok', 'counts', 'errors': [{'kind', 'id', 'path', 'problem'}], 'warnings': [...]}.
+    """
+    aliases = aliases or {}
+    tasks = [("lesson", p) for p in _list_json(lessons_dir)]
+    tasks += [("concept", p) for p in _list_json(concepts_dir)]
+    tasks += [("video", p) for p in _list_json(videos_dir)]
+
+    if len(tasks) > PARALLEL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_check_file_args, tasks, chunksize=32))
+    else:
+        results = [check_file(kind, path) for kind, path in tasks]
+
+    errors, warnings = [], []
+
+    def report(bucket, r, problem):
+        bucket.append({"kind": r["kind"], "id": r["id"], "path": r["path"], "problem": problem})
+
+    concept_ids = {r["id"] for r in results if r["kind"] == "concept"}
+    referenced = set()
+    for r in results:
+        for p in r["problems"]:
+            report(errors, r, p)
+        for p in r["warnings"]:
+            report(warnings, r, p)
+        for ref in r["concept_refs"]:
+            target = aliases.get(ref, ref)
+            referenced.add(target)
+            if target not in concept_ids:
+                report(errors, r, f"references missing concept '{ref}'")
+        # Video files come and go on purpose (cache eviction, deferred downloads)
+        for vid in r["video_refs"]:
+            if not os.path.exists(os.path.join(videos_dir, f"{vid}.mp4")):
+                report(warnings, r, f"video file '{vid}.mp4' is not downloaded")
+        for asset in r["asset_refs"]:
+            # local_video is relative to the content root (e.g. 'assets/videos/<id>.mp4')
+            if not os.path.exists(os.path.join(videos_dir, os.path.basename(asset))):
+                report(warnings, r, f"asset '{asset}' is not downloaded")
+
+    for r in results:
+        if r["kind"] == "concept" and r["id"] not in referenced and r["id"] not in aliases.values():
+            report(warnings, r, "concept is not used by any installed lesson")
+
+    counts = {}
+    for r in results:
+        counts[r["kind"]] = counts.get(r["kind"], 0) + 1
+    return {"ok": not errors, "counts": counts, "errors": errors, "warnings": warnings}
+
+
+def validate_payload(lesson, concepts, concepts_dir, aliases=None):
+    """
+    Gate for content about to go live: the lesson and its fetched concepts
+    must pass the schema, and every concept reference must resolve to a
+    fetched or already installed concept. Returns a list of problems.
+    """
+    aliases = aliases or {}
+    problems = validate_lesson(lesson)
+    for cid, concept in concepts.items():
+        problems.extend(f"concept {cid}: {p}" for p in validate_concept(concept))
+    for c in lesson.get("concepts") or [] if isinstance(lesson, dict) else []:
+        if isinstance(c, dict) or not _non_empty_str(c):
+            continue
+        target = aliases.get(c, c)
+        if target not in concepts and not os.path.exists(os.path.join(concepts_dir, f"{target}.json")):
+            problems.append(f"references missing concept '{c}'")
+    return problems
+
+
+def main(argv=None):
+    from updater import CONCEPTS_DIR, LESSONS_DIR, VIDEOS_DIR, load_aliases
+
+    parser = argparse.ArgumentParser(description="Validate installed lessons, concepts and videos.")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    report = validate_tree(LESSONS_DIR, CONCEPTS_DIR, VIDEOS_DIR, load_aliases(), args.workers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Checked {report['counts']}")
+        for e in report["errors"]:
+            print(f"❌ {e['kind']} {e['id']}: {e['problem']}")
+        for w in report["warnings"]:
+            print(f"⚠️ {w['kind']} {w['id']}: {w['problem']}")
+        print("✅ Content is valid" if report["ok"] else f"❌ {len(report['errors'])} problem(s) found")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import content_store
+from catalog import LESSON, CONCEPT, VIDEO
+from content_validator import validate_concept, validate_payload
+from updater import get_db, installed_versions, load_aliases
+
+# Parallel downloads for one course install
+DOWNLOAD_WORKERS = int(os.environ.get("COURSE_INSTALL_WORKERS", "4"))
+# Ids per in.() filter, keeping request URLs well under server limits
+BATCH_SIZE = 100
+
+ACTIVE_PHASES = ("resolving", "downloading", "installing")
+
+
+def _in_filter(ids):
+    return "in.(" + ",".join(urllib.parse.quote(str(i), safe="") for i in ids) + ")"
+
+
+def _batches(ids, size=BATCH_SIZE):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _json_field(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class CourseInstaller:
+    """
+    Installs a whole course from one curriculum manifest. The manifest is
+    resolved in a few bulk requests: subjects with their lessons embedded,
+    then referenced concepts and any video URLs not inlined in concepts,
+    fetched with in.() filters. Concepts and videos shared between lessons
+    are fetched once. Missing videos download on one parallel pool with
+    aggregate progress. Concepts are then written before lessons. Finally,
+    their versions and the course record are committed in one transaction.
+    The course counts as installed only if every item made it.
+
+    `get(url)` is a requests-style GET against the REST API at `rest_url`;
+    `download(url, dest)` fetches one file and returns True on success.
+    """
+
+    def __init__(self, content_dir, db_path, catalog, rest_url, get, download, workers=DOWNLOAD_WORKERS):
+        self.content_dir = content_dir
+        self.db_path = db_path
+        self.catalog = catalog
+        self.rest_url = rest_url.rstrip("/")
+        self.get = get
+        self.download = download
+        self.workers = workers
+        self._progress = {}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _init_db(self):
+        if self._ready:
+            return
+        conn = get_db(self.db_path)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS installed_courses (
+                course_id TEXT PRIMARY KEY,
+                lesson_ids TEXT NOT NULL,
+                installed_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+        self._ready = True
+
+    def _rows(self, table, query):
+        res = self.get(f"{self.rest_url}/{table}?{query}")
+        res.raise_for_status()
+        return res.json()
+
+    # ---------- manifest ----------
+
+    def resolve(self, course_id):
+        """
+        The course's curriculum manifest: {'lessons': {id: (version, data)}
+        in curriculum order, 'concepts': {id: (version, data)},
+        'videos': {id: url}, 'missing': [concept ids the cloud lacks],
+        'requests': n}. Raises LookupError for a course with no lessons.
+        """
+        subjects = self._rows("delivery_subjects", (
+            f"course_id=eq.{urllib.parse.quote(str(course_id), safe='')}"
+            "&select=order,lessons:delivery_lessons(lesson_id,version,order_index,json_data)&order=order.asc"
+        ))
+        requests_made = 1
+
+        lessons = {}
+        for subject in subjects:
+            for row in sorted(subject.get("lessons") or [], key=lambda l: l.get("order_index") or 0):
+                if row["lesson_id"] in lessons:
+                    continue
+                data = _json_field(row.get("json_data")) or {}
+                data.setdefault("order_index", row.get("order_index") or 0)
+                data.setdefault("lesson_id", row["lesson_id"])
+                lessons[row["lesson_id"]] = (row.get("version") or 1, data)
+        if not lessons:
+            raise LookupError(f"Course {course_id} has no lessons")
+
+        concepts, referenced = {}, []
+        for _, data in lessons.values():
+            for c in data.get("concepts") or []:
+                if isinstance(c, dict):
+                    if c.get("id") and c["id"] not in concepts:
+                        concepts[c["id"]] = (c.get("version") or 1, c)
+                elif c not in referenced:
+                    referenced.append(c)
+
+        to_fetch = [c for c in referenced if c not in concepts]
+        for batch in _batches(to_fetch):
+            for row in self._rows("delivery_concepts", f"id={_in_filter(batch)}&select=id,version,json_data"):
+                concept = _json_field(row.get("json_data")) or {}
+                concept["id"] = row["id"]
+                concept["version"] = row.get("version") or 1
+                concepts[row["id"]] = (concept["version"], concept)
+            requests_made += 1
+
+        videos, unknown = {}, []
+        for _, concept in concepts.values():
+            for v in concept.get("videos") or []:
+                if not isinstance(v, dict) or not v.get("id") or v["id"] in videos:
+                    continue
+                if v.get("url"):
+                    videos[v["id"]] = v["url"]
+                elif v["id"] not in unknown:
+                    unknown.append(v["id"])
+        for batch in _batches(unknown):
+            for row in self._rows("videos", f"id={_in_filter(batch)}&select=id,url"):
+                if row.get("url"):
+                    videos[row["id"]] = row["url"]
+            requests_made += 1
+
+        return {"course_id": course_id, "lessons": lessons, "concepts": concepts, "videos": videos,
+                "missing": [c for c in to_fetch if c not in concepts], "requests": requests_made}
+
+    # ---------- install ----------
+
+    def _video_path(self, video_id):
+        return os.path.join(self.catalog.dirs[VIDEO], f"{video_id}.mp4")
+
+    def _report(self, course_id, **fields):
+        with self._lock:
+            self._progress.setdefault(course_id, {}).update(fields, updated_at=time.time())
+
+    def progress(self, course_id):
+        with self._lock:
+            state = self._progress.get(course_id)
+            return dict(state) if state else None
+
+    def start(self, course_id, on_done=None):
+        """Install on a background thread unless one is already running; returns the current progress."""
+        with self._lock:
+            state = self._progress.get(course_id)
+            if state and state.get("phase") in ACTIVE_PHASES:
+                return dict(state)
+            self._progress[course_id] = {"phase": "resolving", "updated_at": time.time()}
+
+        def _run():
+            try:
+                self.install(course_id)
+            except Exception:
+                pass
+            if on_done:
+                on_done()
+
+        threading.Thread(target=_run, daemon=True).start()
+        return self.progress(course_id)
+
+    def install(self, course_id):
+        """Resolve, download and install a whole course. Returns the final report; errors mark it failed."""
+        try:
+            return self._install(course_id)
+        except Exception as e:
+            print(f"❌ [CourseInstall] {course_id} failed: {e}")
+            self._report(course_id, phase="failed", error=str(e))
+            raise
+
+    def _install(self, course_id):
+        self._report(course_id, phase="resolving")
+        manifest = self.resolve(course_id)
+        self._init_db()
+        versions, aliases = installed_versions(self.db_path), load_aliases(self.db_path)
+
+        # Validate before downloading anything
+        rejected = {}
+        concepts = {}
+        for cid, (version, concept) in manifest["concepts"].items():
+            problems = validate_concept(concept)
+            if problems:
+                rejected[f"concept {cid}"] = problems
+            else:
+                concepts[cid] = (version, concept)
+        lessons = {}
+        for lid, (version, lesson) in manifest["lessons"].items():
+            ids = [c.get("id") if isinstance(c, dict) else c for c in lesson.get("concepts") or []]
+            fetched = {c: concepts[c][1] for c in ids if c in concepts}
+            problems = validate_payload(lesson, fetched, self.catalog.dirs[CONCEPT], aliases)
+            if problems:
+                rejected[f"lesson {lid}"] = problems
+            else:
+                lessons[lid] = (version, lesson)
+
+        # One parallel download plan for every video the accepted concepts use
+        needed = {}
+        for _, concept in concepts.values():
+            for v in concept.get("videos") or []:
+                vid = v.get("id") if isinstance(v, dict) else None
+                if vid in manifest["videos"] and not os.path.exists(self._video_path(vid)):
+                    needed[vid] = manifest["videos"][vid]
+        self._report(course_id, phase="downloading", files_total=len(needed), files_done=0, bytes_done=0, failed=[])
+        failed = set()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            futures = {pool.submit(self.download, url, self._video_path(vid)): vid for vid, url in needed.items()}
+            done, received = 0, 0
+            for future in as_completed(futures):
+                vid = futures[future]
+                try:
+                    ok = future.result() and os.path.exists(self._video_path(vid))
+                except Exception as e:
+                    print(f"⚠️ [CourseInstall] Video {vid} failed: {e}")
+                    ok = False
+                done += 1
+                if ok:
+                    received += os.path.getsize(self._video_path(vid))
+                else:
+                    failed.add(vid)
+                self._report(course_id, files_done=done, bytes_done=received, failed=sorted(failed))
+
+        # Concepts before lessons: a lesson never goes live before what it uses
+        self._report(course_id, phase="installing")
+        complete_concepts = {}
+        for cid, (version, concept) in concepts.items():
+            vids = {v.get("id") for v in concept.get("videos") or [] if isinstance(v, dict)}
+            if vids & failed:
+                continue
+            if versions.get((cid, "concept")) != version or not os.path.exists(os.path.join(self.catalog.dirs[CONCEPT], f"{cid}.json")):
+                path = os.path.join(self.catalog.dirs[CONCEPT], f"{cid}.json")
+                content_store.save_json(path, concept)
+                self.catalog.index_file(path)
+            complete_concepts[cid] = version
+
+        complete_lessons = {}
+        for lid, (version, lesson) in lessons.items():
+            used = [c.get("id") if isinstance(c, dict) else aliases.get(c, c) for c in lesson.get("concepts") or []]
+            if not all(c in complete_concepts or versions.get((c, "concept")) for c in used):
+                continue
+            path = os.path.join(self.catalog.dirs[LESSON], f"{lid}.json")
+            content_store.save_json(path, lesson)
+            self.catalog.index_file(path)
+            complete_lessons[lid] = version
+
+        installed = len(complete_lessons) == len(manifest["lessons"]) and not failed
+        conn = get_db(self.db_path)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cached_content (id, type, version) VALUES (?, ?, ?)",
+                             [(cid, "concept", v) for cid, v in complete_concepts.items()] +
+                             [(lid, "lesson", v) for lid, v in complete_lessons.items()])
+            if installed:
+                conn.execute("INSERT OR REPLACE INTO installed_courses (course_id, lesson_ids, installed_at) VALUES (?, ?, ?)",
+                             (str(course_id), json.dumps(list(manifest["lessons"])), time.time()))
+            else:
+                conn.execute("DELETE FROM installed_courses WHERE course_id = ?", (str(course_id),))
+        conn.close()
+
+        report = {
+            "phase": "done", "status": "installed" if installed else "partial",
+            "lessons": len(complete_lessons), "lessons_total": len(manifest["lessons"]),
+            "concepts": len(complete_concepts), "videos": len(needed) - len(failed),
+            "failed": sorted(failed), "missing": manifest["missing"],
+            "rejected": rejected, "requests": manifest["requests"],
+        }
+        self._report(course_id, **report)
+        print(f"🎓 [CourseInstall] {course_id}: {report['status']}, {len(complete_lessons)}/{len(manifest['lessons'])} lessons, "
+              f"{report['videos']} video(s) in {manifest['requests']} metadata request(s)")
+        return self.progress(course_id)
+
+    def installed_courses(self):
+        """{course_id: [lesson_id, ...]} for every fully installed course."""
+        self._init_db()
+        conn = get_db(self.db_path)
+        cur = conn.cursor()
+        cur.execute("SELECT course_id, lesson_ids FROM installed_courses")
+        rows = {r[0]: json.loads(r[1]) for r in cur.fetchall()}
+        conn.close()
+        return rows
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+
+from retrieval import BM25Index, chunk_text, tokenize
+
+# Reject uploads larger than this many bytes
+MAX_DOCUMENT_BYTES = 20 * 1024 * 1024
+UPLOAD_READ_SIZE = 64 * 1024
+# Built BM25 indexes kept in memory, most recently used last
+INDEX_CACHE_SIZE = 16
+
+
+class DocumentTooLarge(Exception):
+    pass
+
+
+class DocumentStore:
+    """
+    Uploaded study documents for the AI tutor. Text is chunked and
+    tokenized once at upload time; chat turns then reference a document
+    by id and load its prebuilt index.
+    """
+
+    def __init__(self, db_path, docs_dir):
+        self.db_path = db_path
+        self.docs_dir = docs_dir
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(docs_dir, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS ai_documents (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_documents_user
+                ON ai_documents (user_id, sha256)
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS ai_document_chunks (
+                    document_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    term_freqs TEXT NOT NULL,
+                    PRIMARY KEY (document_id, position)
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error initializing document store: {e}")
+
+    def _path(self, document_id):
+        return os.path.join(self.docs_dir, f"{document_id}.txt")
+
+    def save_stream(self, user_id, name, stream, length):
+        """
+        Copy `length` bytes from `stream` to disk in fixed-size reads, then
+        chunk and index the text. Re-uploading the same bytes returns the
+        existing document. Returns the document metadata dict.
+        """
+        if length > MAX_DOCUMENT_BYTES:
+            raise DocumentTooLarge(f"Document exceeds {MAX_DOCUMENT_BYTES} bytes")
+
+        document_id = str(uuid.uuid4())
+        temp_path = self._path(document_id) + ".tmp"
+        digest = hashlib.sha256()
+        remaining = length
+        try:
+            with open(temp_path, "wb") as f:
+                while remaining > 0:
+                    block = stream.read(min(UPLOAD_READ_SIZE, remaining))
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    remaining -= len(block)
+            sha = digest.hexdigest()
+
+            existing = self._find_by_hash(user_id, sha)
+            if existing:
+                os.remove(temp_path)
+                return existing
+
+            with open(temp_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            chunks = chunk_text(text, "document")
+
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.executemany(
+                'INSERT INTO ai_document_chunks (document_id, position, text, term_freqs) VALUES (?, ?, ?, ?)',
+                [(document_id, c["position"], c["text"], json.dumps(_term_freqs(c["text"]))) for c in chunks]
+            )
+            cur.execute(
+                'INSERT INTO ai_documents (id, user_id, name, sha256, size_bytes, chunk_count) VALUES (?, ?, ?, ?, ?, ?)',
+                (document_id, user_id, name, sha, length - remaining, len(chunks))
+            )
+            conn.commit()
+            conn.close()
+            os.replace(temp_path, self._path(document_id))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        print(f"📄 [Documents] Indexed '{name}' for {user_id}: {len(chunks)} chunks")
+        return self.get(document_id)
+
+    def _find_by_hash(self, user_id, sha):
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute('SELECT id FROM ai_documents WHERE user_id = ? AND sha256 = ?', (user_id, sha))
+        row = cur.fetchone()
+        conn.close()
+        return self.get(row[0]) if row else None
+
+    def get(self, document_id):
+        """Metadata for one document, or None."""
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT id, user_id, name, sha256, size_bytes, chunk_count, created_at FROM ai_documents WHERE id = ?',
+            (document_id,)
+        )
+        row = cur.fetchone()
+        conn.close()
+        return _row_to_meta(row) if row else None
+
+    def list(self, user_id):
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT id, user_id, name, sha256, size_bytes, chunk_count, created_at FROM ai_documents WHERE user_id = ? ORDER BY created_at DESC',
+            (user_id,)
+        )
+        rows = cur.fetchall()
+        conn.close()
+        return [_row_to_meta(r) for r in rows]
+
+    def delete(self, user_id, document_id):
+        """Remove a document owned by `user_id`. Returns True if it existed."""
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute('DELETE FROM ai_documents WHERE id = ? AND user_id = ?', (document_id, user_id))
+        deleted = cur.rowcount > 0
+        if deleted:
+            cur.execute('DELETE FROM ai_document_chunks WHERE document_id = ?', (document_id,))
+        conn.commit()
+        conn.close()
+        if deleted:
+            with self._lock:
+                self._indexes.pop(document_id, None)
+            if os.path.exists(self._path(document_id)):
+                os.remove(self._path(document_id))
+        return deleted
+
+    def get_index(self, document_id):
+        """BM25 index over a stored document's chunks, built from the persisted term counts."""
+        with self._lock:
+            if document_id in self._indexes:
+                self._indexes.move_to_end(document_id)
+                return self._indexes[document_id]
+
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT position, text, term_freqs FROM ai_document_chunks WHERE document_id = ? ORDER BY position',
+            (document_id,)
+        )
+        rows = cur.fetchall()
+        conn.close()
+        if not rows:
+            return None
+
+        chunks = [{"source": "document", "position": r[0], "text": r[1]} for r in rows]
+        index = BM25Index(chunks, term_freqs=[json.loads(r[2]) for r in rows])
+        with self._lock:
+            self._indexes[document_id] = index
+            while len(self._indexes) > INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return index
+
+
+def _term_freqs(text):
+    counts = {}
+    for t in tokenize(text):
+        counts[t] = counts.get(t, 0) + 1
+    return counts
+
+
+def _row_to_meta(row):
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "name": row[2],
+        "sha256": row[3],
+        "size_bytes": row[4],
+        "chunk_count": row[5],
+        "created_at": row[6],
+    }
@@ -4,7 +4,9 @@ import os
 import sys
 import time
 import shutil
-from updater import run_update, preview_updates
+from updater import run_update, preview_updates, catalog
+import grading
+import content_store
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(BASE_DIR)
@@ -143,12 +145,10 @@ def save_progress(concept_id, status):
 # -------------------- CONTENT --------------------
 
 def load_concept(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return content_store.load_json(path)
     
 def is_answer_correct(user_answer, keywords):
-    user_answer = normalize(user_answer)
-    return all(keyword in user_answer for keyword in keywords)
+    return grading.KeywordMatcher(keywords).grade(user_answer)["correct"]
 
 import re
 
@@ -177,26 +177,11 @@ def get_concept_path(concept_id):
 
 
 def load_lesson(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return content_store.load_json(path)
 
 def load_lesson_index():
-    # Dynamically build index from lessons folder if index.json is missing
-    lessons = []
-    if os.path.exists(LESSONS_DIR):
-        for f in os.listdir(LESSONS_DIR):
-            if f.endswith(".json"):
-                 with open(os.path.join(LESSONS_DIR, f), "r", encoding="utf-8") as jf:
-                     try:
-                         data = json.load(jf)
-                         lessons.append({
-                             "lesson_id": data.get("id") or f.replace(".json", ""),
-                             "title": data.get("title", f),
-                             "path": f
-                         })
-                     except:
-                         pass
-    return {"lessons": lessons}
+    # Built from the content catalog, which tracks the lessons folder incrementally
+    return {"lessons": catalog.lesson_index()}
 
 
 
@@ -204,7 +189,6 @@ def load_lesson_index():
 
 def run_concept(concept):
     concept_id = concept["id"]
-    keywords = concept["check"]["keywords"]
 
     if get_progress(concept_id) == "completed":
         print(f"\nConcept '{concept_id}' already completed.\n")
@@ -221,7 +205,7 @@ def run_concept(concept):
 
 
 
-    if is_answer_correct(user_answer, keywords):
+    if grading.grade_answer(concept, user_answer, grading.similarity_index_for(CONCEPTS_DIR))["correct"]:
         print("\nCorrect!\n")
         save_progress(concept_id, "completed")
     else:
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+
+import content_store
+
+# Compiled matchers kept in memory (one per concept version)
+MATCHER_CACHE_SIZE = 1024
+
+# Character n-gram length for answer similarity
+NGRAM = 3
+# Cosine similarity at or below FLOOR counts as unrelated, at or above CEIL as a full paraphrase
+SIMILARITY_FLOOR = 0.2
+SIMILARITY_CEIL = 0.7
+# Confidence blends keyword coverage and scaled similarity, or is the scaled similarity alone
+# when that is higher (a paraphrase needn't use the keywords); at or above ACCEPT an answer passes
+KEYWORD_WEIGHT = 0.5
+ACCEPT_CONFIDENCE = 0.7
+
+# Endings stripped by stem(); a (suffix, suffix) pair protects words like 'mass' or 'nucleus'
+_SUFFIXES = (
+    ("ies", "y"), ("sses", "ss"), ("eed", "eed"), ("ing", ""), ("ed", ""),
+    ("es", ""), ("ss", "ss"), ("us", "us"), ("is", "is"), ("s", ""),
+)
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace (keeps non-Latin letters)."""
+    text = re.sub(r"[^\w\s]", "", str(text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def stem(word):
+    """Light suffix stripping so 'pulls', 'pulling' and 'pulled' all become 'pull'."""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    for suffix, repl in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(repl) >= 3:
+            word = word[:len(word) - len(suffix)] + repl
+            # 'stopped' -> 'stopp' -> 'stop', but 'pulling' keeps its 'll'
+            if suffix in ("ing", "ed") and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokens(text):
+    return [stem(w) for w in normalize(text).split()]
+
+
+class KeywordMatcher:
+    """
+    All of a concept's keywords (and their synonyms) compiled into one
+    Aho-Corasick automaton over stemmed words, so an answer is scanned
+    once no matter how many keywords there are. Multi-word keywords match
+    as a phrase; matching is on whole words, never inside another word.
+    """
+
+    def __init__(self, keywords, synonyms=None):
+        self.keywords = [k for k in keywords if isinstance(k, str) and normalize(k)]
+        synonyms = {normalize(k): v for k, v in (synonyms or {}).items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for i, keyword in enumerate(self.keywords):
+            for variant in [keyword] + list(synonyms.get(normalize(keyword), [])):
+                pattern = tokens(variant)
+                if pattern:
+                    self._add(pattern, i)
+        self._build()
+
+    def _add(self, pattern, index):
+        state = 0
+        for tok in pattern:
+            nxt = self._goto[state].get(tok)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][tok] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(index)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for tok, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and tok not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(tok, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def matched_indexes(self, answer):
+        found = set()
+        state = 0
+        for tok in tokens(answer):
+            while state and tok not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(tok, 0)
+            found |= self._out[state]
+        return found
+
+    def grade(self, answer):
+        """{'correct', 'matched', 'missing'}; correct means every keyword was found."""
+        found = self.matched_indexes(answer)
+        matched = [k for i, k in enumerate(self.keywords) if i in found]
+        missing = [k for i, k in enumerate(self.keywords) if i not in found]
+        return {"correct": not missing, "matched": matched, "missing": missing}
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _matcher_key(concept):
+    check = concept.get("check") or {}
+    fingerprint = json.dumps([check.get("keywords") or [], check.get("synonyms") or {}], sort_keys=True)
+    # Content fingerprint too, so a concept edited without a version bump isn't served stale
+    return (concept.get("id"), str(concept.get("version")), hashlib.sha1(fingerprint.encode("utf-8")).hexdigest())
+
+
+def matcher_for(concept):
+    """Compiled matcher for a concept dict, built once per concept version."""
+    key = _matcher_key(concept)
+    with _cache_lock:
+        matcher = _cache.get(key)
+        if matcher is not None:
+            _cache.move_to_end(key)
+            return matcher
+    check = concept.get("check") or {}
+    matcher = KeywordMatcher(check.get("keywords") or [], check.get("synonyms"))
+    with _cache_lock:
+        _cache[key] = matcher
+        while len(_cache) > MATCHER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return matcher
+
+
+def _ngrams(text):
+    """Word-bounded character n-grams: 'pull' -> ' pu', 'pul', 'ull', 'll '."""
+    grams = []
+    for word in normalize(text).split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1)))
+    return grams
+
+
+class SimilarityIndex:
+    """
+    TF-IDF weighted character n-gram vectors for desired answers. IDF is
+    learned from the installed desired answers, so words every answer
+    shares count for little; vectors for desired answers are built once
+    and reused for every learner answer graded against this index.
+    """
+
+    def __init__(self, documents=()):
+        df = {}
+        n_docs = 0
+        for doc in documents:
+            n_docs += 1
+            for gram in set(_ngrams(doc)):
+                df[gram] = df.get(gram, 0) + 1
+        self._idf = {g: math.log((1 + n_docs) / (1 + c)) + 1 for g, c in df.items()}
+        # Unseen n-grams are as rare as it gets
+        self._default_idf = math.log(1 + n_docs) + 1
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def vector(self, text):
+        """Sublinear-TF x IDF weights, L2-normalized, as a sparse dict."""
+        counts = {}
+        for gram in _ngrams(text):
+            counts[gram] = counts.get(gram, 0) + 1
+        vec = {g: (1 + math.log(c)) * self._idf.get(g, self._default_idf) for g, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        return {g: w / norm for g, w in vec.items()} if norm else {}
+
+    def desired_vector(self, concept):
+        desired = (concept.get("check") or {}).get("desired_answer") or ""
+        key = (concept.get("id"), str(concept.get("version")), hashlib.sha1(desired.encode("utf-8")).hexdigest())
+        with self._lock:
+            vec = self._vectors.get(key)
+            if vec is not None:
+                self._vectors.move_to_end(key)
+                return vec
+        vec = self.vector(desired)
+        with self._lock:
+            self._vectors[key] = vec
+            while len(self._vectors) > MATCHER_CACHE_SIZE:
+                self._vectors.popitem(last=False)
+        return vec
+
+    def similarity(self, concept, answer):
+        """Cosine similarity in [0, 1] between an answer and the concept's desired answer."""
+        desired = self.desired_vector(concept)
+        if not desired:
+            return 0.0
+        vec = self.vector(answer)
+        if len(vec) > len(desired):
+            vec, desired = desired, vec
+        return min(1.0, sum(w * desired.get(g, 0.0) for g, w in vec.items()))
+
+
+_default_index = SimilarityIndex()
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def similarity_index_for(concepts_dir):
+    """
+    SimilarityIndex over every concept's desired answer in `concepts_dir`,
+    rebuilt only when the directory changes (installs replace files).
+    """
+    try:
+        version = os.stat(concepts_dir).st_mtime_ns
+    except OSError:
+        return _default_index
+    with _indexes_lock:
+        cached = _indexes.get(concepts_dir)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    answers = []
+    for name in os.listdir(concepts_dir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            check = content_store.load_json(os.path.join(concepts_dir, name)).get("check") or {}
+        except Exception:
+            continue
+        if check.get("desired_answer"):
+            answers.append(check["desired_answer"])
+    index = SimilarityIndex(answers)
+    with _indexes_lock:
+        _indexes[concepts_dir] = (version, index)
+    return index
+
+
+def grade_answer(concept, answer, index=None):
+    """
+    Grade a free-text answer against a concept's check block. Keyword
+    coverage and similarity to desired_answer are blended into a
+    confidence, and a close enough paraphrase carries it on its own
+    even without any keyword; an answer passes with every keyword present or with a
+    confidence of at least ACCEPT_CONFIDENCE. With neither keywords nor a
+    desired_answer there is nothing to grade against, and it fails.
+    """
+    result = matcher_for(concept).grade(answer)
+    keywords = len(result["matched"]) + len(result["missing"])
+    if not keywords and not (concept.get("check") or {}).get("desired_answer"):
+        return {**result, "correct": False, "similarity": None, "confidence": 0.0}
+    coverage = len(result["matched"]) / keywords if keywords else 1.0
+
+    if (concept.get("check") or {}).get("desired_answer"):
+        similarity = (index or _default_index).similarity(concept, answer)
+        scaled = min(1.0, max(0.0, (similarity - SIMILARITY_FLOOR) / (SIMILARITY_CEIL - SIMILARITY_FLOOR)))
+        confidence = max(KEYWORD_WEIGHT * coverage + (1 - KEYWORD_WEIGHT) * scaled, scaled)
+    else:
+        similarity = None
+        confidence = coverage
+
+    result["similarity"] = round(similarity, 3) if similarity is not None else None
+    result["confidence"] = round(confidence, 3)
+    result["correct"] = result["correct"] or confidence >= ACCEPT_CONFIDENCE
+    return result
@@ -0,0 +1,104 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Finished jobs are forgotten after this long
+JOB_TTL_SECONDS = 3600
+# Longest a status request may block waiting for a job to finish
+MAX_WAIT_SECONDS = 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """
+    Background jobs on a bounded worker pool. Submitting work under a key
+    that already has a queued or running job returns that job instead of
+    starting a duplicate. Clients poll get() or block in wait().
+    """
+
+    def __init__(self, max_workers=2, ttl=JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._jobs = {}
+        self._active_by_key = {}
+        self._cond = threading.Condition()
+
+    def submit(self, kind, key, fn, *args):
+        """
+        Queue fn(*args). Returns (job, created): created is False when an
+        in-flight job for the same key was returned instead. A return value
+        of None from fn marks the job failed.
+        """
+        with self._cond:
+            self._prune()
+            existing_id = self._active_by_key.get(key)
+            if existing_id:
+                return self._public(self._jobs[existing_id]), False
+
+            now = time.time()
+            job = {
+                "id": str(uuid.uuid4()),
+                "kind": kind,
+                "key": key,
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._jobs[job["id"]] = job
+            self._active_by_key[key] = job["id"]
+        self._executor.submit(self._run, job["id"], fn, args)
+        return self._public(job), True
+
+    def _run(self, job_id, fn, args):
+        self._update(job_id, status=RUNNING)
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=str(e))
+            return
+        if result is None:
+            self._update(job_id, status=FAILED, error="Job produced no result")
+        else:
+            self._update(job_id, status=DONE, result=result)
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            if job["status"] in (DONE, FAILED) and self._active_by_key.get(job["key"]) == job_id:
+                del self._active_by_key[job["key"]]
+            self._cond.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j["id"] for j in self._jobs.values()
+                       if j["status"] in (DONE, FAILED) and j["updated_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def _public(self, job):
+        return {k: v for k, v in job.items() if k != "key"}
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def wait(self, job_id, timeout):
+        """Block up to `timeout` seconds (capped at MAX_WAIT_SECONDS) for the job to finish."""
+        deadline = time.time() + min(max(timeout, 0), MAX_WAIT_SECONDS)
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.time()
+                if job["status"] in (DONE, FAILED) or remaining <= 0:
+                    return self._public(job)
+                self._cond.wait(remaining)
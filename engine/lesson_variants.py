@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+import content_store
+
+VARIANT_MODES = ("beginner", "advance")
+_VARIANT_SUFFIX_RE = re.compile(r"_(?:%s)$" % "|".join(VARIANT_MODES))
+
+
+def normalize_mode(mode):
+    """'Beginner' / 'ADVANCE' -> 'beginner' / 'advance'; raises ValueError for anything else."""
+    m = (mode or "").strip().lower()
+    if m not in VARIANT_MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Expected one of: {', '.join(VARIANT_MODES)}")
+    return m
+
+
+def variant_lesson_id(root_id, mode):
+    return f"{root_id}_{normalize_mode(mode)}"
+
+
+def lesson_content_hash(lesson):
+    """Stable hash of a (concept-resolved) lesson, independent of key order."""
+    canonical = json.dumps(lesson, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LessonVariantStore:
+    """
+    Generated Beginner/Advance lesson variants. Variants are always derived
+    from the root lesson and cached by (source content hash, mode, model),
+    so repeat requests reuse the file on disk and only a changed source
+    lesson triggers regeneration. Saved variants are indexed in `catalog`
+    when one is given.
+    """
+
+    def __init__(self, lessons_dir, concepts_dir, db_path, catalog=None):
+        self.lessons_dir = lessons_dir
+        self.concepts_dir = concepts_dir
+        self.db_path = db_path
+        self.catalog = catalog
+        self._init_db()
+
+    def _init_db(self):
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS lesson_variants (
+                root_lesson_id TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                created_at TEXT DEFAULT (datetime('now')),
+                PRIMARY KEY (root_lesson_id, mode)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _lesson_path(self, lesson_id):
+        return os.path.join(self.lessons_dir, f"{lesson_id}.json")
+
+    def _load_json(self, path):
+        return content_store.load_json(path)
+
+    def resolve_root(self, lesson_id):
+        """
+        Root lesson a (possibly generated) lesson id derives from. Uses the
+        variant's recorded source when present, otherwise strips trailing
+        _beginner/_advance suffixes down to the shortest installed lesson.
+        """
+        path = self._lesson_path(lesson_id)
+        if os.path.exists(path):
+            try:
+                source = self._load_json(path).get("source_lesson_id")
+                if source and os.path.exists(self._lesson_path(source)):
+                    return source
+            except Exception:
+                pass
+
+        # Shortest existing prefix wins: 'x_beginner_beginner' -> 'x'
+        candidates = []
+        current = lesson_id
+        while _VARIANT_SUFFIX_RE.search(current):
+            current = current[:current.rfind("_")]
+            candidates.append(current)
+        for candidate in reversed(candidates):
+            if os.path.exists(self._lesson_path(candidate)):
+                return candidate
+        return lesson_id
+
+    def load_source(self, root_id):
+        """Root lesson with concept ids replaced by their JSON, or None if it isn't installed."""
+        path = self._lesson_path(root_id)
+        if not os.path.exists(path):
+            return None
+        lesson = self._load_json(path)
+        concepts = []
+        for c in lesson.get("concepts", []):
+            if isinstance(c, dict):
+                concepts.append(c)
+                continue
+            cpath = os.path.join(self.concepts_dir, f"{c}.json")
+            if os.path.exists(cpath):
+                concepts.append(self._load_json(cpath))
+        lesson["concepts"] = concepts
+        return lesson
+
+    def lookup(self, root_id, mode, source_hash, model):
+        """Id of a cached variant still valid for this source and model, else None."""
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT lesson_id, source_hash, model FROM lesson_variants WHERE root_lesson_id = ? AND mode = ?",
+            (root_id, mode)
+        )
+        row = cur.fetchone()
+        conn.close()
+        if not row or row[1] != source_hash or row[2] != model:
+            return None
+        return row[0] if os.path.exists(self._lesson_path(row[0])) else None
+
+    def save_variant(self, root_id, mode, model, source_hash, lesson):
+        variant_id = variant_lesson_id(root_id, mode)
+        lesson["lesson_id"] = variant_id
+        lesson["source_lesson_id"] = root_id
+        lesson["variant_mode"] = mode
+        lesson["source_hash"] = source_hash
+        path = self._lesson_path(variant_id)
+        content_store.save_json(path, lesson)
+        if self.catalog is not None:
+            self.catalog.index_file(path)
+
+        conn = sqlite3.connect(self.db_path)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT OR REPLACE INTO lesson_variants (root_lesson_id, mode, model, source_hash, lesson_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, (root_id, mode, model, source_hash, variant_id))
+        conn.commit()
+        conn.close()
+        return variant_id
+
+    def find_cached(self, lesson_id, mode, model):
+        """
+        Resolve a request without generating anything. Returns
+        (root_id, mode, cached_lesson_id_or_None); raises LookupError if the
+        lesson isn't installed and ValueError for an unknown mode.
+        """
+        mode = normalize_mode(mode)
+        root_id = self.resolve_root(lesson_id)
+        source = self.load_source(root_id)
+        if source is None:
+            raise LookupError(f"Lesson '{lesson_id}' not found")
+        return root_id, mode, self.lookup(root_id, mode, lesson_content_hash(source), model)
+
+    def get_or_generate(self, lesson_id, mode, generate, model):
+        """
+        Return {'lesson_id', 'cached'} for the `mode` variant of `lesson_id`'s
+        root lesson, calling `generate(source_lesson, mode)` only on a cache
+        miss. Returns None if generation fails; raises LookupError if the
+        lesson isn't installed and ValueError for an unknown mode.
+        """
+        mode = normalize_mode(mode)
+        root_id = self.resolve_root(lesson_id)
+        source = self.load_source(root_id)
+        if source is None:
+            raise LookupError(f"Lesson '{lesson_id}' not found")
+
+        source_hash = lesson_content_hash(source)
+        cached_id = self.lookup(root_id, mode, source_hash, model)
+        if cached_id:
+            print(f"♻️ [Variants] Reusing {cached_id}")
+            return {"lesson_id": cached_id, "cached": True}
+
+        generated = generate(source, mode.capitalize())
+        if not generated:
+            return None
+        variant_id = self.save_variant(root_id, mode, model, source_hash, generated)
+        print(f"✨ [Variants] Generated {variant_id} from {root_id}")
+        return {"lesson_id": variant_id, "cached": False}
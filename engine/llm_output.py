@@ -0,0 +1,171 @@
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def iter_sse_deltas(response, usage=None):
+    """
+    Yield content deltas from an OpenAI-compatible SSE completion stream.
+    A token usage block, if the provider sends one, is copied into `usage`.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue  # blank separators and ": keep-alive" comments
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or []
+        if choices:
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+def _strip_trailing_comma(chars):
+    """Drop a trailing ',' (and whitespace after it) from a char list; True if one was dropped."""
+    i = len(chars)
+    while i and chars[i - 1] in " \t\r\n":
+        i -= 1
+    if i and chars[i - 1] == ",":
+        del chars[i - 1:]
+        return True
+    return False
+
+
+class JSONStreamParser:
+    """
+    Incremental scanner for the first JSON object/array in LLM output.
+    Feed text as it arrives; feed() returns True once the top-level value
+    has closed, so the caller can stop reading. Only `openers` start a
+    value, prose and markdown fences around it are ignored, and a bracket
+    in the preamble that doesn't lead to valid JSON is a false start:
+    scanning resumes from the next opener. Trailing commas are dropped on
+    the fly, and result() repairs a truncated value by cutting back to the
+    last complete member and closing the open brackets. `repaired`
+    records whether any of that was needed.
+    """
+
+    def __init__(self, openers="{["):
+        self.openers = openers
+        # Everything fed so far, for rescanning after a false start
+        self._buf = ""
+        self._reset()
+
+    def _reset(self):
+        self.started = False
+        self.complete = False
+        self.repaired = False
+        self._value = None
+        self._start = None
+        self._out = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        # (length of _out, open brackets) where cutting and closing gives valid JSON
+        self._cut = None
+
+    def feed(self, chunk):
+        pos = len(self._buf)
+        self._buf += chunk
+        return self._scan(pos)
+
+    def _scan(self, i):
+        buf = self._buf
+        while i < len(buf) and not self.complete:
+            ch = buf[i]
+            if not self.started:
+                if ch not in self.openers:
+                    i += 1
+                    continue
+                self.started = True
+                self._start = i
+            self._consume(ch)
+            i += 1
+            if self.complete:
+                try:
+                    self._value = json.loads("".join(self._out), strict=False)
+                except ValueError:
+                    i = self._false_start()
+        return self.complete
+
+    def _false_start(self):
+        """Forget the value started at `_start`; returns where scanning resumes."""
+        resume = self._start + 1
+        self._reset()
+        return resume
+
+    def _consume(self, ch):
+        out = self._out
+        if self._in_string:
+            out.append(ch)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+            return
+
+        if ch == '"':
+            self._in_string = True
+            out.append(ch)
+        elif ch in _CLOSERS:
+            self._stack.append(ch)
+            out.append(ch)
+            self._cut = (len(out), tuple(self._stack))
+        elif ch in "}]":
+            if _strip_trailing_comma(out):
+                self.repaired = True
+            opener = self._stack.pop()
+            if _CLOSERS[opener] != ch:
+                self.repaired = True
+            out.append(_CLOSERS[opener])
+            if self._stack:
+                self._cut = (len(out), tuple(self._stack))
+            else:
+                self.complete = True
+        elif ch == ",":
+            self._cut = (len(out), tuple(self._stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    def _close(self, chars, stack):
+        chars = list(chars)
+        _strip_trailing_comma(chars)
+        return "".join(chars) + "".join(_CLOSERS[b] for b in reversed(stack))
+
+    def result(self):
+        """Parsed value, repairing truncation if the stream ended early; raises ValueError."""
+        while True:
+            if not self.started:
+                raise ValueError("No JSON object found in output")
+            if self.complete:
+                return self._value
+            try:
+                return self._repair()
+            except ValueError:
+                self._scan(self._false_start())
+
+    def _repair(self):
+        self.repaired = True
+        if not self._in_string:
+            try:
+                return json.loads(self._close(self._out, self._stack), strict=False)
+            except ValueError:
+                pass
+        length, stack = self._cut
+        return json.loads(self._close(self._out[:length], stack), strict=False)
+
+
+def parse_json(text, openers="{["):
+    """(value, repaired) for the first JSON value in `text` starting with one of `openers`; raises ValueError if none can be recovered."""
+    parser = JSONStreamParser(openers)
+    parser.feed(text)
+    return parser.result(), parser.repaired
@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import content_store
+from catalog import LESSON, CONCEPT, VIDEO
+
+# Mirror routes: /mirror/rest/v1/<table>?<PostgREST query> and /mirror/assets/<dir>/<file>
+PREFIX = "/mirror"
+# How long the cloud lesson listing is trusted before asking again
+LISTING_TTL_SECONDS = 300
+READ_SIZE = 64 * 1024
+
+ASSET_DIRS = ("videos", "thumbnails")
+
+
+def parse_query(query):
+    """
+    (select, filters) from the subset of PostgREST syntax the updater uses:
+    select=a,b and <column>=eq.<value> / <column>=in.(<v1>,<v2>).
+    """
+    select, filters = None, {}
+    for key, value in urllib.parse.parse_qsl(query, keep_blank_values=True):
+        if key == "select":
+            select = [s.strip() for s in value.split(",") if s.strip()]
+        elif value.startswith("eq."):
+            filters[key] = {value[3:]}
+        elif value.startswith("in.(") and value.endswith(")"):
+            filters[key] = {v.strip().strip('"') for v in value[4:-1].split(",") if v.strip()}
+    return select, filters
+
+
+class ContentMirror:
+    """
+    Serves this engine's installed content to other engines on the LAN in
+    the same shapes the cloud REST API returns, so their updater can use
+    it as a drop-in endpoint. Anything not installed yet is pulled from
+    the cloud once (through `sync`) and then served locally, so each
+    lesson and video crosses the school's uplink once.
+
+    `sync` maps 'lesson' / 'concept' / 'video' to install functions;
+    `remote_versions` returns the cloud {lesson_id: version} listing or
+    raises when offline; `download(url, dest)` fetches a missing asset.
+    """
+
+    def __init__(self, content_dir, db_path, catalog, sync=None, remote_versions=None, download=None):
+        self.content_dir = content_dir
+        self.db_path = db_path
+        self.catalog = catalog
+        self.sync = sync or {}
+        self.remote_versions = remote_versions
+        self.download = download
+        self._listing = (0.0, None)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    # ---------- versions ----------
+
+    def _installed_versions(self, ctype):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute("SELECT id, version FROM cached_content WHERE type = ?", (ctype,))
+            rows = dict(cur.fetchall())
+            conn.close()
+            return rows
+        except sqlite3.Error:
+            return {}
+
+    def _cloud_listing(self):
+        """Cloud {lesson_id: version}, cached for LISTING_TTL_SECONDS; None when the cloud can't be reached."""
+        fetched_at, listing = self._listing
+        if listing is not None and time.time() - fetched_at < LISTING_TTL_SECONDS:
+            return listing
+        if not self.remote_versions:
+            return None
+        try:
+            listing = self.remote_versions()
+        except Exception as e:
+            print(f"🛰️ [Mirror] Cloud listing unavailable, serving local versions: {e}")
+            return None
+        self._listing = (time.time(), listing)
+        return listing
+
+    # ---------- rows ----------
+
+    def _read(self, kind, item_id):
+        path = os.path.join(self.catalog.dirs[kind], f"{item_id}.json")
+        try:
+            return content_store.load_json(path)
+        except (OSError, ValueError):
+            return None
+
+    def _ensure(self, kind, item_id, version=None):
+        """Local copy of an item, installing (or updating) it from the cloud first if needed."""
+        ctype = {LESSON: "lesson", CONCEPT: "concept", VIDEO: "video"}[kind]
+        data = self._read(kind, item_id)
+        stale = version is not None and self._installed_versions(ctype).get(item_id) != version
+        if (data is None or stale) and ctype in self.sync:
+            with self._lock_for((ctype, item_id)):
+                data = self._read(kind, item_id)
+                if data is None or (version is not None and self._installed_versions(ctype).get(item_id) != version):
+                    print(f"🛰️ [Mirror] Pulling {ctype} {item_id} from the cloud")
+                    try:
+                        if ctype == "lesson":
+                            self.sync[ctype](item_id, version or 1)
+                        else:
+                            self.sync[ctype](item_id)
+                    except Exception as e:
+                        print(f"🛰️ [Mirror] Pull failed for {ctype} {item_id}: {e}")
+                    data = self._read(kind, item_id)
+        return data
+
+    def _lesson_rows(self, ids):
+        listing = self._cloud_listing() or {}
+        if ids is None:
+            ids = [l["lesson_id"] for l in self.catalog.lesson_index()]
+        lessons = [(lesson_id, self._ensure(LESSON, lesson_id, listing.get(lesson_id))) for lesson_id in ids]
+        versions = self._installed_versions("lesson")
+        rows = []
+        for lesson_id, lesson in lessons:
+            # Generated variants are local to this device, not cloud content
+            if lesson is None or lesson.get("variant_mode"):
+                continue
+            rows.append({
+                "lesson_id": lesson_id,
+                "title": lesson.get("title"),
+                "version": versions.get(lesson_id, 1),
+                "order_index": lesson.get("order_index", 0),
+                "json_data": lesson,
+            })
+        return rows
+
+    def _concept_rows(self, ids):
+        if ids is None:
+            ids = sorted(n[:-5] for n in os.listdir(self.catalog.dirs[CONCEPT]) if n.endswith(".json"))
+        versions = self._installed_versions("concept")
+        rows = []
+        for concept_id in ids:
+            concept = self._ensure(CONCEPT, concept_id)
+            if concept is not None:
+                rows.append({"id": concept_id, "version": versions.get(concept_id, concept.get("version") or 1),
+                             "json_data": concept})
+        return rows
+
+    def _video_rows(self, ids):
+        if ids is None:
+            ids = sorted(n[:-5] for n in os.listdir(self.catalog.dirs[VIDEO]) if n.endswith(".json"))
+        rows = []
+        for video_id in ids:
+            video = self._ensure(VIDEO, video_id)
+            if video is not None:
+                # local_* paths only make sense on this device
+                rows.append({k: v for k, v in video.items() if not k.startswith("local_")})
+        return rows
+
+    def query(self, table, query):
+        """Rows for a REST request, filtered and projected like the cloud would; None for unknown tables."""
+        select, filters = parse_query(query)
+        if table == "delivery_lessons":
+            ids = filters.pop("lesson_id", None)
+            # The plain version listing comes straight from the cloud when it's reachable
+            if ids is None and not filters and select and set(select) <= {"lesson_id", "version"}:
+                listing = self._cloud_listing()
+                if listing is not None:
+                    return [{"lesson_id": l, "version": v} for l, v in listing.items()]
+            rows = self._lesson_rows(sorted(ids) if ids is not None else None)
+        elif table == "delivery_concepts":
+            ids = filters.pop("id", None)
+            rows = self._concept_rows(sorted(ids) if ids is not None else None)
+        elif table == "videos":
+            ids = filters.pop("id", None)
+            rows = self._video_rows(sorted(ids) if ids is not None else None)
+        else:
+            return None
+        rows = [r for r in rows if all(str(r.get(k)) in v for k, v in filters.items())]
+        if select and "*" not in select:
+            rows = [{k: r.get(k) for k in select} for r in rows]
+        return rows
+
+    # ---------- assets ----------
+
+    def asset_path(self, rel_path):
+        """Local path for 'videos/<file>' or 'thumbnails/<file>', pulling it from the cloud if needed; None if unavailable."""
+        parts = rel_path.split("/")
+        if len(parts) != 2 or parts[0] not in ASSET_DIRS or parts[1] in ("", ".", "..") or "\\" in rel_path:
+            return None
+        path = os.path.join(self.content_dir, "assets", parts[0], parts[1])
+        if os.path.isfile(path):
+            return path
+        url = (self.catalog.asset_references().get(f"assets/{rel_path}") or {}).get("url")
+        if not url or not self.download:
+            return None
+        with self._lock_for(("asset", rel_path)):
+            if not os.path.isfile(path):
+                print(f"🛰️ [Mirror] Pulling asset {rel_path} from the cloud")
+                if not self.download(url, path) or not os.path.isfile(path):
+                    return None
+        return path
+
+    # ---------- HTTP ----------
+
+    def handle(self, handler, path, query):
+        """Serve a /mirror/... GET on a BaseHTTPRequestHandler. Returns False if `path` isn't a mirror route."""
+        if not path.startswith(PREFIX + "/"):
+            return False
+        route = path[len(PREFIX) + 1:]
+        try:
+            if route.startswith("rest/v1/"):
+                rows = self.query(route[len("rest/v1/"):], query)
+                if rows is None:
+                    self._send(handler, 404, b'{"error": "Unknown table"}', "application/json")
+                else:
+                    self._send(handler, 200, json.dumps(rows).encode("utf-8"), "application/json")
+            elif route.startswith("assets/"):
+                asset = self.asset_path(route[len("assets/"):])
+                if asset is None:
+                    self._send(handler, 404, b"", "application/octet-stream")
+                else:
+                    self._send_file(handler, asset)
+            else:
+                self._send(handler, 404, b"", "application/octet-stream")
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            pass
+        return True
+
+    def _send(self, handler, code, body, content_type):
+        handler.send_response(code)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_file(self, handler, path):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "video/mp4" if path.endswith(".mp4") else "application/octet-stream")
+        handler.send_header("Content-Length", str(os.path.getsize(path)))
+        handler.end_headers()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(READ_SIZE), b""):
+                handler.wfile.write(block)
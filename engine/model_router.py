@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Free-tier fallbacks tried after the configured primary model
+DEFAULT_FALLBACK_MODELS = [
+    "meta-llama/llama-3.3-70b-instruct:free",
+    "mistralai/mistral-7b-instruct:free",
+]
+
+# Calls remembered per model for latency/error statistics
+ROLLING_WINDOW = 50
+# Samples needed before a model's own p95 replaces the default hedge delay
+MIN_SAMPLES = 5
+DEFAULT_HEDGE_DELAY = 8.0
+MIN_HEDGE_DELAY = 1.0
+# Models failing more often than this are tried after healthier ones
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+# Cancel event of the call the current router worker thread is serving
+_current = threading.local()
+
+
+class Cancelled(Exception):
+    """Raised by a send() that stopped early because another model already answered."""
+
+
+def cancelled():
+    """True inside a send() whose call another model has already won; streaming sends check it between chunks."""
+    event = getattr(_current, "cancel", None)
+    return event is not None and event.is_set()
+
+
+def models_from_env(primary):
+    """Primary model followed by OPENROUTER_FALLBACK_MODELS (comma separated) or the defaults."""
+    raw = os.environ.get("OPENROUTER_FALLBACK_MODELS")
+    fallbacks = [m.strip() for m in raw.split(",")] if raw is not None else DEFAULT_FALLBACK_MODELS
+    models = [primary]
+    for m in fallbacks:
+        if m and m not in models:
+            models.append(m)
+    return models
+
+
+class AllModelsFailed(Exception):
+    """Every model in the router failed; `errors` holds (model, exception) pairs in failure order."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        last = errors[-1][1] if errors else None
+        super().__init__(str(last) if last else "No models configured")
+
+    @property
+    def last_error(self):
+        return self.errors[-1][1] if self.errors else None
+
+
+class ModelStats:
+    """Rolling latency and outcome window for one model."""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, latency, ok):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self):
+        return {
+            "samples": len(self.outcomes),
+            "error_rate": round(self.error_rate(), 4),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+class ModelRouter:
+    """
+    Routes a call across an ordered list of models. The first model is
+    started immediately; if it has not answered within its p95 latency a
+    hedged request goes to the next one, and the first success wins.
+    Failures launch the next model straight away. Each call gets its own
+    pool with a thread per model, so a hedge never queues behind other
+    callers' requests, and losers are cancelled once a winner returns.
+    """
+
+    def __init__(self, models, hedge=True, default_hedge_delay=DEFAULT_HEDGE_DELAY):
+        self.models = list(models)
+        self.hedge = hedge
+        self.default_hedge_delay = default_hedge_delay
+        self._stats = {m: ModelStats() for m in self.models}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.models[0]
+
+    def record(self, model, latency, ok):
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).record(latency, ok)
+
+    def ordered_models(self):
+        """Configured order, with models above UNHEALTHY_ERROR_RATE moved to the back."""
+        with self._lock:
+            def unhealthy(m):
+                s = self._stats[m]
+                return len(s.outcomes) >= MIN_SAMPLES and s.error_rate() > UNHEALTHY_ERROR_RATE
+            return sorted(self.models, key=unhealthy)
+
+    def hedge_delay(self, model):
+        """Seconds to wait on `model` before hedging: its p95 once enough samples exist."""
+        with self._lock:
+            s = self._stats[model]
+            p95 = s.percentile(95) if len(s.latencies) >= MIN_SAMPLES else None
+        return max(MIN_HEDGE_DELAY, p95) if p95 is not None else self.default_hedge_delay
+
+    def stats(self):
+        with self._lock:
+            return {m: s.snapshot() for m, s in self._stats.items()}
+
+    def _timed(self, send, model, cancel):
+        _current.cancel = cancel
+        start = time.monotonic()
+        try:
+            result = send(model)
+        except Exception:
+            # A loser stopped on purpose says nothing about the model's health
+            if not cancel.is_set():
+                self.record(model, time.monotonic() - start, False)
+            raise
+        finally:
+            _current.cancel = None
+        self.record(model, time.monotonic() - start, True)
+        return result
+
+    def call(self, send):
+        """
+        Run `send(model)` with hedging and fallback. `send` must raise on
+        failure. Returns (model, result) from the first success; raises
+        AllModelsFailed when every model has failed. Once the call returns,
+        losers that haven't started are cancelled and running ones see
+        cancelled() turn True, so they can stop reading their response.
+        """
+        models = self.ordered_models()
+        executor = ThreadPoolExecutor(max_workers=max(1, len(models)), thread_name_prefix="model-router")
+        cancel = threading.Event()
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            model = models[launched]
+            launched += 1
+            pending[executor.submit(self._timed, send, model, cancel)] = model
+            return model
+
+        try:
+            last = launch()
+            while pending:
+                can_hedge = self.hedge and launched < len(models)
+                timeout = self.hedge_delay(last) if can_hedge else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    print(f"⏱️ [Router] {last} slow, hedging to {models[launched]}")
+                    last = launch()
+                    continue
+                for future in done:
+                    model = pending.pop(future)
+                    try:
+                        return model, future.result()
+                    except Exception as e:
+                        print(f"⚠️ [Router] {model} failed: {e}")
+                        errors.append((model, e))
+                if launched < len(models):
+                    last = launch()
+            raise AllModelsFailed(errors)
+        finally:
+            cancel.set()
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# How many lessons past each learner's latest one are kept downloaded
+LOOKAHEAD = int(os.environ.get("PREFETCH_LOOKAHEAD", "3"))
+# Lessons fetched per pass, so one pass never turns into a full course download
+MAX_PER_RUN = 10
+CHECK_INTERVAL_SECONDS = int(os.environ.get("PREFETCH_INTERVAL_SECONDS", "600"))
+# Curricula rarely change; re-read them at most this often
+CURRICULUM_TTL_SECONDS = 3600
+# Only learners active this recently are planned for
+ACTIVE_DAYS = 30
+
+
+class LessonPrefetcher:
+    """
+    Downloads the lessons each learner is likely to open next while the
+    device is online, so finishing a lesson right before going offline
+    doesn't strand them. The prediction follows course curriculum order
+    from each learner's most recent lesson in `user_progress`; the next
+    lesson of every learner is fetched before anyone's second one.
+    Downloads run in sync-policy background mode, so large videos wait
+    for a good link and nothing competes with the learner's own traffic.
+
+    `sync_lesson(lesson_id, version)` installs a lesson with its concepts
+    and videos; `remote_versions()` and `curricula()` read the cloud and
+    raise when it can't be reached.
+    """
+
+    def __init__(self, db_path, progress_db, sync_lesson, remote_versions, curricula, policy,
+                 lookahead=LOOKAHEAD, max_per_run=MAX_PER_RUN):
+        self.db_path = db_path
+        self.progress_db = progress_db
+        self.sync_lesson = sync_lesson
+        self.remote_versions = remote_versions
+        self.curricula = curricula
+        self.policy = policy
+        self.lookahead = lookahead
+        self.max_per_run = max_per_run
+        self._curricula = (0.0, None)
+        self.upcoming = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.last_run = None
+
+    def _installed_versions(self):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cur = conn.cursor()
+            cur.execute("SELECT id, version FROM cached_content WHERE type = 'lesson'")
+            rows = dict(cur.fetchall())
+            conn.close()
+            return rows
+        except sqlite3.Error:
+            return {}
+
+    def _latest_lessons(self):
+        """(lesson_id, status) of each recently active learner's latest lesson, most recent learner first."""
+        since = (datetime.now() - timedelta(days=ACTIVE_DAYS)).isoformat()
+        try:
+            conn = sqlite3.connect(self.progress_db)
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT user_id, item_id, status FROM user_progress
+                WHERE item_type = 'lesson' AND last_updated >= ?
+                ORDER BY last_updated DESC
+            """, (since,))
+            rows = cur.fetchall()
+            conn.close()
+        except sqlite3.Error:
+            return []
+        latest, seen = [], set()
+        for user_id, lesson_id, status in rows:
+            if user_id not in seen:
+                seen.add(user_id)
+                latest.append((lesson_id, status))
+        return latest
+
+    def _course_orders(self):
+        fetched_at, curricula = self._curricula
+        if curricula is None or time.time() - fetched_at >= CURRICULUM_TTL_SECONDS:
+            curricula = self.curricula()
+            self._curricula = (time.time(), curricula)
+        return curricula
+
+    def predict(self):
+        """Lesson ids learners will likely open next, most urgent first."""
+        ranked = {}
+        curricula = self._course_orders()
+        for rank, (lesson_id, status) in enumerate(self._latest_lessons()):
+            for order in curricula.values():
+                if lesson_id not in order:
+                    continue
+                start = order.index(lesson_id) + (1 if status == "completed" else 0)
+                for distance, upcoming in enumerate(order[start:start + self.lookahead]):
+                    key = (distance, rank)
+                    if upcoming not in ranked or key < ranked[upcoming]:
+                        ranked[upcoming] = key
+        return sorted(ranked, key=ranked.get)
+
+    def plan(self, remote_versions, upcoming=None):
+        """(lesson_id, version) from the prediction that aren't installed at the cloud's version."""
+        installed = self._installed_versions()
+        return [(l, remote_versions[l]) for l in (self.predict() if upcoming is None else upcoming)
+                if l in remote_versions and installed.get(l) != remote_versions[l]]
+
+    def run_once(self):
+        """Fetch up to `max_per_run` predicted lessons. Returns the lesson ids synced."""
+        with self._lock:
+            try:
+                versions = self.remote_versions()
+                self.upcoming = self.predict()
+                pending = self.plan(versions, self.upcoming)[:self.max_per_run]
+            except Exception as e:
+                print(f"🔮 [Prefetch] Skipping, cloud unavailable: {e}")
+                return []
+            synced = []
+            for lesson_id, version in pending:
+                print(f"🔮 [Prefetch] Fetching upcoming lesson {lesson_id}")
+                with self.policy.background():
+                    self.sync_lesson(lesson_id, version)
+                synced.append(lesson_id)
+            self.last_run = {"at": time.time(), "synced": synced}
+            return synced
+
+    def kick(self):
+        """Ask for a pass soon, e.g. right after a learner completes a lesson."""
+        self._wake.set()
+
+    def status(self):
+        """What the last background pass computed; never touches the network."""
+        return {"lookahead": self.lookahead, "upcoming": self.upcoming, "last_run": self.last_run}
+
+    def start(self, interval=CHECK_INTERVAL_SECONDS):
+        """Prefetch on a daemon thread every `interval` seconds, or sooner when kicked."""
+        def _loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"⚠️ [Prefetch] {e}")
+
+        thread = threading.Thread(target=_loop, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,243 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from jobs import DONE, FAILED
+
+# A generation is only started after this long without learner requests
+IDLE_SECONDS = int(os.environ.get("PREGEN_IDLE_SECONDS", "120"))
+# Minimum gap between two pre-generations, and how many may run per day (0 disables)
+MIN_INTERVAL_SECONDS = int(os.environ.get("PREGEN_MIN_INTERVAL_SECONDS", "60"))
+DAILY_BUDGET = int(os.environ.get("PREGEN_DAILY_BUDGET", "20"))
+CHECK_INTERVAL_SECONDS = 30
+JOB_WAIT_SECONDS = 600
+# A failed variant is skipped for this long, doubling per consecutive failure up to the cap
+FAILURE_BACKOFF_SECONDS = 1800
+MAX_BACKOFF_SECONDS = 24 * 3600
+
+# Mastery below LOW marks a struggling learner, above HIGH a confident one
+LOW_MASTERY = 0.4
+HIGH_MASTERY = 0.8
+
+
+def is_online(host="openrouter.ai", port=443, timeout=2):
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+
+class VariantPregenerator:
+    """
+    Pre-builds Beginner/Advance variants of installed lessons while the
+    device is online and idle, so switching modes is a local file read.
+    Lessons many learners struggle with get their Beginner variant first;
+    lessons many learners have mastered get their Advance variant first.
+    Work goes through the generation job pool, so a learner asking for a
+    variant that is being pre-built joins that job.
+    """
+
+    def __init__(self, variants, jobs, generate, model, mastery_db, budget_db,
+                 daily_budget=DAILY_BUDGET, min_interval=MIN_INTERVAL_SECONDS,
+                 idle_seconds=IDLE_SECONDS, online_check=is_online):
+        self.variants = variants
+        self.jobs = jobs
+        self.generate = generate
+        self.model = model
+        self.mastery_db = mastery_db
+        self.budget_db = budget_db
+        self.daily_budget = daily_budget
+        self.min_interval = min_interval
+        self.idle_seconds = idle_seconds
+        self.online_check = online_check
+        self._last_activity = time.time()
+        self._last_generation = 0.0
+        self._init_db()
+
+    def _init_db(self):
+        conn = sqlite3.connect(self.budget_db)
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pregen_budget (
+                day TEXT PRIMARY KEY,
+                used INTEGER NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pregen_failures (
+                lesson_id TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                failures INTEGER NOT NULL,
+                retry_after REAL NOT NULL,
+                PRIMARY KEY (lesson_id, mode)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def touch(self):
+        """Mark learner activity; called for every incoming request."""
+        self._last_activity = time.time()
+
+    def is_idle(self):
+        return time.time() - self._last_activity >= self.idle_seconds
+
+    def budget_used(self):
+        conn = sqlite3.connect(self.budget_db)
+        cur = conn.cursor()
+        cur.execute("SELECT used FROM pregen_budget WHERE day = ?", (date.today().isoformat(),))
+        row = cur.fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def _spend_budget(self):
+        conn = sqlite3.connect(self.budget_db)
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO pregen_budget (day, used) VALUES (?, 1)
+            ON CONFLICT(day) DO UPDATE SET used = used + 1
+        """, (date.today().isoformat(),))
+        conn.commit()
+        conn.close()
+
+    def _backing_off(self):
+        """{(lesson_id, mode)} whose last generation failed too recently to retry."""
+        conn = sqlite3.connect(self.budget_db)
+        cur = conn.cursor()
+        cur.execute("SELECT lesson_id, mode FROM pregen_failures WHERE retry_after > ?", (time.time(),))
+        rows = set(cur.fetchall())
+        conn.close()
+        return rows
+
+    def _record_outcome(self, lesson_id, mode, ok):
+        conn = sqlite3.connect(self.budget_db)
+        with conn:
+            if ok:
+                conn.execute("DELETE FROM pregen_failures WHERE lesson_id = ? AND mode = ?", (lesson_id, mode))
+            else:
+                cur = conn.execute("SELECT failures FROM pregen_failures WHERE lesson_id = ? AND mode = ?", (lesson_id, mode))
+                row = cur.fetchone()
+                failures = (row[0] if row else 0) + 1
+                delay = min(MAX_BACKOFF_SECONDS, FAILURE_BACKOFF_SECONDS * 2 ** (failures - 1))
+                conn.execute("INSERT OR REPLACE INTO pregen_failures (lesson_id, mode, failures, retry_after) VALUES (?, ?, ?, ?)",
+                             (lesson_id, mode, failures, time.time() + delay))
+        conn.close()
+
+    def _wait(self, job_id):
+        """Poll the job until it finishes or JOB_WAIT_SECONDS pass (JobManager.wait caps each call)."""
+        deadline = time.time() + JOB_WAIT_SECONDS
+        while True:
+            job = self.jobs.wait(job_id, deadline - time.time())
+            if job is None or job["status"] in (DONE, FAILED) or time.time() >= deadline:
+                return job
+
+    def _root_lessons(self):
+        """(lesson_id, concept_ids) for every installed lesson that isn't itself a variant."""
+        out = []
+        if not os.path.exists(self.variants.lessons_dir):
+            return out
+        for f in sorted(os.listdir(self.variants.lessons_dir)):
+            if not f.endswith(".json"):
+                continue
+            lesson_id = f[:-5]
+            if self.variants.resolve_root(lesson_id) != lesson_id:
+                continue
+            try:
+                lesson = self.variants._load_json(os.path.join(self.variants.lessons_dir, f))
+            except Exception:
+                continue
+            if lesson.get("source_lesson_id"):
+                continue
+            concept_ids = [c.get("id") if isinstance(c, dict) else c for c in lesson.get("concepts", [])]
+            out.append((lesson_id, [c for c in concept_ids if c]))
+        return out
+
+    def _mastery_counts(self):
+        """concept_id -> (learners below LOW_MASTERY, learners above HIGH_MASTERY)."""
+        counts = {}
+        try:
+            conn = sqlite3.connect(self.mastery_db)
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT concept_id,
+                       SUM(CASE WHEN mastery_probability < ? THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN mastery_probability > ? THEN 1 ELSE 0 END)
+                FROM local_mastery GROUP BY concept_id
+            """, (LOW_MASTERY, HIGH_MASTERY))
+            counts = {r[0]: (r[1] or 0, r[2] or 0) for r in cur.fetchall()}
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ [Pregen] Could not read mastery signals: {e}")
+        return counts
+
+    def candidates(self):
+        """(priority, lesson_id, mode) for variants not yet cached nor backing off, highest priority first."""
+        counts = self._mastery_counts()
+        backing_off = self._backing_off()
+        out = []
+        for lesson_id, concept_ids in self._root_lessons():
+            low = sum(counts.get(c, (0, 0))[0] for c in concept_ids)
+            high = sum(counts.get(c, (0, 0))[1] for c in concept_ids)
+            for mode, priority in (("beginner", low), ("advance", high)):
+                if (lesson_id, mode) in backing_off:
+                    continue
+                try:
+                    _, _, cached = self.variants.find_cached(lesson_id, mode, self.model)
+                except (LookupError, ValueError):
+                    continue
+                if not cached:
+                    out.append((priority, lesson_id, mode))
+        # Stable: equal priorities keep lesson order, Beginner before Advance
+        out.sort(key=lambda c: -c[0])
+        return out
+
+    def run_once(self):
+        """
+        Pre-generate at most one variant if every gate allows it.
+        Returns the finished job, or None when nothing was started.
+        """
+        if self.daily_budget <= 0 or self.budget_used() >= self.daily_budget:
+            return None
+        if time.time() - self._last_generation < self.min_interval:
+            return None
+        if not self.is_idle() or not self.online_check():
+            return None
+
+        pending = self.candidates()
+        if not pending:
+            return None
+        priority, lesson_id, mode = pending[0]
+        self._last_generation = time.time()
+        # Same key as learner requests, so either side joins the other's job
+        job, created = self.jobs.submit(
+            "generate_adaptive_lesson", (lesson_id, mode),
+            self.variants.get_or_generate, lesson_id, mode, self.generate, self.model
+        )
+        if created:
+            print(f"🌙 [Pregen] Building {mode} variant of {lesson_id} (priority {priority})")
+            self._spend_budget()
+        job = self._wait(job["id"])
+        if job and job["status"] in (DONE, FAILED):
+            # A failure backs this variant off so the next pass moves on to other lessons
+            self._record_outcome(lesson_id, mode, job["status"] == DONE)
+            if job["status"] == FAILED:
+                print(f"⚠️ [Pregen] {mode} variant of {lesson_id} failed, skipping it for now: {job['error']}")
+        return job
+
+    def start(self, interval=CHECK_INTERVAL_SECONDS):
+        """Check for pre-generation work periodically on a daemon thread."""
+        def _loop():
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"⚠️ [Pregen] {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=_loop, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,147 @@
+import math
+import os
+import re
+from collections import Counter
+
+# Prompt budget for retrieved lesson/document text, in estimated tokens
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("AI_TUTOR_CONTEXT_TOKENS", "1500"))
+CONTEXT_TOP_K = int(os.environ.get("AI_TUTOR_CONTEXT_TOP_K", "6"))
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "of", "on", "or", "that", "the", "this", "to",
+    "was", "what", "when", "where", "which", "who", "why", "will", "with", "you",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Cheap model-token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def chunk_text(text, source, max_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping word windows, starting a new window at
+    paragraph breaks when the current one is already half full.
+    Returns a list of {'source', 'position', 'text'} dicts.
+    """
+    chunks = []
+    window = []
+    fresh = 0  # words in `window` not yet emitted in any chunk
+    for para in re.split(r"\n\s*\n", text or ""):
+        words = para.split()
+        if not words:
+            continue
+        if len(window) >= max_words // 2 and fresh:
+            chunks.append(" ".join(window))
+            window, fresh = [], 0
+        for word in words:
+            window.append(word)
+            fresh += 1
+            if len(window) >= max_words:
+                chunks.append(" ".join(window))
+                window, fresh = (window[-overlap:] if overlap else []), 0
+    if fresh:
+        chunks.append(" ".join(window))
+    return [{"source": source, "position": i, "text": c} for i, c in enumerate(chunks)]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of chunks; term statistics are computed once."""
+
+    def __init__(self, chunks, term_freqs=None):
+        self.chunks = chunks
+        if term_freqs is None:
+            term_freqs = [Counter(tokenize(c["text"])) for c in chunks]
+        self.term_freqs = term_freqs
+        self.doc_lens = [sum(tf.values()) for tf in self.term_freqs]
+        n = len(chunks)
+        self.avg_len = (sum(self.doc_lens) / n) if n else 0.0
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        self.idf = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items()}
+
+    def scores(self, query):
+        """BM25 score of every chunk against `query`, in chunk order."""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        out = []
+        for tf, dl in zip(self.term_freqs, self.doc_lens):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / self.avg_len) if self.avg_len else BM25_K1
+            score = 0.0
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self.idf[t] * f * (BM25_K1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+    def search(self, query, top_k=CONTEXT_TOP_K):
+        """Top-k (score, chunk) pairs; ties keep document order."""
+        ranked = sorted(enumerate(self.scores(query)), key=lambda p: (-p[1], p[0]))
+        return [(score, self.chunks[i]) for i, score in ranked[:top_k]]
+
+
+def _normalised(ranked):
+    """Scores divided by the list's best, so rankings from separate indexes can be merged."""
+    top = ranked[0][0] if ranked else 0.0
+    return [(score / top if top > 0 else 0.0, chunk) for score, chunk in ranked]
+
+
+def _fit_budget(ranked, token_budget):
+    picked = []
+    used = 0
+    for _, chunk in ranked:
+        cost = estimate_tokens(chunk["text"])
+        if used + cost > token_budget:
+            continue
+        picked.append(chunk)
+        used += cost
+    picked.sort(key=lambda c: (c["source"], c["position"]))
+    return picked
+
+
+def select_chunks(question, chunks, top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET, index=None):
+    """Best-scoring chunks for `question` that fit within `token_budget`, in document order."""
+    index = index or BM25Index(chunks)
+    return _fit_budget(index.search(question, top_k), token_budget)
+
+
+def build_context(question, lesson_context=None, file_text=None, document_index=None,
+                  top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Reduce lesson/document text to what is relevant for `question`.
+    `document_index` is a prebuilt BM25Index for a stored document.
+    Returns {'lesson': str, 'document': str}; inline sources that already
+    fit the budget together are passed through untouched.
+    """
+    sources = {"lesson": lesson_context or "", "document": file_text or ""}
+    if document_index is None and sum(estimate_tokens(t) for t in sources.values() if t) <= token_budget:
+        return sources
+
+    chunks = []
+    for name, text in sources.items():
+        chunks.extend(chunk_text(text, name))
+    ranked = BM25Index(chunks).search(question, top_k) if chunks else []
+    if document_index is not None:
+        # BM25 scores depend on each index's own statistics; compare them relative to each list's best
+        merged = _normalised(ranked) + _normalised(document_index.search(question, top_k))
+        ranked = sorted(merged, key=lambda p: -p[0])[:top_k]
+    picked = _fit_budget(ranked, token_budget)
+    return {
+        name: "\n...\n".join(c["text"] for c in picked if c["source"] == name)
+        for name in sources
+    }
@@ -3,6 +3,12 @@ import sqlite3
 import json
 import os
 import shutil
+import time
+
+from bandwidth import LinkEstimator, SyncPolicy
+from catalog import ContentCatalog
+import content_store
+from content_validator import validate_concept, validate_lesson, validate_payload
 
 # ==============================
 # 🔑 CONFIG (ADD YOUR KEYS HERE)
@@ -21,6 +27,13 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+# Optional LAN mirror: another engine started with MIRROR_MODE=1. It is asked
+# first for metadata and files; the cloud stays the fallback.
+MIRROR_URL = os.environ.get("CONTENT_MIRROR_URL", "").rstrip("/")
+MIRROR_TIMEOUT = 5
+# Metadata requests to the cloud give up after this long instead of hanging on a bad network
+REQUEST_TIMEOUT = 15
+
 # ==============================
 # 📁 NEW DIRECTORY STRUCTURE (Sync-to-Edge)
 # ==============================
@@ -38,12 +51,30 @@ DB_PATH = os.path.join(PUNE_CONTENT_DIR, "metadata.db")
 for d in [LESSONS_DIR, CONCEPTS_DIR, THUMBNAILS_DIR, VIDEOS_DIR]:
     os.makedirs(d, exist_ok=True)
 
+# Indexed view of the JSON tree; every save_json below keeps it current
+catalog = ContentCatalog(DB_PATH, LESSONS_DIR, CONCEPTS_DIR, VIDEOS_DIR)
+
+# Measured from real transfers; decides what background sync fetches and how fast
+link = LinkEstimator()
+# Built on first use (get_sync_policy), so it uses DB_PATH as configured by then
+sync_policy = None
+
+# download_file result for a video queued by the sync policy instead of fetched
+DEFERRED = "deferred"
+
+
+def get_sync_policy():
+    global sync_policy
+    if sync_policy is None:
+        sync_policy = SyncPolicy(link, DB_PATH)
+    return sync_policy
+
 # ==============================
 # 🗄️ DB FUNCTIONS
 # ==============================
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def get_db(db_path=None):
+    conn = sqlite3.connect(db_path or DB_PATH)
     # Ensure tables exist according to the new spec (tracking versions)
     cur = conn.cursor()
     cur.execute("""
@@ -65,6 +96,26 @@ def get_installed_version(content_id, ctype):
     conn.close()
     return row[0] if row else None
 
+def installed_versions(db_path=None):
+    """{(id, type): version} for everything installed."""
+    conn = get_db(db_path)
+    cur = conn.cursor()
+    cur.execute("SELECT id, type, version FROM cached_content")
+    versions = {(r[0], r[1]): r[2] for r in cur.fetchall()}
+    conn.close()
+    return versions
+
+def load_aliases(db_path=None):
+    conn = get_db(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT alias, canonical FROM content_aliases")
+        return dict(cur.fetchall())
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
 def upsert_installed(content_id, ctype, version):
     conn = get_db()
     cur = conn.cursor()
@@ -77,16 +128,56 @@ def upsert_installed(content_id, ctype, version):
 # 📥 SYNC HELPERS
 # ==============================
 
+def rest_get(url, headers=HEADERS):
+    """GET a cloud REST url, from the LAN mirror when one is configured and has the answer."""
+    if MIRROR_URL and url.startswith(f"{SUPABASE_URL}/rest/v1/"):
+        try:
+            res = requests.get(MIRROR_URL + "/mirror" + url[len(SUPABASE_URL):], timeout=MIRROR_TIMEOUT)
+            # An empty answer to a lookup means the mirror couldn't get it either
+            if res.ok and (res.json() or "=eq." not in url):
+                return res
+        except (requests.RequestException, ValueError) as e:
+            print(f"  🛰️ Mirror unavailable, using the cloud: {e}")
+    res = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    link.record_latency(res.elapsed.total_seconds())
+    return res
+
 def download_file(url, dest_path, expected_size=None):
-    """Download a file with verification and cleanup on failure."""
+    """
+    Download a file with verification and cleanup on failure, from the LAN
+    mirror first if configured. Returns True once the file is on disk,
+    DEFERRED if background sync queued it for later, False on failure.
+    """
+    rel_path = os.path.relpath(dest_path, ASSETS_DIR).replace(os.sep, "/")
+    if MIRROR_URL and not rel_path.startswith(".."):
+        result = _download(f"{MIRROR_URL}/mirror/assets/{rel_path}", dest_path, expected_size, timeout=MIRROR_TIMEOUT, origin=url)
+        if result:
+            return result
+    return _download(url, dest_path, expected_size)
+
+def _download(url, dest_path, expected_size=None, timeout=None, origin=None):
     print(f"  ⬇️ Downloading: {url}")
+    policy = get_sync_policy()
     temp_path = dest_path + ".tmp"
     try:
-        with requests.get(url, stream=True) as r:
+        with requests.get(url, stream=True, timeout=timeout) as r:
             r.raise_for_status()
+            size = int(r.headers.get('content-length') or 0) or (expected_size if isinstance(expected_size, int) else 0)
+            # Background sync leaves big videos for a better link; they are queued, not failed
+            if policy.should_defer(size):
+                policy.defer(origin or url, dest_path, size)
+                print(f"  ⏸️ Deferred {os.path.basename(dest_path)} ({size // (1024 * 1024)} MB) until the link allows")
+                return DEFERRED
+            cap = policy.rate_limit()
+            started, received, slept = time.monotonic(), 0, 0.0
             with open(temp_path, 'wb') as f:
                 for chunk in r.iter_content(chunk_size=8192):
                     f.write(chunk)
+                    received += len(chunk)
+                    slept += policy.throttle(received, started, cap)
+            # The estimate describes the cloud link; a LAN mirror's speed says nothing about it
+            if origin is None:
+                link.record_transfer(received, time.monotonic() - started - slept)
         
         # Verification
         if expected_size:
@@ -98,6 +189,7 @@ def download_file(url, dest_path, expected_size=None):
                  raise Exception(f"Size mismatch: expected {expected_size}, got {actual_size}")
         
         os.replace(temp_path, dest_path)
+        policy.done(dest_path)
         return True
     except Exception as e:
         print(f"  ⚠️ Download failed: {e}")
@@ -106,8 +198,8 @@ def download_file(url, dest_path, expected_size=None):
         return False
 
 def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    content_store.save_json(path, data)
+    catalog.index_file(path)
 
 # ==============================
 # 🚀 SYNC PROTOCOL
@@ -116,7 +208,7 @@ def save_json(path, data):
 def sync_video(video_id):
     print(f"  🔍 Fetching independent Video: {video_id}")
     try:
-        res = requests.get(f"{VIDEOS_ENDPOINT}?id=eq.{video_id}", headers=HEADERS)
+        res = rest_get(f"{VIDEOS_ENDPOINT}?id=eq.{video_id}", headers=HEADERS)
         res.raise_for_status()
         if not res.json():
             print(f"  ❌ Video {video_id} not found.")
@@ -136,17 +228,16 @@ def sync_video(video_id):
         ext = ".mp4" if ".mp4" in video_url.lower() else ".mp4"
         video_path = os.path.join(VIDEOS_DIR, f"{video_id}{ext}")
         if not os.path.exists(video_path):
+            # A deferred video isn't on disk yet: record it once it is
             success = download_file(video_url, video_path)
-            if not success: all_assets_success = False
+            if success is not True: all_assets_success = False
 
         # Download thumbnail if present
         if thumb_url:
             t_ext = ".jpg" if ".jpg" in thumb_url.lower() else ".png"
             thumb_path = os.path.join(THUMBNAILS_DIR, f"{video_id}{t_ext}")
-            if not os.path.exists(thumb_path):
-                t_success = download_file(thumb_url, thumb_path)
-                if t_success:
-                    v_data['local_thumb'] = f"assets/thumbnails/{video_id}{t_ext}"
+            if os.path.exists(thumb_path) or download_file(thumb_url, thumb_path) is True:
+                v_data['local_thumb'] = f"assets/thumbnails/{video_id}{t_ext}"
         
         if all_assets_success:
             v_data['local_video'] = f"assets/videos/{video_id}{ext}"
@@ -162,7 +253,7 @@ def sync_video(video_id):
 def sync_concept(concept_id, remote_version=1):
     print(f"  🔍 Fetching independent Concept: {concept_id}")
     try:
-        c_res = requests.get(f"{CONCEPTS_ENDPOINT}?id=eq.{concept_id}&select=json_data,version", headers=HEADERS)
+        c_res = rest_get(f"{CONCEPTS_ENDPOINT}?id=eq.{concept_id}&select=json_data,version", headers=HEADERS)
         c_res.raise_for_status()
         c_data = c_res.json()[0]
         concept = c_data['json_data']
@@ -171,6 +262,15 @@ def sync_concept(concept_id, remote_version=1):
         concept['id'] = concept_id
         concept['version'] = c_data.get('version') or 1
 
+        # Gate: invalid content never replaces what is installed
+        warnings = []
+        problems = validate_concept(concept, warnings)
+        if problems:
+            print(f"  ❌ Concept {concept_id} rejected: {'; '.join(problems)}")
+            return False
+        if warnings:
+            print(f"  ⚠️ Concept {concept_id}: {'; '.join(warnings)}")
+
         # Check if concept needs update
         if get_installed_version(concept_id, 'concept') != concept['version']:
             print(f"  📝 Syncing Concept: {concept_id} (v{concept['version']})")
@@ -188,7 +288,7 @@ def sync_concept(concept_id, remote_version=1):
             
             if not os.path.exists(video_path):
                 success = download_file(video_url, video_path)
-                if not success:
+                if success is not True:
                     all_assets_success = False
 
         if all_assets_success:
@@ -202,7 +302,7 @@ def sync_concept(concept_id, remote_version=1):
 def sync_lesson(lesson_id, remote_version):
     print(f"📦 Fetching payload for Lesson: {lesson_id} (v{remote_version})")
     try:
-        res = requests.get(f"{LESSONS_ENDPOINT}?lesson_id=eq.{lesson_id}&select=json_data", headers=HEADERS)
+        res = rest_get(f"{LESSONS_ENDPOINT}?lesson_id=eq.{lesson_id}&select=json_data", headers=HEADERS)
         res.raise_for_status()
         row = res.json()[0]
         payload_data = row['json_data']
@@ -213,9 +313,16 @@ def sync_lesson(lesson_id, remote_version):
         # order_index might be inside json_data, if not we default to 0
         if 'order_index' not in payload_data:
             payload_data['order_index'] = 0
+        payload_data.setdefault('lesson_id', lesson_id)
         
-        save_json(os.path.join(LESSONS_DIR, f"{lesson_id}.json"), payload_data)
-        
+        warnings = []
+        problems = validate_lesson(payload_data, warnings)
+        if problems:
+            print(f"❌ Lesson {lesson_id} rejected: {'; '.join(problems)}")
+            return
+        if warnings:
+            print(f"⚠️ Lesson {lesson_id}: {'; '.join(warnings)}")
+
         concepts_data = payload_data.get('concepts', [])
         all_assets_success = True
         
@@ -247,12 +354,19 @@ def sync_lesson(lesson_id, remote_version):
                 
                 if not os.path.exists(video_path):
                     success = download_file(video_url, video_path)
-                    if not success:
+                    if success is not True:
                         all_assets_success = False
 
             if all_assets_success:
                 upsert_installed(concept_id, 'concept', concept_version)
 
+        # Gate: the lesson only goes live once every concept it references is installed
+        problems = validate_payload(payload_data, {}, CONCEPTS_DIR, load_aliases())
+        if problems:
+            print(f"❌ Lesson {lesson_id} not installed: {'; '.join(problems)}")
+            return
+        save_json(os.path.join(LESSONS_DIR, f"{lesson_id}.json"), payload_data)
+
         if all_assets_success:
             upsert_installed(lesson_id, 'lesson', remote_version)
             print(f"🌸 Lesson '{payload_data.get('title')}' fully synced.")
@@ -267,7 +381,7 @@ def sync_lesson(lesson_id, remote_version):
 def run_update():
     print("\n🔄 Background Sync Protocol Started\n")
     try:
-        res = requests.get(LESSONS_ENDPOINT + "?select=lesson_id,version", headers=HEADERS)
+        res = rest_get(LESSONS_ENDPOINT + "?select=lesson_id,version", headers=HEADERS)
         res.raise_for_status()
         remote_lessons = res.json()
     except Exception as e:
@@ -285,15 +399,83 @@ def run_update():
         if local_version == remote_version:
             continue
         
-        sync_lesson(lesson_id, remote_version)
+        # Background mode: metadata and small assets now, big videos only if the link allows
+        with get_sync_policy().background():
+            sync_lesson(lesson_id, remote_version)
 
+    download_deferred()
     print("\n✅ Background Sync complete.\n")
 
+def download_deferred(dest_path=None):
+    """
+    Fetch queued videos, smallest first, as far as the sync policy allows.
+    With `dest_path`, fetch just that one right away (a learner asked for it).
+    Returns the number of files downloaded.
+    """
+    policy = get_sync_policy()
+    if dest_path:
+        # A .tmp means a fetch for it is already running
+        if os.path.exists(dest_path + ".tmp"):
+            return 0
+        url = policy.deferred_url(dest_path)
+        return int(bool(url) and download_file(url, dest_path) is True)
+    done = 0
+    for dest, url, size in policy.pending():
+        if os.path.exists(dest):
+            policy.done(dest)
+            continue
+        with policy.background():
+            if policy.should_defer(size):
+                continue
+            if download_file(url, dest) is True:
+                done += 1
+    if done:
+        print(f"⬇️ Fetched {done} deferred video(s)")
+    return done
+
+def fetch_remote_versions():
+    """{lesson_id: version} for every lesson in the cloud; raises when it can't be reached."""
+    res = rest_get(LESSONS_ENDPOINT + "?select=lesson_id,version")
+    res.raise_for_status()
+    return {l['lesson_id']: l.get('version') or 1 for l in res.json()}
+
+def _curriculum_order(subjects):
+    """Lesson ids in curriculum order from delivery_subjects rows (already sorted by `order`)."""
+    lesson_ids = []
+    for subject in subjects:
+        for lesson in sorted(subject.get('lessons') or [], key=lambda l: l.get('order_index') or 0):
+            if lesson['lesson_id'] not in lesson_ids:
+                lesson_ids.append(lesson['lesson_id'])
+    return lesson_ids
+
+def fetch_course_lessons(course_id):
+    """Lesson ids of a course in curriculum order (subjects by `order`, then lessons by `order_index`)."""
+    res = requests.get(
+        f"{SUPABASE_URL}/rest/v1/delivery_subjects?course_id=eq.{course_id}"
+        "&select=order,lessons:delivery_lessons(lesson_id,order_index)&order=order.asc",
+        headers=HEADERS, timeout=REQUEST_TIMEOUT
+    )
+    res.raise_for_status()
+    return _curriculum_order(res.json())
+
+def fetch_curricula():
+    """{course_id: [lesson_id, ...]} in curriculum order for every course, in one request."""
+    res = requests.get(
+        f"{SUPABASE_URL}/rest/v1/delivery_subjects"
+        "?select=course_id,order,lessons:delivery_lessons(lesson_id,order_index)&order=order.asc",
+        headers=HEADERS, timeout=REQUEST_TIMEOUT
+    )
+    res.raise_for_status()
+    subjects = {}
+    for subject in res.json():
+        subjects.setdefault(subject.get('course_id'), []).append(subject)
+    return {course_id: _curriculum_order(rows) for course_id, rows in subjects.items()}
+
 def download_specific_item(item_id, item_type):
     print(f"\n📥 On-Demand Download started for {item_type}: {item_id}\n")
     if item_type.lower() == 'lesson':
         try:
-            res = requests.get(f"{LESSONS_ENDPOINT}?lesson_id=eq.{item_id}&select=version", headers=HEADERS)
+            res = rest_get(f"{LESSONS_ENDPOINT}?lesson_id=eq.{item_id}&select=version", headers=HEADERS)
             if res.ok and len(res.json()) > 0:
                 rv = res.json()[0].get('version') or 1
                 sync_lesson(item_id, rv)
@@ -309,7 +491,7 @@ def download_specific_item(item_id, item_type):
 def preview_updates():
     """Simple implementation of preview using local state."""
     try:
-        res = requests.get(LESSONS_ENDPOINT + "?select=lesson_id,version", headers=HEADERS)
+        res = rest_get(LESSONS_ENDPOINT + "?select=lesson_id,version", headers=HEADERS)
         res.raise_for_status()
         remote_lessons = res.json()
     except Exception:
@@ -5,7 +5,7 @@ import io
 import sys
 import threading
 import urllib.parse
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 from datetime import datetime
 try:
@@ -25,15 +25,59 @@ UI_DIR = os.path.join(PROJECT_DIR, 'UI')
 LESSONS_DIR = os.path.join(PUNE_CONTENT_DIR, 'lessons')
 CONCEPTS_DIR = os.path.join(PUNE_CONTENT_DIR, 'concepts')
 VIDEOS_DIR = os.path.join(PUNE_CONTENT_DIR, 'assets', 'videos')
-
-from updater import preview_updates, run_update, get_db, download_specific_item, SUPABASE_URL, HEADERS, LESSONS_ENDPOINT, CONCEPTS_ENDPOINT, VIDEOS_ENDPOINT, SUPABASE_KEY
+DOCUMENTS_DIR = os.path.join(PUNE_CONTENT_DIR, 'documents')
+# Largest quiz session accepted by /api/grade_session
+MAX_SESSION_ANSWERS = 500
+# Serve installed content to other engines on the LAN under /mirror/
+MIRROR_MODE = os.environ.get('MIRROR_MODE', '').lower() in ('1', 'true', 'yes')
+
+from updater import preview_updates, run_update, get_db, download_specific_item, download_file, SUPABASE_URL, HEADERS, LESSONS_ENDPOINT, CONCEPTS_ENDPOINT, VIDEOS_ENDPOINT, SUPABASE_KEY
+from updater import catalog as content_catalog, load_aliases, fetch_course_lessons
+from updater import sync_lesson, sync_concept, sync_video, fetch_remote_versions, fetch_curricula
+from updater import link as network_link, get_sync_policy, download_deferred, rest_get
+from content_validator import validate_tree
 from adaptive import AdaptiveService
+import ai_gen
 from ai_gen import AIGenService
-from ai_tutor import AITutorService
+from ai_metrics import metrics as ai_metrics
+from lesson_variants import LessonVariantStore
+from jobs import JobManager
+from ai_tutor import AITutorService, HISTORY_PAGE_SIZE
+from documents import DocumentStore, DocumentTooLarge
+from pregenerator import VariantPregenerator
+from asset_cache import AssetCache
+from content_packs import ContentPacks, PackError
+from mirror import ContentMirror
+from prefetcher import LessonPrefetcher
+from course_install import CourseInstaller
+import grading
+import content_store
 
 adaptive_service = AdaptiveService(SUPABASE_URL, SUPABASE_KEY)
 ai_service = AIGenService()
-ai_tutor_service = AITutorService(DB_PATH)
+sync_policy = get_sync_policy()
+lesson_variants = LessonVariantStore(LESSONS_DIR, CONCEPTS_DIR, DB_PATH, content_catalog)
+# Caps how many LLM lesson generations run at once
+generation_jobs = JobManager(max_workers=int(os.environ.get('AI_GEN_CONCURRENCY', 2)))
+document_store = DocumentStore(DB_PATH, DOCUMENTS_DIR)
+ai_tutor_service = AITutorService(DB_PATH, document_store)
+pregenerator = VariantPregenerator(
+    lesson_variants, generation_jobs, ai_service.generate_adaptive_lesson, ai_gen.MODEL,
+    adaptive_service.local_db, DB_PATH
+)
+content_packs = ContentPacks(PUNE_CONTENT_DIR, DB_PATH, content_catalog)
+content_mirror = ContentMirror(
+    PUNE_CONTENT_DIR, DB_PATH, content_catalog,
+    sync={'lesson': sync_lesson, 'concept': sync_concept, 'video': sync_video},
+    remote_versions=fetch_remote_versions, download=download_file
+)
+asset_cache = AssetCache(DB_PATH, PUNE_CONTENT_DIR, content_catalog, adaptive_service.local_db, download=download_file)
+course_installer = CourseInstaller(
+    PUNE_CONTENT_DIR, DB_PATH, content_catalog, f"{SUPABASE_URL}/rest/v1", rest_get, download_file
+)
+prefetcher = LessonPrefetcher(
+    DB_PATH, adaptive_service.local_db, sync_lesson, fetch_remote_versions, fetch_curricula, sync_policy
+)
 
 class Handler(BaseHTTPRequestHandler):
     def _set_json(self, code=200):
@@ -50,9 +94,14 @@ class Handler(BaseHTTPRequestHandler):
             pass # Client disconnected prematurely
 
     def do_GET(self):
+        pregenerator.touch()
+        sync_policy.touch()
         parsed = urlparse(self.path)
         path = parsed.path
 
+        if MIRROR_MODE and content_mirror.handle(self, path, parsed.query):
+            return
+
         # 1. Static Pages & Health
         if path == '/' or path == '/index.html':
             self._serve_static('index.html', 'text/html; charset=utf-8')
@@ -79,6 +128,26 @@ class Handler(BaseHTTPRequestHandler):
             self._send_json(self._get_installed())
             return
 
+        if path == '/api/content/validate':
+            self._send_json(validate_tree(LESSONS_DIR, CONCEPTS_DIR, VIDEOS_DIR, load_aliases()))
+            return
+
+        if path == '/api/packs/export':
+            self._handle_pack_export(parsed)
+            return
+
+        if path == '/api/cache/stats':
+            self._send_json(asset_cache.stats())
+            return
+
+        if path == '/api/network':
+            self._send_json(sync_policy.status())
+            return
+
+        if path == '/api/prefetch':
+            self._send_json(prefetcher.status())
+            return
+
         # 3. Search & Speedtest
         if path.startswith('/api/speedtest'):
             self._serve_speedtest()
@@ -97,6 +166,16 @@ class Handler(BaseHTTPRequestHandler):
             self._handle_courses_search(parsed)
             return
 
+        if path == '/api/courses/installed':
+            self._send_json({'courses': course_installer.installed_courses()})
+            return
+
+        if path.startswith('/api/courses/') and path.endswith('/install'):
+            progress = course_installer.progress(path.split('/')[3])
+            if progress: self._send_json({'progress': progress})
+            else: self._send_json({'error': 'No install for this course'}, 404)
+            return
+
         if path.startswith('/api/courses/') and path.endswith('/curriculum'):
             course_id = path.split('/')[3]
             self._handle_course_curriculum(course_id)
@@ -106,18 +185,51 @@ class Handler(BaseHTTPRequestHandler):
             self._handle_search_videos(parsed)
             return
 
-        if path.startswith('/api/ai_tutor/history/'):
+        if path == '/api/metrics/ai':
+            self._send_json({
+                'calls': ai_metrics.snapshot(),
+                'routers': {
+                    'tutor': ai_tutor_service.router.stats(),
+                    'generation': ai_gen.router.stats(),
+                },
+                'tutor_cache': ai_tutor_service.cache.stats(),
+            })
+            return
+
+        if path == '/api/ai_tutor/cache_stats':
+            self._send_json(ai_tutor_service.cache.stats())
+            return
+
+        if path.startswith('/api/ai_tutor/documents/'):
             user_id = path.split('/')[-1]
-            self._send_json({'history': ai_tutor_service.get_history(user_id)})
+            self._send_json({'documents': document_store.list(user_id)})
+            return
+
+        if path.startswith('/api/jobs/'):
+            self._handle_job_status(path, parsed)
+            return
+
+        if path.startswith('/api/ai_tutor/history/'):
+            self._handle_ai_tutor_history(path, parsed)
             return
 
         # 5. Static Fallback (CSS, JS, Assets)
         self._serve_static_fallback(path)
 
     def do_POST(self):
+        pregenerator.touch()
+        sync_policy.touch()
         parsed = urlparse(self.path)
         path = parsed.path
-        
+
+        # Raw (non-JSON) body, streamed straight to disk
+        if path == '/api/ai_tutor/documents':
+            self._handle_document_upload(parsed)
+            return
+        if path == '/api/packs/import':
+            self._handle_pack_import()
+            return
+
         length = int(self.headers.get('content-length', 0))
         body = self.rfile.read(length)
         data = json.loads(body.decode('utf-8')) if length > 0 else {}
@@ -130,6 +242,10 @@ class Handler(BaseHTTPRequestHandler):
             self._handle_progress(data)
         elif path == '/api/log_event':
             self._handle_log_event(data)
+        elif path == '/api/check_answer':
+            self._handle_check_answer(data)
+        elif path == '/api/grade_session':
+            self._handle_grade_session(data)
         elif path == '/api/reset_progress':
             self._handle_reset_progress(data)
         elif path == '/api/generate_adaptive_lesson':
@@ -138,10 +254,20 @@ class Handler(BaseHTTPRequestHandler):
             self._handle_download(data)
         elif path == '/api/apply':
             self._handle_apply_updates()
+        elif path == '/api/cache/enforce':
+            self._send_json(asset_cache.enforce())
+        elif path == '/api/network/sample':
+            self._handle_network_sample(data)
+        elif path.startswith('/api/courses/') and path.endswith('/install'):
+            self._handle_course_install(path.split('/')[3])
         elif path == '/api/add_course':
             self._handle_add_course(data)
         elif path == '/api/ai_tutor/chat':
             self._handle_ai_tutor_chat(data)
+        elif path == '/api/ai_tutor/chat/stream':
+            self._handle_ai_tutor_chat_stream(data)
+        elif path == '/api/ai_tutor/documents/delete':
+            self._handle_document_delete(data)
         elif path == '/api/scheduler/save':
             self._handle_scheduler_save(data)
         else:
@@ -151,46 +277,16 @@ class Handler(BaseHTTPRequestHandler):
     # --- GET Handlers ---
 
     def _get_lessons(self):
-        lessons_out = []
-        if os.path.exists(LESSONS_DIR):
-            for f in sorted(os.listdir(LESSONS_DIR)):
-                if not f.endswith('.json'): continue
-                try:
-                    with open(os.path.join(LESSONS_DIR, f), 'r', encoding='utf-8') as jf:
-                        lesson = json.load(jf)
-                    concepts_out = []
-                    for c in lesson.get('concepts', []):
-                        if isinstance(c, dict): concepts_out.append(c)
-                        else:
-                            cpath = os.path.join(CONCEPTS_DIR, f"{c}.json")
-                            if os.path.exists(cpath):
-                                with open(cpath, 'r', encoding='utf-8') as cf:
-                                    concepts_out.append(json.load(cf))
-                    lesson['lesson_id'] = lesson.get('lesson_id') or lesson.get('id') or f.replace('.json', '')
-                    lesson['concepts'] = concepts_out
-                    lessons_out.append(lesson)
-                except: continue
-        return lessons_out
+        try: return content_catalog.lessons()
+        except Exception as e:
+            print(f"⚠️ [Catalog] Lesson listing failed: {e}")
+            return []
 
     def _get_videos(self):
-        videos_out = []
-        if os.path.exists(VIDEOS_DIR):
-            for f in os.listdir(VIDEOS_DIR):
-                if not f.endswith('.json'): continue
-                try:
-                    with open(os.path.join(VIDEOS_DIR, f), 'r', encoding='utf-8') as jf:
-                        vdata = json.load(jf)
-                        meta = vdata.get('metadata') 
-                        if isinstance(meta, str): meta = json.loads(meta)
-                        videos_out.append({
-                            'title': vdata.get('title', 'Untitled Video'),
-                            'id': vdata.get('id'),
-                            'thumb': vdata.get('local_thumb', ''),
-                            'url': vdata.get('local_video', ''),
-                            'length': (meta or {}).get('length', '0:00')
-                        })
-                except: continue
-        return videos_out
+        try: return content_catalog.videos()
+        except Exception as e:
+            print(f"⚠️ [Catalog] Video listing failed: {e}")
+            return []
 
     def _get_installed(self):
         try:
@@ -202,6 +298,19 @@ class Handler(BaseHTTPRequestHandler):
             return [{'content_id': r[0], 'type': r[1], 'version': r[2]} for r in rows]
         except: return []
 
+    def _handle_ai_tutor_history(self, path, parsed):
+        user_id = path.split('/')[-1]
+        qs = urllib.parse.parse_qs(parsed.query)
+        try:
+            before = qs.get('before', [None])[0]
+            before_id = int(before) if before else None
+            limit = min(max(int(qs.get('limit', [HISTORY_PAGE_SIZE])[0]), 1), 500)
+        except ValueError:
+            self._send_json({'error': 'before and limit must be integers'}, 400)
+            return
+        history, next_before = ai_tutor_service.get_history(user_id, before_id, limit)
+        self._send_json({'history': history, 'next_before': next_before})
+
     def _handle_search_cloud(self, parsed):
         import requests
         query = urllib.parse.parse_qs(parsed.query).get('q', [''])[0].lower()
@@ -412,6 +521,8 @@ class Handler(BaseHTTPRequestHandler):
         item_type = 'lesson' if 'lesson_id' in data else 'concept'
         if item_id:
             adaptive_service.save_progress(user_id, item_id, status, item_type)
+            if item_type == 'lesson' and status == 'completed':
+                prefetcher.kick()
         self._send_json({'status': 'ok'})
 
     def _handle_log_event(self, data):
@@ -420,33 +531,127 @@ class Handler(BaseHTTPRequestHandler):
             self._send_json(result)
         except Exception as e: self._send_json({'error': str(e)}, 500)
 
+    def _resolve_concept(self, data):
+        # Installed concept files are authoritative; generated variants embed their concepts.
+        # None when there is nothing to grade against (unknown concept, no inline check).
+        concept_id = data.get('concept_id')
+        if concept_id:
+            cpath = os.path.join(CONCEPTS_DIR, f"{concept_id}.json")
+            if os.path.exists(cpath):
+                try:
+                    return content_store.load_json(cpath)
+                except Exception: pass
+        if not data.get('keywords') and not data.get('desired_answer'):
+            return None
+        return {
+            'id': concept_id,
+            'version': data.get('version'),
+            'check': {
+                'keywords': data.get('keywords') or [],
+                'synonyms': data.get('synonyms'),
+                'desired_answer': data.get('desired_answer'),
+            }
+        }
+
+    def _handle_check_answer(self, data):
+        concept = self._resolve_concept(data)
+        if concept is None:
+            self._send_json({'error': 'unknown concept'}, 404)
+            return
+        self._send_json(grading.grade_answer(concept, data.get('answer', ''), grading.similarity_index_for(CONCEPTS_DIR)))
+
+    def _handle_grade_session(self, data):
+        uid, answers = data.get('user_id'), data.get('answers')
+        if not uid or not isinstance(answers, list):
+            self._send_json({'error': 'user_id and answers are required'}, 400)
+            return
+        if len(answers) > MAX_SESSION_ANSWERS:
+            self._send_json({'error': f'At most {MAX_SESSION_ANSWERS} answers per session'}, 413)
+            return
+
+        index = grading.similarity_index_for(CONCEPTS_DIR)
+        results, graded = [], []
+        for i, item in enumerate(answers):
+            if not isinstance(item, dict) or not item.get('concept_id'):
+                results.append({'index': i, 'error': 'concept_id is required'})
+                continue
+            if 'answer' in item:
+                concept = self._resolve_concept(item)
+                if concept is None:
+                    results.append({'index': i, 'concept_id': item['concept_id'], 'error': 'unknown concept'})
+                    continue
+                result = grading.grade_answer(concept, item.get('answer') or '', index)
+            else:
+                # Already graded on the device (e.g. while offline)
+                result = {'correct': bool(item.get('correct'))}
+            results.append({'index': i, 'concept_id': item['concept_id'], **result})
+            graded.append({
+                'concept_id': item['concept_id'],
+                'lesson_id': item.get('lesson_id', data.get('lesson_id')),
+                'correct': result['correct'],
+                'attempt': item.get('attempt', 1),
+            })
+
+        try:
+            updates, mastery = adaptive_service.log_session(uid, graded)
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+            return
+        applied = iter(updates)
+        for r in results:
+            if 'error' not in r:
+                r.update(next(applied))
+        self._send_json({'status': 'ok', 'results': results, 'mastery': mastery})
+
     def _handle_reset_progress(self, data):
         uid = data.get('user_id')
         if adaptive_service.reset_mastery(uid): self._send_json({'status': 'ok'})
         else: self._send_json({'error': 'Reset failed'}, 500)
 
     def _handle_ai_generate(self, data):
-        lesson_id = data.get('lesson_id')
-        mode = data.get('mode')
-        lesson_path = os.path.join(LESSONS_DIR, f"{lesson_id}.json")
-        if not os.path.exists(lesson_path):
+        lesson_id, mode = data.get('lesson_id'), data.get('mode')
+        try:
+            root_id, mode, cached_id = lesson_variants.find_cached(lesson_id, mode, ai_gen.MODEL)
+        except LookupError:
             self._send_json({'error': 'Not found'}, 404)
             return
-        with open(lesson_path, 'r', encoding='utf-8') as f:
-            original = json.load(f)
-        new_lesson = ai_service.generate_adaptive_lesson(original, mode)
-        if new_lesson:
-            new_id = f"{lesson_id}_{mode.lower()}"
-            new_lesson['lesson_id'] = new_id
-            with open(os.path.join(LESSONS_DIR, f"{new_id}.json"), 'w', encoding='utf-8') as f:
-                json.dump(new_lesson, f, indent=2)
-            self._send_json({'status': 'ok', 'lesson_id': new_id})
-        else: self._send_json({'error': 'AI failed'}, 500)
+        except ValueError as e:
+            self._send_json({'error': str(e)}, 400)
+            return
+        if cached_id:
+            self._send_json({'status': 'ok', 'lesson_id': cached_id, 'cached': True})
+            return
+
+        # The LLM round trip runs on the job pool; clients poll /api/jobs/<id>
+        job, created = generation_jobs.submit(
+            'generate_adaptive_lesson', (root_id, mode),
+            lesson_variants.get_or_generate, root_id, mode, ai_service.generate_adaptive_lesson, ai_gen.MODEL
+        )
+        self._send_json({'status': 'queued', 'job_id': job['id'], 'coalesced': not created, 'job': job}, 202)
+
+    def _handle_job_status(self, path, parsed):
+        job_id = path.split('/')[-1]
+        qs = urllib.parse.parse_qs(parsed.query)
+        try:
+            wait = float(qs.get('wait', ['0'])[0])
+        except ValueError:
+            wait = 0
+        job = generation_jobs.wait(job_id, wait) if wait > 0 else generation_jobs.get(job_id)
+        if job: self._send_json({'job': job})
+        else: self._send_json({'error': 'Not found'}, 404)
 
     def _handle_download(self, data):
-        threading.Thread(target=download_specific_item, args=(data.get('id'), data.get('type'))).start()
+        def download():
+            download_specific_item(data.get('id'), data.get('type'))
+            asset_cache.enforce()
+        threading.Thread(target=download).start()
         self._send_json({'status': 'queued'})
 
+    def _handle_course_install(self, course_id):
+        # The whole course runs as one install; clients poll GET /api/courses/<id>/install
+        progress = course_installer.start(course_id, on_done=asset_cache.enforce)
+        self._send_json({'status': 'queued', 'progress': progress}, 202)
+
     def _handle_apply_updates(self):
         try:
             run_update()
@@ -459,16 +664,107 @@ class Handler(BaseHTTPRequestHandler):
             prompt = data.get('prompt')
             lesson_context = data.get('lesson_context')
             file_text = data.get('file_text')
+            document_id = data.get('document_id')
             
             if not user_id or not prompt:
                 self._send_json({'error': 'Missing user_id or prompt'}, 400)
                 return
 
-            reply = ai_tutor_service.chat(user_id, prompt, lesson_context, file_text)
+            reply = ai_tutor_service.chat(user_id, prompt, lesson_context, file_text, document_id)
             self._send_json({'status': 'ok', 'reply': reply})
         except Exception as e:
             self._send_json({'error': str(e)}, 500)
 
+    def _handle_ai_tutor_chat_stream(self, data):
+        user_id = data.get('user_id')
+        prompt = data.get('prompt')
+        if not user_id or not prompt:
+            self._send_json({'error': 'Missing user_id or prompt'}, 400)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        stream = ai_tutor_service.chat_stream(
+            user_id, prompt, data.get('lesson_context'), data.get('file_text'), data.get('document_id')
+        )
+        reply = []
+        try:
+            for delta in stream:
+                reply.append(delta)
+                self.wfile.write(f"data: {json.dumps({'delta': delta})}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(f"event: done\ndata: {json.dumps({'reply': ''.join(reply).strip()})}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            pass # Client went away; closing the generator cancels the upstream request
+        finally:
+            stream.close()
+
+    def _handle_document_upload(self, parsed):
+        qs = urllib.parse.parse_qs(parsed.query)
+        user_id = qs.get('user_id', [''])[0]
+        name = qs.get('name', ['document.txt'])[0]
+        length = int(self.headers.get('content-length', 0))
+        if not user_id or length <= 0:
+            self._send_json({'error': 'Missing user_id or empty body'}, 400)
+            return
+        try:
+            doc = document_store.save_stream(user_id, name, self.rfile, length)
+            self._send_json({'status': 'ok', 'document': doc})
+        except DocumentTooLarge as e:
+            self._send_json({'error': str(e)}, 413)
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+
+    def _handle_pack_export(self, parsed):
+        qs = urllib.parse.parse_qs(parsed.query)
+        course_id = qs.get('course_id', [''])[0]
+        lesson_ids = [l for l in qs.get('lessons', [''])[0].split(',') if l]
+        try:
+            if course_id:
+                lesson_ids += [l for l in fetch_course_lessons(course_id) if l not in lesson_ids]
+            if not lesson_ids:
+                self._send_json({'error': 'Pass course_id or lessons'}, 400)
+                return
+            plan = content_packs.plan_export(lesson_ids, {'id': course_id} if course_id else None)
+        except LookupError as e:
+            self._send_json({'error': str(e)}, 409)
+            return
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-tar')
+        self.send_header('Content-Disposition', f'attachment; filename="{course_id or "lessons"}.pack.tar"')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        try:
+            content_packs.write_pack(plan, self.wfile)
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            pass
+
+    def _handle_pack_import(self):
+        length = int(self.headers.get('content-length', 0))
+        if length <= 0:
+            self._send_json({'error': 'Empty body'}, 400)
+            return
+        try:
+            self._send_json({'status': 'ok', **content_packs.import_pack(self.rfile, length)})
+        except PackError as e:
+            self._send_json({'error': str(e)}, 400)
+        except Exception as e:
+            self._send_json({'error': str(e)}, 500)
+
+    def _handle_document_delete(self, data):
+        if document_store.delete(str(data.get('user_id')), data.get('document_id')):
+            self._send_json({'status': 'ok'})
+        else:
+            self._send_json({'error': 'Not found'}, 404)
+
     def _handle_scheduler_save(self, data):
         import requests, uuid
         try:
@@ -574,6 +870,8 @@ class Handler(BaseHTTPRequestHandler):
         for base in [UI_DIR, PUNE_CONTENT_DIR]:
             full_path = os.path.join(base, clean_path)
             if os.path.exists(full_path) and os.path.isfile(full_path):
+                if base == PUNE_CONTENT_DIR:
+                    asset_cache.touch(clean_path)
                 with open(full_path, 'rb') as f: content = f.read()
                 self.send_response(200)
                 ext = os.path.splitext(full_path)[1].lower()
@@ -586,9 +884,37 @@ class Handler(BaseHTTPRequestHandler):
                 except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
                     pass
                 return
+        if clean_path.startswith('assets/') and asset_cache.is_evicted(clean_path):
+            # Evicted to save space: fetch it back and let the player retry
+            threading.Thread(target=asset_cache.restore, args=(clean_path,), daemon=True).start()
+            self.send_response(503)
+            self.send_header('Retry-After', '10')
+            self.end_headers()
+            return
+        if clean_path.startswith('assets/') and sync_policy.deferred_url(os.path.join(PUNE_CONTENT_DIR, clean_path)):
+            # Left for later by background sync, but a learner wants it now
+            threading.Thread(target=download_deferred, args=(os.path.join(PUNE_CONTENT_DIR, clean_path),), daemon=True).start()
+            self.send_response(503)
+            self.send_header('Retry-After', '10')
+            self.end_headers()
+            return
         self.send_response(404)
         self.end_headers()
 
+    def _handle_network_sample(self, data):
+        """Feed a client-side speed test into the link estimate (and the metered flag, if given)."""
+        try:
+            if data.get('bytes') and data.get('seconds'):
+                network_link.record_transfer(int(data['bytes']), float(data['seconds']))
+            if data.get('latency_ms') is not None:
+                network_link.record_latency(float(data['latency_ms']) / 1000)
+        except (TypeError, ValueError):
+            self._send_json({'error': 'Invalid sample'}, 400)
+            return
+        if 'metered' in data:
+            sync_policy.metered = bool(data['metered'])
+        self._send_json(sync_policy.status())
+
     def _serve_speedtest(self):
         data = os.urandom(1024 * 1024)
         self.send_response(200)
@@ -603,12 +929,23 @@ class Handler(BaseHTTPRequestHandler):
 def background_sync():
     try: run_update()
     except: pass
+    try: asset_cache.enforce()
+    except Exception as e: print(f"⚠️ [AssetCache] {e}")
+    prefetcher.kick()
 
 def run_server(port=8000):
     os.makedirs(UI_DIR, exist_ok=True)
-    server = HTTPServer(('0.0.0.0', port), Handler)
+    # Threaded so a long-lived SSE stream doesn't block other requests
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
     print(f"🚀 BrightStudy Engine running on http://localhost:{port}")
+    if MIRROR_MODE:
+        print(f"🛰️ LAN mirror enabled: point other engines at CONTENT_MIRROR_URL=http://<this-device>:{port}")
+    content_catalog.refresh(force=True)
     threading.Thread(target=background_sync, daemon=True).start()
+    ai_tutor_service.start_archiver()
+    prefetcher.start()
+    if ai_gen.OPENROUTER_API_KEY:
+        pregenerator.start()
     try: server.serve_forever()
     except KeyboardInterrupt: server.server_close()
 
@@ -0,0 +1,82 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import adaptive  # noqa: E402
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    svc = adaptive.AdaptiveService.__new__(adaptive.AdaptiveService)
+    svc.url = "http://cloud.invalid"
+    svc.headers = {}
+    svc.local_db = str(tmp_path / "mastery.db")
+    svc._init_local_db()
+
+    def offline(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("offline")
+
+    monkeypatch.setattr(adaptive.requests, "get", offline)
+    monkeypatch.setattr(adaptive.requests, "post", offline)
+    return svc
+
+
+def test_log_session_applies_updates_in_order(service):
+    service._save_local("u1", "c1", 0.5)
+    answers = [
+        {"concept_id": "c1", "correct": True},
+        {"concept_id": "c2", "correct": False},
+        {"concept_id": "c1", "correct": False},
+    ]
+    results, final = service.log_session("u1", answers)
+
+    step1 = adaptive.BKTModel.simple_update(0.5, True)
+    step2 = adaptive.BKTModel.simple_update(step1, False)
+    assert [r["mastery_before"] for r in results] == [0.5, 0.1, step1]
+    assert results[2]["mastery_after"] == step2
+    assert final == {"c1": step2, "c2": adaptive.BKTModel.simple_update(0.1, False)}
+    assert service._get_local("u1", "c1") == step2
+
+
+def test_log_session_matches_sequential_logging(service):
+    answers = [{"concept_id": "c1", "correct": c} for c in (True, True, False, True)]
+    _, final = service.log_session("batch", answers)
+    for a in answers:
+        service.log_interaction({"event_type": "answer", "user_id": "single", **a})
+    assert final["c1"] == pytest.approx(service._get_local("single", "c1"))
+
+
+def test_failed_write_leaves_mastery_untouched(service, monkeypatch):
+    service._save_local("u1", "c1", 0.5)
+    real_connect = sqlite3.connect
+
+    class FailingConn:
+        def __init__(self, conn):
+            self._conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self._conn, name)
+
+        def __enter__(self):
+            return self._conn.__enter__()
+
+        def __exit__(self, *exc):
+            return self._conn.__exit__(*exc)
+
+        def executemany(self, sql, rows):
+            rows = list(rows)
+            self._conn.execute(sql, rows[0])
+            raise sqlite3.OperationalError("disk full")
+
+    monkeypatch.setattr(adaptive.sqlite3, "connect", lambda path: FailingConn(real_connect(path)))
+    with pytest.raises(sqlite3.OperationalError):
+        service.log_session("u1", [{"concept_id": "c1", "correct": True}, {"concept_id": "c2", "correct": True}])
+    monkeypatch.setattr(adaptive.sqlite3, "connect", real_connect)
+    assert service._get_local("u1", "c1") == 0.5
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import ai_cache  # noqa: E402
+
+
+def test_cache_key_ignores_case_punctuation_and_spacing():
+    a = ai_cache.make_cache_key("m", "What is gravity?", "ctx")
+    b = ai_cache.make_cache_key("m", "  what IS gravity ", "ctx")
+    assert a == b
+    assert a != ai_cache.make_cache_key("m", "What is gravity?", "other ctx")
+    assert a != ai_cache.make_cache_key("m2", "What is gravity?", "ctx")
+    history = [{"role": "user", "content": "What is a fraction?"}, {"role": "assistant", "content": "A part."}]
+    assert a != ai_cache.make_cache_key("m", "What is gravity?", "ctx", history=history)
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = ai_cache.AIResponseCache(str(tmp_path / "c.db"), ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(ai_cache.time, "time", lambda: now[0])
+
+    cache.put("k", "m", "reply")
+    assert cache.get("k") == "reply"
+    now[0] += 11
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_lru_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    cache = ai_cache.AIResponseCache(str(tmp_path / "c.db"), max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr(ai_cache.time, "time", lambda: now[0])
+
+    cache.put("a", "m", "A")
+    now[0] += 1
+    cache.put("b", "m", "B")
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.put("c", "m", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,136 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import ai_gen  # noqa: E402
+
+LESSON = {
+    "title": "Gravity Intro",
+    "intro": "Learn gravity basics",
+    "outro": "Done",
+    "concepts": [
+        {"id": "c1", "name": "Gravity", "explain": "Gravity attracts masses.", "example": "Ball falls",
+         "check": {"question": "What does gravity do?", "desired_answer": "Pulls", "keywords": ["pulls"]}},
+        {"id": "c2", "name": "Mass", "explain": "Mass is matter.", "example": "A rock",
+         "check": {"question": "What is mass?", "desired_answer": "Matter", "keywords": ["matter"]}},
+    ],
+}
+
+
+def _concept(name):
+    return {"name": name, "explain": f"{name} simply", "example": "e",
+            "check": {"question": "q?", "desired_answer": "a", "keywords": ["Key"]}}
+
+
+def test_fan_out_merges_concepts_and_retries_only_failures(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake_call(feature, prompt):
+        with lock:
+            calls.append((feature, prompt))
+        if feature == "lesson_outline":
+            return json.dumps({"title": "Gravity Intro (Advance)", "intro": "i", "outro": "o",
+                               "new_concepts": ["Orbital Mechanics"]})
+        if '"id":"c2"' in prompt and sum('"id":"c2"' in p for _, p in calls) == 1:
+            return '{"name": "Mass", "explain": '  # truncated on the first try
+        name = "Orbital Mechanics" if "Orbital" in prompt else ("Mass" if '"id":"c2"' in prompt else "Gravity")
+        return "```json\n" + json.dumps(_concept(name)) + "\n```"
+
+    monkeypatch.setattr(ai_gen, "_call", fake_call)
+    lesson = ai_gen.AIGenService.generate_adaptive_lesson(LESSON, "Advance")
+
+    assert lesson["title"] == "Gravity Intro (Advance)"
+    assert [c["id"] for c in lesson["concepts"]] == ["c1_advance", "c2_advance", "orbital_mechanics_advance"]
+    assert lesson["concepts"][0]["check"]["keywords"] == ["key"]
+    concept_prompts = [p for f, p in calls if f == "concept_generation"]
+    assert sum('"id":"c1"' in p for p in concept_prompts) == 1
+    assert sum('"id":"c2"' in p for p in concept_prompts) == 2
+    # Prompts are compact, not pretty-printed
+    assert all("\n  " not in p.split("CONCEPT: ")[1] for p in concept_prompts)
+
+
+def test_failed_concept_keeps_original_and_total_failure_returns_none(monkeypatch):
+    def fake_call(feature, prompt):
+        if feature == "lesson_outline":
+            raise ValueError("bad outline")
+        if '"id":"c1"' in prompt:
+            return json.dumps(_concept("Gravity"))
+        return "not json"
+
+    monkeypatch.setattr(ai_gen, "_call", fake_call)
+    lesson = ai_gen.AIGenService.generate_adaptive_lesson(LESSON, "Beginner")
+    assert lesson["title"] == "Gravity Intro (Beginner)"
+    assert lesson["concepts"][1] == LESSON["concepts"][1]
+
+    monkeypatch.setattr(ai_gen, "_call", lambda feature, prompt: "nope")
+    assert ai_gen.AIGenService.generate_adaptive_lesson(LESSON, "Beginner") is None
+
+
+def test_validate_concept_reports_missing_fields():
+    assert ai_gen.validate_concept(_concept("x")) == []
+    problems = ai_gen.validate_concept({"name": "x", "check": {"keywords": []}})
+    assert "missing explain" in problems
+    assert "missing check.question" in problems
+    assert "check.keywords must be a non-empty list of strings" in problems
+
+
+class _FakeStream:
+    def __init__(self, lines):
+        self._lines = lines
+        self.consumed = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self._lines:
+            self.consumed += 1
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+def _sse(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]})
+
+
+def test_call_streams_and_stops_after_the_json_value(monkeypatch):
+    stream = _FakeStream([_sse('Here: {"title": '), _sse('"T",}'), _sse(" Let me know"), _sse(" if...")])
+    sent = {}
+
+    def fake_post(url, **kwargs):
+        sent.update(kwargs)
+        return stream
+
+    monkeypatch.setattr(ai_gen.requests, "post", fake_post)
+    monkeypatch.setattr(ai_gen, "router", ai_gen.ModelRouter(["m1"]))
+    content = ai_gen._call("lesson_outline", "prompt")
+
+    assert sent["json"]["stream"] is True
+    assert stream.consumed == 2 and stream.closed
+    assert ai_gen._parse("lesson_outline", content) == {"title": "T"}
+
+
+def test_rejected_concept_is_re_requested_with_the_problem(monkeypatch):
+    prompts = []
+
+    def fake_call(feature, prompt):
+        prompts.append(prompt)
+        if len(prompts) == 1:
+            return '{"name": "Gravity", "explain": "Gravity pulls", "example": "Apple falls", "check": {"quest'
+        return json.dumps(_concept("Gravity"))
+
+    monkeypatch.setattr(ai_gen, "_call", fake_call)
+    concept = ai_gen.AIGenService._generate_concept_with_retry(LESSON["concepts"][0], "Beginner", "Gravity Intro")
+
+    assert concept["name"] == "Gravity"
+    assert len(prompts) == 2
+    assert "rejected (missing check.question" in prompts[1]
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import ai_metrics  # noqa: E402
+
+
+def test_snapshot_groups_by_model_and_feature():
+    m = ai_metrics.AIMetrics()
+    m.record("tutor_chat", "a", 0.3, "ok", 100, 20)
+    m.record("tutor_chat", "a", 3.0, "ok", 300, 40)
+    m.record("tutor_chat", "a", 0.0, cache="hit")
+    m.record("lesson_generation", "b", 70.0, "timeout", 900)
+
+    snap = m.snapshot()
+    a = snap["by_model"]["a"]
+    assert a["calls"] == 3
+    assert a["cache_hits"] == 1
+    assert a["prompt_tokens"] == 400
+    assert a["avg_prompt_tokens"] == 200
+    assert a["latency_p95"] == 3.0
+    assert a["latency_histogram"][1] == 1  # 0.3s -> <= 0.5 bucket
+    assert a["latency_histogram"][4] == 1  # 3.0s -> <= 4 bucket
+    assert snap["by_model"]["b"]["latency_histogram"][-1] == 1
+    assert snap["by_feature"]["lesson_generation"]["errors"] == 1
+    assert snap["totals"]["calls"] == 4
+    assert snap["totals"]["completion_tokens"] == 60
+
+
+def test_old_events_leave_the_rolling_window(monkeypatch):
+    m = ai_metrics.AIMetrics(window=60)
+    now = [1000.0]
+    monkeypatch.setattr(ai_metrics.time, "time", lambda: now[0])
+    m.record("tutor_chat", "a", 1.0)
+    now[0] += 61
+    m.record("tutor_chat", "a", 2.0)
+
+    snap = m.snapshot()
+    assert snap["by_model"]["a"]["calls"] == 1
+    assert snap["totals"]["calls"] == 2
+
+
+def test_outcome_labels():
+    response = requests.Response()
+    response.status_code = 429
+    assert ai_metrics.outcome_for(requests.HTTPError(response=response)) == "http_429"
+    assert ai_metrics.outcome_for(requests.exceptions.ReadTimeout()) == "timeout"
+    assert ai_metrics.outcome_for(ValueError("bad json")) == "error"
@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import ai_tutor  # noqa: E402
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ai_tutor.AITutorService(str(tmp_path / "tutor.db"))
+
+
+def _fill(service, user_id, count):
+    for i in range(count):
+        service._save_message(user_id, "user" if i % 2 == 0 else "assistant", f"msg {i}")
+
+
+def test_recent_history_returns_last_turns_in_order(service):
+    _fill(service, "u1", 30)
+    _fill(service, "u2", 5)
+
+    recent = service.get_recent_history("u1", 4)
+
+    assert [m["content"] for m in recent] == ["msg 26", "msg 27", "msg 28", "msg 29"]
+
+
+def test_get_history_pages_backwards_with_cursor(service):
+    _fill(service, "u1", 7)
+
+    page, cursor = service.get_history("u1", limit=3)
+    assert [m["content"] for m in page] == ["msg 4", "msg 5", "msg 6"]
+
+    page, cursor = service.get_history("u1", before_id=cursor, limit=3)
+    assert [m["content"] for m in page] == ["msg 1", "msg 2", "msg 3"]
+
+    page, cursor = service.get_history("u1", before_id=cursor, limit=3)
+    assert [m["content"] for m in page] == ["msg 0"]
+    assert cursor is None
+
+
+def test_archive_old_turns_keeps_hot_window(service):
+    _fill(service, "u1", 10)
+    _fill(service, "u2", 2)
+
+    assert service.archive_old_turns(keep_last=4) == 6
+
+    page, cursor = service.get_history("u1", limit=50)
+    assert [m["content"] for m in page] == ["msg 6", "msg 7", "msg 8", "msg 9"]
+    assert cursor is None
+    assert len(service.get_recent_history("u2")) == 2
+
+    conn = sqlite3.connect(service.db_path)
+    row = conn.execute("SELECT user_id, turns FROM ai_tutor_history_archive").fetchone()
+    conn.close()
+    assert row[0] == "u1"
+    assert [t["content"] for t in json.loads(row[1])] == [f"msg {i}" for i in range(6)]
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, reply):
+        self._reply = reply
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._reply}}]}
+
+
+def test_chat_serves_repeat_question_from_cache(service, monkeypatch):
+    calls = []
+
+    def fake_post(url, headers=None, json=None, **kwargs):
+        calls.append(json)
+        return _FakeResponse("Gravity pulls things down.")
+
+    monkeypatch.setattr(ai_tutor, "OPENROUTER_API_KEY", "sk-or-v1-test")
+    monkeypatch.setattr(ai_tutor.requests, "post", fake_post)
+
+    first = service.chat("u1", "What is gravity?", lesson_context="gravity lesson")
+    second = service.chat("u2", "  what is GRAVITY ", lesson_context="gravity lesson")
+    service.chat("u2", "What is gravity?", lesson_context="another lesson")
+
+    assert first == second == "Gravity pulls things down."
+    assert len(calls) == 2
+    stats = service.cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+
+
+def test_follow_up_with_different_history_is_not_served_from_cache(service, monkeypatch):
+    replies = iter(["Fractions split a whole.", "More on fractions.", "Gravity pulls.", "More on gravity."])
+    calls = []
+
+    def fake_post(url, headers=None, json=None, **kwargs):
+        calls.append(json)
+        return _FakeResponse(next(replies))
+
+    monkeypatch.setattr(ai_tutor, "OPENROUTER_API_KEY", "sk-or-v1-test")
+    monkeypatch.setattr(ai_tutor.requests, "post", fake_post)
+
+    service.chat("u1", "What is a fraction?")
+    assert service.chat("u1", "Can you explain more?") == "More on fractions."
+    service.chat("u2", "What is gravity?")
+    assert service.chat("u2", "Can you explain more?") == "More on gravity."
+    assert len(calls) == 4
+    assert service.cache.stats()["hits"] == 0
+
+
+class _FakeStream:
+    status_code = 200
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self._lines
+
+    def close(self):
+        self.closed = True
+
+
+def _sse(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]})
+
+
+def test_chat_stream_relays_deltas_and_saves_reply(service, monkeypatch):
+    stream = _FakeStream([": keep-alive", _sse("Gravity "), "", _sse("pulls."), "data: [DONE]"])
+    monkeypatch.setattr(ai_tutor, "OPENROUTER_API_KEY", "sk-or-v1-test")
+    monkeypatch.setattr(ai_tutor.requests, "post", lambda *a, **kw: stream)
+
+    deltas = list(service.chat_stream("u1", "What is gravity?"))
+
+    assert deltas == ["Gravity ", "pulls."]
+    assert stream.closed
+    assert service.get_recent_history("u1")[-1] == {"role": "assistant", "content": "Gravity pulls."}
+    assert service.chat_stream("u2", "what is gravity").__next__() == "Gravity pulls."
+
+
+def test_closing_chat_stream_stops_upstream_and_keeps_partial(service, monkeypatch):
+    stream = _FakeStream([_sse("Part one. "), _sse("Part two.")])
+    monkeypatch.setattr(ai_tutor, "OPENROUTER_API_KEY", "sk-or-v1-test")
+    monkeypatch.setattr(ai_tutor.requests, "post", lambda *a, **kw: stream)
+
+    gen = service.chat_stream("u1", "Explain")
+    assert next(gen) == "Part one. "
+    gen.close()
+
+    assert stream.closed
+    assert service.get_recent_history("u1")[-1]["content"] == "Part one."
+    assert service.cache.stats()["entries"] == 0
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from asset_cache import AssetCache  # noqa: E402
+from catalog import ContentCatalog  # noqa: E402
+
+OLD = time.time() - 7200
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def _asset(path, size, mtime=OLD):
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def _concept(cid, video_id):
+    return {"id": cid, "explain": "e", "videos": [{"id": video_id, "url": f"http://cdn/{video_id}.mp4"}]}
+
+
+@pytest.fixture
+def content(tmp_path):
+    root = tmp_path / "pune_content"
+    lessons, concepts = root / "lessons", root / "concepts"
+    videos, thumbs = root / "assets" / "videos", root / "assets" / "thumbnails"
+    for d in (lessons, concepts, videos, thumbs):
+        d.mkdir(parents=True)
+    _write(concepts / "c_done.json", _concept("c_done", "v_done"))
+    _write(concepts / "c_new.json", _concept("c_new", "v_new"))
+    _write(lessons / "done.json", {"lesson_id": "done", "title": "Done", "concepts": ["c_done"]})
+    _write(lessons / "new.json", {"lesson_id": "new", "title": "New", "concepts": ["c_new"]})
+    _write(videos / "v_solo.json", {"id": "v_solo", "url": "http://cdn/v_solo.mp4",
+                                     "local_video": "assets/videos/v_solo.mp4", "local_thumb": "assets/thumbnails/v_solo.jpg"})
+    for name in ("v_done", "v_new", "v_solo"):
+        _asset(videos / f"{name}.mp4", 1000)
+    _asset(thumbs / "v_solo.jpg", 10)
+
+    progress = tmp_path / "progress.db"
+    conn = sqlite3.connect(progress)
+    conn.execute("CREATE TABLE user_progress (user_id TEXT, item_id TEXT, item_type TEXT, status TEXT, last_updated TEXT)")
+    conn.execute("INSERT INTO user_progress VALUES ('u1', 'done', 'lesson', 'completed', '')")
+    conn.commit()
+    conn.close()
+
+    db = str(tmp_path / "meta.db")
+    catalog = ContentCatalog(db, str(lessons), str(concepts), str(videos))
+    downloads = []
+
+    def download(url, dest):
+        downloads.append(url)
+        Path(dest).write_bytes(b"\0" * 1000)
+        return True
+
+    cache = AssetCache(db, str(root), catalog, str(progress), budget_bytes=10_000, download=download)
+    return cache, root, downloads
+
+
+def test_catalog_counts_asset_references_and_lessons(content):
+    cache, _, _ = content
+    refs = cache.catalog.asset_references()
+    assert refs["assets/videos/v_done.mp4"] == {"refs": 1, "url": "http://cdn/v_done.mp4", "lessons": {"done"}}
+    assert refs["assets/thumbnails/v_solo.jpg"]["lessons"] == set()
+
+
+def test_orphans_skip_referenced_and_recent_files(content):
+    cache, root, _ = content
+    videos = root / "assets" / "videos"
+    _asset(videos / "gone.mp4", 500)
+    _asset(videos / "fresh.mp4", 500, mtime=time.time())
+    _asset(videos / "v_new.mp4.tmp", 500)
+
+    report = cache.collect_orphans()
+
+    assert report["assets"] == ["assets/videos/gone.mp4", "assets/videos/v_new.mp4.tmp"]
+    assert report["freed_bytes"] == 1000
+    assert (videos / "fresh.mp4").exists() and (videos / "v_done.mp4").exists()
+
+
+def test_orphan_variants_are_removed_with_their_root(content):
+    cache, root, _ = content
+    _write(root / "lessons" / "gone__beginner.json", {"lesson_id": "gone__beginner", "title": "V", "concepts": ["c_new"]})
+    conn = sqlite3.connect(cache.db_path)
+    conn.execute("CREATE TABLE lesson_variants (root_lesson_id TEXT, mode TEXT, model TEXT, source_hash TEXT, lesson_id TEXT)")
+    conn.execute("INSERT INTO lesson_variants VALUES ('gone', 'beginner', 'm', 'h', 'gone__beginner')")
+    conn.execute("INSERT INTO lesson_variants VALUES ('new', 'beginner', 'm', 'h', 'new__beginner')")
+    conn.commit()
+    conn.close()
+
+    assert cache.collect_orphans()["variants"] == ["gone__beginner"]
+    assert not (root / "lessons" / "gone__beginner.json").exists()
+    assert [l["lesson_id"] for l in cache.catalog.lesson_index()] == ["done", "new"]
+
+
+def test_eviction_prefers_completed_lessons_then_lru(content):
+    cache, _, _ = content
+    cache.touch("assets/videos/v_done.mp4", now=time.time())
+    cache.touch("assets/videos/v_new.mp4", now=OLD + 10)
+
+    assert [a for a, _ in cache.eviction_order()] == [
+        "assets/videos/v_done.mp4", "assets/videos/v_solo.mp4", "assets/videos/v_new.mp4"]
+    assert cache.evict(target_bytes=1500) == ["assets/videos/v_done.mp4", "assets/videos/v_solo.mp4"]
+    assert cache.usage() == 1010
+
+
+def test_enforce_respects_budget_and_evicted_videos_can_be_restored(content):
+    cache, root, downloads = content
+    cache.budget_bytes = 2500
+    report = cache.enforce()
+    assert report["evicted"] == ["assets/videos/v_done.mp4"]
+    # Metadata stays, so the catalog still knows where to get it back from
+    assert cache.catalog.concept("c_done")["videos"][0]["id"] == "v_done"
+    assert cache.is_evicted("assets/videos/v_done.mp4")
+    assert cache.stats()["evicted"] == 1
+
+    assert cache.restore("assets/videos/v_done.mp4")
+    assert downloads == ["http://cdn/v_done.mp4"]
+    assert (root / "assets" / "videos" / "v_done.mp4").exists()
+    assert not cache.is_evicted("assets/videos/v_done.mp4")
@@ -0,0 +1,177 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import bandwidth  # noqa: E402
+import updater  # noqa: E402
+from bandwidth import LinkEstimator, SyncPolicy  # noqa: E402
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def policy(tmp_path):
+    return SyncPolicy(LinkEstimator(), str(tmp_path / "metadata.db"), metered=False)
+
+
+def test_estimator_blends_samples_and_ignores_tiny_transfers():
+    link = LinkEstimator(alpha=0.5)
+    assert link.link_class() == "unknown"
+    link.record_transfer(1 * MB, 1.0)
+    assert link.throughput_bps == MB
+    link.record_transfer(3 * MB, 1.0)
+    assert link.throughput_bps == 2 * MB
+    link.record_transfer(1024, 0.0001)
+    assert link.throughput_bps == 2 * MB and link.samples == 2
+    link.record_latency(0.2)
+    assert link.snapshot()["latency_ms"] == 200.0
+    assert link.link_class() == "fast"
+
+
+def test_defer_only_applies_to_large_background_downloads(policy):
+    policy.link.record_transfer(100 * 1024, 1.0)  # ~100 KB/s
+    big = 200 * MB
+    assert not policy.should_defer(big)  # foreground: learner asked for it
+    with policy.background():
+        assert policy.in_background()
+        assert not policy.should_defer(1 * MB)
+        assert not policy.should_defer(0)
+        assert policy.should_defer(big)
+    assert not policy.in_background()
+
+
+def test_defer_depends_on_link_and_metering(policy):
+    with policy.background():
+        # No estimate yet: the first transfer provides one
+        assert not policy.should_defer(200 * MB)
+        policy.link.record_transfer(10 * MB, 1.0)
+        assert not policy.should_defer(200 * MB)
+        policy.metered = True
+        assert policy.should_defer(200 * MB)
+        assert not policy.should_defer(1 * MB)
+
+
+def test_rate_limit_only_while_learner_is_active(policy):
+    policy.link.record_transfer(4 * MB, 1.0)
+    with policy.background():
+        assert policy.rate_limit() is None
+        policy.touch()
+        assert policy.rate_limit() == 2 * MB
+    assert policy.rate_limit() is None
+
+
+def test_throttle_sleeps_to_stay_under_cap(policy):
+    assert policy.throttle(10 * MB, time.monotonic(), None) == 0.0
+    started = time.monotonic()
+    slept = policy.throttle(100 * 1024, started, 1 * MB)
+    assert 0.05 < slept <= 0.1
+    assert time.monotonic() - started >= 0.09
+
+
+def test_deferred_queue_is_smallest_first(policy):
+    policy.defer("http://x/big.mp4", "/c/big.mp4", 90 * MB)
+    policy.defer("http://x/mid.mp4", "/c/mid.mp4", 20 * MB)
+    assert [p[0] for p in policy.pending()] == ["/c/mid.mp4", "/c/big.mp4"]
+    assert policy.deferred_url("/c/big.mp4") == "http://x/big.mp4"
+    assert policy.status()["deferred_bytes"] == 110 * MB
+    policy.done("/c/mid.mp4")
+    assert policy.deferred_url("/c/mid.mp4") is None
+    assert len(policy.pending()) == 1
+
+
+def test_reads_and_done_leave_the_database_alone(tmp_path):
+    db = tmp_path / "metadata.db"
+    policy = SyncPolicy(LinkEstimator(), str(db))
+    assert policy.pending() == [] and policy.deferred_url("/c/v.mp4") is None
+    policy.done("/c/v.mp4")
+    assert not db.exists()
+
+
+def test_deferred_video_keeps_concept_unrecorded(tmp_path, monkeypatch):
+    class _Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [{"version": 2, "json_data": {
+                "explain": "e", "check": {"question": "q?", "keywords": ["k"]},
+                "videos": [{"id": "v1", "url": "http://cloud/v1.mp4"}]}}]
+
+    monkeypatch.setattr(updater, "DB_PATH", str(tmp_path / "metadata.db"))
+    monkeypatch.setattr(updater, "CONCEPTS_DIR", str(tmp_path))
+    monkeypatch.setattr(updater, "VIDEOS_DIR", str(tmp_path))
+    monkeypatch.setattr(updater, "rest_get", lambda url, headers=None: _Response())
+    monkeypatch.setattr(updater, "save_json", lambda path, data: None)
+    monkeypatch.setattr(updater, "download_file", lambda url, dest: updater.DEFERRED)
+
+    assert updater.sync_concept("c1") is False
+    assert updater.get_installed_version("c1", "concept") is None
+
+
+class _BigFile(BaseHTTPRequestHandler):
+    body = b"x" * (8 * MB)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        try:
+            self.wfile.write(self.body)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def test_background_sync_defers_then_fetches_on_demand(policy, tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BigFile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v.mp4"
+    monkeypatch.setattr(updater, "sync_policy", policy)
+    monkeypatch.setattr(updater, "MIRROR_URL", "")
+    monkeypatch.setattr(bandwidth, "SMALL_ASSET_BYTES", 1 * MB)
+    policy.metered = True
+    dest = str(tmp_path / "v.mp4")
+    try:
+        with policy.background():
+            assert updater.download_file(url, dest) == updater.DEFERRED
+        assert not Path(dest).exists()
+        assert policy.deferred_url(dest) == url
+
+        # Still metered: the background pass leaves it queued
+        assert updater.download_deferred() == 0
+        # A learner opening it fetches it regardless
+        assert updater.download_deferred(dest) == 1
+        assert Path(dest).stat().st_size == 8 * MB
+        assert policy.pending() == []
+    finally:
+        server.shutdown()
+
+
+def test_mirror_transfers_leave_the_cloud_estimate_alone(policy, tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BigFile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(updater, "sync_policy", policy)
+    monkeypatch.setattr(updater, "link", policy.link)
+    monkeypatch.setattr(updater, "ASSETS_DIR", str(tmp_path))
+    try:
+        monkeypatch.setattr(updater, "MIRROR_URL", base)
+        assert updater.download_file(f"{base}/v.mp4", str(tmp_path / "mirrored.mp4"))
+        assert Path(tmp_path / "mirrored.mp4").stat().st_size == 8 * MB
+        assert policy.link.samples == 0
+
+        monkeypatch.setattr(updater, "MIRROR_URL", "")
+        assert updater.download_file(f"{base}/v.mp4", str(tmp_path / "cloud.mp4"))
+        assert policy.link.samples == 1
+    finally:
+        server.shutdown()
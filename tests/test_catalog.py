@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from catalog import ContentCatalog  # noqa: E402
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def _touch_dir(path):
+    # Directory mtimes can be coarse; move it forward explicitly
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    dirs = {name: tmp_path / name for name in ("lessons", "concepts", "videos")}
+    for d in dirs.values():
+        d.mkdir()
+    _write(dirs["concepts"] / "c1.json", {"id": "c1", "version": "1", "explain": "one"})
+    _write(dirs["concepts"] / "c2.json", {"id": "c2", "version": "1", "explain": "two"})
+    _write(dirs["lessons"] / "a_lesson.json", {
+        "lesson_id": "a_lesson", "title": "A",
+        "concepts": ["c1", "old_c2", "missing", {"id": "inline", "explain": "embedded"}],
+    })
+    _write(dirs["lessons"] / "b_lesson.json", {"title": "B", "concepts": ["c2"]})
+    _write(dirs["videos"] / "v1.json", {"id": "v1", "title": "Vid", "local_video": "assets/videos/v1.mp4",
+                                        "metadata": json.dumps({"length": "3:10"})})
+    (dirs["videos"] / "v1.mp4").write_bytes(b"\0")
+
+    db = tmp_path / "meta.db"
+    catalog = ContentCatalog(str(db), str(dirs["lessons"]), str(dirs["concepts"]), str(dirs["videos"]))
+    catalog.refresh()
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO content_aliases (alias, canonical) VALUES ('old_c2', 'c2')")
+    conn.commit()
+    conn.close()
+    return catalog, dirs
+
+
+def test_lessons_resolve_references_aliases_and_embedded_concepts(tree):
+    catalog, _ = tree
+    lessons = catalog.lessons()
+
+    assert [l["lesson_id"] for l in lessons] == ["a_lesson", "b_lesson"]
+    assert [c["explain"] for c in lessons[0]["concepts"]] == ["one", "two", "embedded"]
+    assert catalog.lesson("b_lesson")["concepts"][0]["id"] == "c2"
+    assert catalog.concept("old_c2")["id"] == "c2"
+    assert catalog.lesson_index()[0] == {"lesson_id": "a_lesson", "title": "A", "path": "a_lesson.json"}
+    assert catalog.videos() == [{"title": "Vid", "id": "v1", "thumb": "", "url": "assets/videos/v1.mp4", "length": "3:10"}]
+
+
+def test_refresh_only_reparses_changed_files(tree):
+    catalog, dirs = tree
+    assert catalog.refresh(force=True) == 0
+    assert catalog.refresh() == 0
+
+    _write(dirs["concepts"] / "c3.json", {"id": "c3", "explain": "three"})
+    (dirs["lessons"] / "b_lesson.json").unlink()
+    _touch_dir(dirs["concepts"])
+    _touch_dir(dirs["lessons"])
+    assert catalog.refresh() == 2
+    assert catalog.concept("c3")["explain"] == "three"
+    assert [l["lesson_id"] for l in catalog.lessons()] == ["a_lesson"]
+
+
+def test_index_file_picks_up_in_place_writes(tree):
+    catalog, dirs = tree
+    catalog.refresh()
+    _write(dirs["concepts"] / "c1.json", {"id": "c1", "version": "2", "explain": "one, revised"})
+    catalog.index_file(str(dirs["concepts"] / "c1.json"))
+    assert catalog.lesson("a_lesson")["concepts"][0]["explain"] == "one, revised"
+
+    (dirs["concepts"] / "c1.json").unlink()
+    catalog.index_file(str(dirs["concepts"] / "c1.json"))
+    assert catalog.concept("c1") is None
@@ -0,0 +1,123 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import cleanup_duplicates  # noqa: E402
+
+EXPLAIN = "Gravity is the force that pulls objects toward the centre of the Earth and keeps the Moon in orbit."
+
+
+def _concept(cid, explain=EXPLAIN, question="What pulls objects toward the Earth?"):
+    return {"id": cid, "version": 1, "explain": explain, "check": {"question": question, "keywords": ["gravity"]}}
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    concepts, lessons = tmp_path / "concepts", tmp_path / "lessons"
+    concepts.mkdir()
+    lessons.mkdir()
+    monkeypatch.setattr(cleanup_duplicates, "CONCEPTS_DIR", str(concepts))
+    monkeypatch.setattr(cleanup_duplicates, "LESSONS_DIR", str(lessons))
+    monkeypatch.setattr(cleanup_duplicates, "DB_PATH", str(tmp_path / "progress.db"))
+    return concepts, lessons
+
+
+def test_exact_and_near_duplicates_are_grouped(tree):
+    concepts, _ = tree
+    uuid = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    _write(concepts / "gravity.json", _concept("gravity"))
+    _write(concepts / f"{uuid}.json", {**_concept(uuid), "version": 7})
+    _write(concepts / "gravity_v2.json", _concept("gravity_v2", explain=EXPLAIN.replace("centre", "center")))
+    _write(concepts / "photosynthesis.json", _concept("photosynthesis", explain="Plants turn light, water and carbon dioxide into sugar.", question="What do plants make?"))
+
+    exact = cleanup_duplicates.find_duplicates(include_near=False)
+    assert [sorted(files) for files, _ in exact.values()] == [[f"{uuid}.json", "gravity.json"]]
+
+    assert cleanup_duplicates.find_duplicates() == exact
+    near = cleanup_duplicates.find_duplicates(include_near=True)
+    assert len(near) == 1
+    key, (files, _) = next(iter(near.items()))
+    assert key.startswith("near:")
+    assert sorted(files) == [f"{uuid}.json", "gravity.json", "gravity_v2.json"]
+
+
+def test_apply_remaps_lessons_once_and_deletes_duplicates(tree):
+    concepts, lessons = tree
+    uuid = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    _write(concepts / "gravity.json", _concept("gravity"))
+    _write(concepts / f"{uuid}.json", _concept(uuid))
+    _write(lessons / "a.json", {"lesson_id": "a", "concepts": [uuid, "gravity", "other"]})
+    _write(lessons / "b.json", {"lesson_id": "b", "concepts": ["other"]})
+    untouched = (lessons / "b.json").stat().st_mtime_ns
+
+    conn = sqlite3.connect(cleanup_duplicates.DB_PATH)
+    conn.execute("CREATE TABLE installed_content (content_id TEXT, type TEXT, PRIMARY KEY (content_id, type))")
+    conn.execute("INSERT INTO installed_content VALUES (?, 'concept')", (uuid,))
+    conn.commit()
+    conn.close()
+
+    cleanup_duplicates.apply_cleanup(cleanup_duplicates.find_duplicates())
+
+    assert not (concepts / f"{uuid}.json").exists()
+    assert (concepts / "gravity.json").exists()
+    assert json.loads((lessons / "a.json").read_text())["concepts"] == ["gravity", "other"]
+    assert (lessons / "b.json").stat().st_mtime_ns == untouched
+    assert not list(lessons.glob("*.tmp"))
+    conn = sqlite3.connect(cleanup_duplicates.DB_PATH)
+    assert conn.execute("SELECT content_id, type FROM installed_content").fetchall() == [("gravity", "concept")]
+    conn.close()
+
+
+def test_remap_onto_installed_canonical_merges_rows(tree):
+    concepts, _ = tree
+    _write(concepts / "gravity.json", _concept("gravity"))
+    _write(concepts / "gravity_copy.json", _concept("gravity_copy"))
+    _write(concepts / "mass.json", _concept("mass", explain="Mass measures how much matter is in an object.", question="?"))
+    _write(concepts / "mass_copy.json", _concept("mass_copy", explain="Mass measures how much matter is in an object.", question="?"))
+
+    conn = sqlite3.connect(cleanup_duplicates.DB_PATH)
+    conn.execute("CREATE TABLE installed_content (content_id TEXT, type TEXT, PRIMARY KEY (content_id, type))")
+    conn.executemany("INSERT INTO installed_content VALUES (?, ?)", [
+        ("gravity", "concept"), ("gravity_copy", "concept"), ("mass_copy", "concept"),
+        # A lesson sharing the duplicate's id is not a concept row and stays as it is
+        ("mass_copy", "lesson"),
+    ])
+    conn.commit()
+    conn.close()
+
+    cleanup_duplicates.apply_cleanup(cleanup_duplicates.find_duplicates())
+
+    conn = sqlite3.connect(cleanup_duplicates.DB_PATH)
+    assert sorted(conn.execute("SELECT content_id, type FROM installed_content").fetchall()) == [
+        ("gravity", "concept"), ("mass", "concept"), ("mass_copy", "lesson")]
+    conn.close()
+
+
+def test_remap_only_drops_repeats_the_merge_creates():
+    remap = {"gravity_copy": "gravity"}
+    assert cleanup_duplicates.remap_concepts(["gravity_copy", "gravity", "mass"], remap) == ["gravity", "mass"]
+    assert cleanup_duplicates.remap_concepts(["gravity", "x", "gravity_copy"], remap) == ["gravity", "x"]
+    # Intentional repeats of ids the merge didn't touch survive
+    assert cleanup_duplicates.remap_concepts(["mass", "quiz", "mass", "gravity_copy"], remap) == \
+        ["mass", "quiz", "mass", "gravity"]
+
+
+def test_parallel_fingerprinting_matches_serial(tree, monkeypatch):
+    concepts, _ = tree
+    for i in range(6):
+        _write(concepts / f"c{i}.json", _concept(f"c{i}", explain=f"Topic {i % 3} " + EXPLAIN))
+    serial = cleanup_duplicates.find_duplicates(workers=1)
+    monkeypatch.setattr(cleanup_duplicates, "PARALLEL_THRESHOLD", 2)
+    parallel = cleanup_duplicates.find_duplicates(workers=2)
+    assert {k: sorted(v[0]) for k, v in serial.items()} == {k: sorted(v[0]) for k, v in parallel.items()}
@@ -0,0 +1,144 @@
+import io
+import json
+import sqlite3
+import sys
+import tarfile
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from catalog import ContentCatalog  # noqa: E402
+from content_packs import ContentPacks, PackError  # noqa: E402
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def _device(root):
+    for d in ("lessons", "concepts", "assets/videos", "assets/thumbnails"):
+        (root / d).mkdir(parents=True, exist_ok=True)
+    db = str(root / "metadata.db")
+    catalog = ContentCatalog(db, str(root / "lessons"), str(root / "concepts"), str(root / "assets" / "videos"))
+    return ContentPacks(str(root), db, catalog)
+
+
+class _Unseekable:
+    """A socket-like stream: read() only."""
+
+    def __init__(self, data):
+        self._buf = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._buf.read(size)
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "school"
+    packs = _device(root)
+    concept = {"id": "c1", "version": 2, "explain": "Gravity pulls.",
+               "check": {"question": "What pulls?", "keywords": ["gravity"]},
+               "videos": [{"id": "v1", "url": "http://cdn/v1.mp4"}]}
+    _write(root / "concepts" / "c1.json", concept)
+    _write(root / "lessons" / "gravity.json", {"lesson_id": "gravity", "title": "Gravity", "concepts": ["old_c1"]})
+    _write(root / "assets" / "videos" / "v1.json", {"id": "v1", "local_video": "assets/videos/v1.mp4",
+                                                    "local_thumb": "assets/thumbnails/v1.jpg"})
+    (root / "assets" / "videos" / "v1.mp4").write_bytes(b"\x01" * 200_000)
+    (root / "assets" / "thumbnails" / "v1.jpg").write_bytes(b"\x02" * 100)
+    conn = packs._db()
+    conn.execute("INSERT INTO cached_content VALUES ('gravity', 'lesson', 3), ('c1', 'concept', 2)")
+    conn.execute("INSERT INTO content_aliases VALUES ('old_c1', 'c1')")
+    conn.commit()
+    conn.close()
+    return packs
+
+
+def _pack(packs, lesson_ids=("gravity",)):
+    out = io.BytesIO()
+    packs.write_pack(packs.plan_export(list(lesson_ids), {"id": "course-1"}), out)
+    return out.getvalue()
+
+
+def test_export_then_streaming_import_installs_everything(source, tmp_path):
+    data = _pack(source)
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        names = tar.getnames()
+    assert names[0] == "manifest.json"
+    assert set(names[1:]) == {"lessons/gravity.json", "concepts/c1.json", "assets/videos/v1.json",
+                              "assets/videos/v1.mp4", "assets/thumbnails/v1.jpg"}
+
+    target = _device(tmp_path / "classroom")
+    # Trailing bytes past the body must not be read
+    report = target.import_pack(_Unseekable(data + b"NEXT REQUEST"), length=len(data))
+
+    assert report["lessons"] == ["gravity"] and report["concepts"] == ["c1"] and report["videos"] == ["v1"]
+    root = tmp_path / "classroom"
+    assert (root / "assets" / "videos" / "v1.mp4").read_bytes() == b"\x01" * 200_000
+    assert target.catalog.lesson("gravity")["concepts"][0]["id"] == "c1"
+    conn = sqlite3.connect(target.db_path)
+    assert sorted(conn.execute("SELECT id, type, version FROM cached_content").fetchall()) == [
+        ("c1", "concept", 2), ("gravity", "lesson", 3)]
+    conn.close()
+    assert not list((root / ".pack_staging").iterdir())
+
+    again = target.import_pack(io.BytesIO(data))
+    assert again["lessons"] == [] and len(again["skipped"]) == 2
+
+
+def test_corrupt_pack_installs_nothing(source, tmp_path):
+    data = bytearray(_pack(source))
+    data[data.index(b"\x01" * 1000) + 10] = 0
+    target = _device(tmp_path / "classroom")
+
+    with pytest.raises(PackError, match="checksum mismatch"):
+        target.import_pack(io.BytesIO(bytes(data)))
+    with pytest.raises(PackError):
+        target.import_pack(io.BytesIO(_pack(source)[:5000]))
+
+    root = tmp_path / "classroom"
+    assert not list((root / "lessons").iterdir())
+    assert not list((root / "assets" / "videos").iterdir())
+
+
+def test_export_requires_installed_lessons_and_rejects_unsafe_paths(source, tmp_path):
+    with pytest.raises(LookupError, match="not installed"):
+        source.plan_export(["gravity", "nope"])
+
+    manifest = json.dumps({"format": "brightstudy-content-pack", "format_version": 1,
+                           "files": [{"path": "../evil.json", "size": 1, "sha256": "x"}]}).encode()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(manifest)
+        tar.addfile(info, io.BytesIO(manifest))
+    with pytest.raises(PackError, match="Illegal path"):
+        _device(tmp_path / "classroom").import_pack(io.BytesIO(buf.getvalue()))
+
+
+def _manifest_only_pack(manifest):
+    data = json.dumps({"format": "brightstudy-content-pack", "format_version": 1, **manifest}).encode()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return io.BytesIO(buf.getvalue())
+
+
+@pytest.mark.parametrize("item_id", ["../../evil", "sub/evil", "..\\evil", ".."])
+def test_import_rejects_ids_that_escape_the_content_dir(tmp_path, item_id):
+    pack = _manifest_only_pack({"lessons": [{"id": item_id, "version": 1}], "files": []})
+    with pytest.raises(PackError, match="Illegal lesson id"):
+        _device(tmp_path / "classroom").import_pack(pack)
+
+
+def test_import_requires_a_file_for_every_listed_id(tmp_path):
+    pack = _manifest_only_pack({"concepts": [{"id": "c9", "version": 1}], "files": []})
+    with pytest.raises(PackError, match="without its file"):
+        _device(tmp_path / "classroom").import_pack(pack)
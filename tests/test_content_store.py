@@ -0,0 +1,81 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import content_store  # noqa: E402
+
+
+def _concept(i):
+    return {"id": f"concept_{i}", "version": 1, "title": f"Concept {i}",
+            "explain": f"Gravity pulls object number {i} toward the Earth.",
+            "check": {"question": "What pulls objects down?", "keywords": ["gravity", "pull"],
+                      "desired_answer": "Gravity pulls objects toward the centre of the Earth."},
+            "videos": [{"id": f"video_{i}", "url": f"https://cdn.example.com/videos/video_{i}.mp4"}]}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_store, "DICT_DIR", str(tmp_path / "dictionaries"))
+    monkeypatch.setattr(content_store, "STORAGE_MODE", "plain")
+    content_store._dicts.clear()
+    concepts = tmp_path / "concepts"
+    concepts.mkdir()
+    for i in range(20):
+        (concepts / f"concept_{i}.json").write_text(json.dumps(_concept(i), indent=2), encoding="utf-8")
+    return concepts
+
+
+def test_plain_and_compressed_files_read_the_same(store, monkeypatch):
+    path = str(store / "concept_0.json")
+    assert content_store.load_json(path) == _concept(0)
+
+    monkeypatch.setattr(content_store, "STORAGE_MODE", "compressed")
+    content_store.save_json(path, _concept(0))
+    assert content_store.is_compressed(path)
+    assert content_store.load_json(path) == _concept(0)
+
+
+def test_trained_dictionary_shrinks_files_and_migration_is_reversible(store):
+    paths = sorted(store.glob("*.json"))
+    plain_size = sum(p.stat().st_size for p in paths)
+
+    assert content_store.migrate([str(store)]) == 20
+    no_dict_size = sum(p.stat().st_size for p in paths)
+    content_store.train([str(store)])
+    # Files compressed without the dictionary are upgraded to it
+    assert content_store.migrate([str(store)]) == 20
+    assert content_store.migrate([str(store)]) == 0
+    dict_size = sum(p.stat().st_size for p in paths)
+
+    assert dict_size < no_dict_size < plain_size
+    assert content_store.load_json(str(store / "concept_13.json")) == _concept(13)
+
+    # A new dictionary doesn't strand files compressed with the old one
+    content_store._dicts.clear()
+    (store / "concept_0.json").write_bytes(content_store.encode(_concept(99), compress=False))
+    content_store.train([str(store)])
+    assert content_store.load_json(str(store / "concept_15.json")) == _concept(15)
+
+    assert content_store.migrate([str(store)], compress=False) == 19
+    assert json.loads((store / "concept_1.json").read_text(encoding="utf-8")) == _concept(1)
+
+
+def test_decoded_text_is_cached_until_the_file_changes(store, monkeypatch):
+    path = str(store / "concept_1.json")
+    reads = []
+    real_decode = content_store.decode
+    monkeypatch.setattr(content_store, "decode", lambda raw: reads.append(1) or real_decode(raw))
+
+    content_store.load_json(path)
+    content_store.load_json(path)
+    assert len(reads) == 1
+
+    content_store.save_json(path, {"id": "concept_1", "changed": True})
+    assert content_store.load_json(path)["changed"] is True
+    assert len(reads) == 2
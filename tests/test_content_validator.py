@@ -0,0 +1,95 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import content_validator  # noqa: E402
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data) if not isinstance(data, str) else data, encoding="utf-8")
+
+
+def _concept(cid, **extra):
+    return {"id": cid, "explain": "e", "check": {"question": "q?", "keywords": ["k"]}, **extra}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    dirs = {name: tmp_path / name for name in ("lessons", "concepts", "videos")}
+    for d in dirs.values():
+        d.mkdir()
+    _write(dirs["concepts"] / "c1.json", _concept("c1", videos=[{"id": "v1", "url": "http://x/v1.mp4"}]))
+    _write(dirs["concepts"] / "c2.json", _concept("c2"))
+    _write(dirs["lessons"] / "good.json", {"lesson_id": "good", "title": "Good", "concepts": ["c1", "old_c2"]})
+    _write(dirs["videos"] / "v1.json", {"id": "v1", "local_video": "assets/videos/v1.mp4"})
+    (dirs["videos"] / "v1.mp4").write_bytes(b"\0")
+    return dirs
+
+
+def _validate(dirs, **kwargs):
+    return content_validator.validate_tree(str(dirs["lessons"]), str(dirs["concepts"]), str(dirs["videos"]), **kwargs)
+
+
+def test_valid_tree_passes(tree):
+    report = _validate(tree, aliases={"old_c2": "c2"})
+    assert report == {"ok": True, "counts": {"lesson": 1, "concept": 2, "video": 1}, "errors": [], "warnings": []}
+
+
+def test_reports_schema_and_reference_problems(tree):
+    _write(tree["lessons"] / "broken.json", {"lesson_id": "broken", "title": "B", "concepts": ["nope", {"explain": 3}]})
+    _write(tree["concepts"] / "bad.json", {"id": "bad", "explain": "e", "check": {"keywords": "k"}})
+    _write(tree["lessons"] / "garbled.json", "{not json")
+
+    report = _validate(tree)
+    problems = {(e["id"], e["problem"]) for e in report["errors"]}
+
+    assert report["ok"] is False
+    assert ("good", "references missing concept 'old_c2'") in problems
+    assert ("broken", "references missing concept 'nope'") in problems
+    assert ("broken", "concepts[1]: explain must be a string") in problems
+    assert ("bad", "check.keywords must be a list of strings") in problems
+    assert any(i == "garbled" and p.startswith("unreadable JSON") for i, p in problems)
+    assert {"c2", "bad"} <= {w["id"] for w in report["warnings"]}
+    json.dumps(report)
+
+
+def test_thin_content_and_missing_videos_are_only_warnings(tree):
+    _write(tree["lessons"] / "empty.json", {"lesson_id": "empty", "title": "E", "concepts": []})
+    _write(tree["concepts"] / "c1.json", {"id": "c1", "explain": "", "check": {"question": "", "keywords": []},
+                                          "videos": [{"id": "v1", "url": "http://x/v1.mp4"}]})
+    _write(tree["concepts"] / "c2.json", {"id": "c2", "explain": "e", "check": {"question": "Why?", "desired_answer": "Because."}})
+    (tree["videos"] / "v1.mp4").unlink()
+
+    report = _validate(tree, aliases={"old_c2": "c2"})
+    warnings = {(w["id"], w["problem"]) for w in report["warnings"]}
+
+    assert report["ok"] is True and report["errors"] == []
+    assert ("empty", "lesson has no concepts") in warnings
+    assert ("c1", "missing explain") in warnings
+    assert ("c1", "missing check.question") in warnings
+    assert ("c1", "check has no keywords or desired_answer to grade against") in warnings
+    assert ("c1", "video file 'v1.mp4' is not downloaded") in warnings
+    assert ("v1", "asset 'assets/videos/v1.mp4' is not downloaded") in warnings
+    # A desired_answer alone is enough to grade against
+    assert not any(i == "c2" for i, _ in warnings)
+
+
+def test_process_pool_matches_serial_scan(tree, monkeypatch):
+    for i in range(5):
+        _write(tree["concepts"] / f"extra{i}.json", _concept(f"extra{i}"))
+    serial = _validate(tree, aliases={"old_c2": "c2"}, workers=1)
+    monkeypatch.setattr(content_validator, "PARALLEL_THRESHOLD", 2)
+    parallel = _validate(tree, aliases={"old_c2": "c2"}, workers=2)
+    assert parallel == serial
+
+
+def test_payload_gate_requires_resolvable_concepts(tree):
+    lesson = {"lesson_id": "new", "title": "New", "concepts": ["c1", "c9"]}
+    assert content_validator.validate_payload(lesson, {}, str(tree["concepts"])) == ["references missing concept 'c9'"]
+    assert content_validator.validate_payload(lesson, {"c9": _concept("c9")}, str(tree["concepts"])) == []
@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from catalog import ContentCatalog  # noqa: E402
+from course_install import CourseInstaller  # noqa: E402
+from mirror import parse_query  # noqa: E402
+
+
+def _concept(cid, videos):
+    return {"explain": f"{cid} explained.", "check": {"question": f"What is {cid}?", "keywords": [cid]},
+            "videos": videos}
+
+
+# Two lessons share concept "forces"; "motion" inlines its concept and its video has no URL in the concept
+SUBJECTS = [
+    {"order": 1, "lessons": [
+        {"lesson_id": "newton", "version": 2, "order_index": 1,
+         "json_data": {"title": "Newton", "concepts": ["forces", "mass"]}},
+        {"lesson_id": "motion", "version": 1, "order_index": 0,
+         "json_data": json.dumps({"title": "Motion", "concepts": [
+             {"id": "speed", "version": 1, **_concept("speed", [{"id": "v_speed"}])}, "forces"]})},
+    ]},
+    {"order": 2, "lessons": [
+        {"lesson_id": "gravity", "version": 1, "order_index": 0,
+         "json_data": {"title": "Gravity", "concepts": ["forces"]}},
+    ]},
+]
+CONCEPTS = {
+    "forces": _concept("forces", [{"id": "v_forces", "url": "http://cloud/v_forces.mp4"}]),
+    "mass": _concept("mass", [{"id": "v_forces", "url": "http://cloud/v_forces.mp4"},
+                              {"id": "v_mass", "url": "http://cloud/v_mass.mp4"}]),
+}
+VIDEOS = {"v_speed": "http://cloud/v_speed.mp4"}
+
+
+@pytest.fixture
+def cloud():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            hits.append(self.path)
+            _, filters = parse_query(query)
+            table = path.rsplit("/", 1)[-1]
+            if table == "delivery_subjects":
+                rows = SUBJECTS if filters.get("course_id") == {"physics"} else []
+            elif table == "delivery_concepts":
+                rows = [{"id": c, "version": 3, "json_data": CONCEPTS[c]} for c in sorted(filters["id"]) if c in CONCEPTS]
+            else:
+                rows = [{"id": v, "url": VIDEOS[v]} for v in sorted(filters["id"]) if v in VIDEOS]
+            body = json.dumps(rows).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/rest/v1", hits
+    server.shutdown()
+
+
+@pytest.fixture
+def installer(tmp_path, cloud):
+    rest_url, hits = cloud
+    for d in ("lessons", "concepts", "assets/videos"):
+        (tmp_path / d).mkdir(parents=True)
+    db = str(tmp_path / "metadata.db")
+    catalog = ContentCatalog(db, str(tmp_path / "lessons"), str(tmp_path / "concepts"), str(tmp_path / "assets" / "videos"))
+    downloads, fail = [], set()
+
+    def download(url, dest):
+        downloads.append(url)
+        if url in fail:
+            return False
+        Path(dest).write_bytes(b"x" * 100)
+        return True
+
+    inst = CourseInstaller(str(tmp_path), db, catalog, rest_url, requests.get, download, workers=3)
+    return inst, hits, downloads, fail, tmp_path
+
+
+def _installed(db):
+    conn = sqlite3.connect(db)
+    rows = dict(((r[0], r[1]), r[2]) for r in conn.execute("SELECT id, type, version FROM cached_content"))
+    conn.close()
+    return rows
+
+
+def test_manifest_resolves_in_bulk_and_dedupes(installer):
+    inst, hits, _, _, _ = installer
+    manifest = inst.resolve("physics")
+    assert list(manifest["lessons"]) == ["motion", "newton", "gravity"]
+    assert set(manifest["concepts"]) == {"speed", "forces", "mass"}
+    assert manifest["videos"] == {"v_speed": "http://cloud/v_speed.mp4", "v_forces": "http://cloud/v_forces.mp4",
+                                  "v_mass": "http://cloud/v_mass.mp4"}
+    # Subjects+lessons, one concept batch, one video batch
+    assert manifest["requests"] == len(hits) == 3
+    assert "in.(forces,mass)" in hits[1]
+
+
+def test_install_downloads_each_video_once_and_marks_course(installer):
+    inst, _, downloads, _, root = installer
+    report = inst.install("physics")
+    assert report["status"] == "installed"
+    assert report["files_total"] == report["files_done"] == 3 and report["bytes_done"] == 300
+    assert sorted(downloads) == ["http://cloud/v_forces.mp4", "http://cloud/v_mass.mp4", "http://cloud/v_speed.mp4"]
+    assert inst.installed_courses() == {"physics": ["motion", "newton", "gravity"]}
+    installed = _installed(inst.db_path)
+    assert installed[("newton", "lesson")] == 2 and installed[("forces", "concept")] == 3
+    assert {l["lesson_id"] for l in inst.catalog.lesson_index()} == {"motion", "newton", "gravity"}
+
+    # Re-installing fetches metadata but no videos
+    inst.install("physics")
+    assert len(downloads) == 3
+
+
+def test_failed_video_leaves_course_partial(installer):
+    inst, _, _, fail, _ = installer
+    fail.add("http://cloud/v_mass.mp4")
+    report = inst.install("physics")
+    assert report["status"] == "partial" and report["failed"] == ["v_mass"]
+    installed = _installed(inst.db_path)
+    # Everything not depending on the failed video is still installed
+    assert ("newton", "lesson") not in installed and ("mass", "concept") not in installed
+    assert ("gravity", "lesson") in installed and ("motion", "lesson") in installed
+    assert inst.installed_courses() == {}
+
+
+def test_unknown_course_fails_in_background(installer):
+    inst, _, _, _, _ = installer
+    with pytest.raises(LookupError):
+        inst.install("chemistry")
+    done = threading.Event()
+    inst.start("chemistry", on_done=done.set)
+    assert done.wait(5)
+    assert inst.progress("chemistry")["phase"] == "failed"
@@ -0,0 +1,53 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import documents  # noqa: E402
+import retrieval  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    return documents.DocumentStore(str(tmp_path / "docs.db"), str(tmp_path / "docs"))
+
+
+def _upload(store, user_id, text, name="notes.txt"):
+    body = text.encode("utf-8")
+    return store.save_stream(user_id, name, io.BytesIO(body), len(body))
+
+
+def test_upload_is_chunked_once_and_deduplicated(store, monkeypatch):
+    text = "\n\n".join(f"Paragraph {i} about the water cycle and evaporation." for i in range(60))
+    doc = _upload(store, "u1", text)
+
+    assert doc["chunk_count"] > 1
+    assert Path(store.docs_dir, f"{doc['id']}.txt").read_text(encoding="utf-8") == text
+    assert _upload(store, "u1", text)["id"] == doc["id"]
+    assert _upload(store, "u2", text)["id"] != doc["id"]
+    assert [d["id"] for d in store.list("u1")] == [doc["id"]]
+
+    # Chat turns reuse the persisted term counts instead of re-tokenizing
+    monkeypatch.setattr(retrieval, "tokenize", lambda text: pytest.fail("re-tokenized"))
+    index = store.get_index(doc["id"])
+    assert len(index.chunks) == doc["chunk_count"]
+    assert store.get_index(doc["id"]) is index
+
+
+def test_rejects_oversized_upload(store, monkeypatch):
+    monkeypatch.setattr(documents, "MAX_DOCUMENT_BYTES", 10)
+    with pytest.raises(documents.DocumentTooLarge):
+        _upload(store, "u1", "x" * 11)
+
+
+def test_delete_checks_owner(store):
+    doc = _upload(store, "u1", "Some short text.")
+    assert not store.delete("u2", doc["id"])
+    assert store.delete("u1", doc["id"])
+    assert store.get(doc["id"]) is None
+    assert store.get_index(doc["id"]) is None
@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import grading  # noqa: E402
+
+
+def _concept(keywords, version="1.0", synonyms=None, cid="gravity"):
+    return {"id": cid, "version": version, "check": {"keywords": keywords, "synonyms": synonyms}}
+
+
+def test_keywords_are_normalized_and_stemmed_like_answers():
+    concept = _concept(["force", "pull", "Earth", "objects"])
+    result = grading.grade_answer(concept, "A force pulling an object toward the earth!")
+    assert result["correct"] is True
+    assert result["matched"] == ["force", "pull", "Earth", "objects"]
+    assert result["missing"] == []
+
+
+def test_reports_missing_keywords_and_matches_whole_words_only():
+    result = grading.KeywordMatcher(["mass", "earth"]).grade("Massive earthquakes")
+    assert result["correct"] is False
+    assert result["missing"] == ["mass", "earth"]
+
+
+def test_phrases_and_synonyms_share_one_automaton():
+    matcher = grading.KeywordMatcher(
+        ["carbon dioxide", "sunlight", "bon"],
+        synonyms={"Sunlight": ["light energy", "sun"]},
+    )
+    result = matcher.grade("Plants use light energy and carbon dioxide")
+    assert result["matched"] == ["carbon dioxide", "sunlight"]
+    assert result["missing"] == ["bon"]
+    assert matcher.grade("the sun")["matched"] == ["sunlight"]
+
+
+def test_overlapping_patterns_are_all_reported():
+    matcher = grading.KeywordMatcher(["water cycle", "cycle", "the water cycle repeats"])
+    assert matcher.grade("the water cycle repeats")["missing"] == []
+
+
+def test_matchers_are_cached_per_concept_version():
+    first = grading.matcher_for(_concept(["gravity"]))
+    assert grading.matcher_for(_concept(["gravity"])) is first
+    assert grading.matcher_for(_concept(["gravity"], version="2.0")) is not first
+    # Edited keywords without a version bump are picked up too
+    assert grading.matcher_for(_concept(["gravity", "pull"])) is not first
+
+
+def test_stem_handles_common_endings():
+    assert {grading.stem(w) for w in ("pulls", "pulling", "pulled", "pull")} == {"pull"}
+    assert grading.stem("stopped") == grading.stem("stop")
+    assert grading.stem("energies") == grading.stem("energy")
+    assert grading.stem("mass") == "mass"
+    assert grading.stem("photosynthesis") == "photosynthesis"
+
+
+def _gravity(version="1.0"):
+    return {"id": "gravity", "version": version, "check": {
+        "keywords": ["gravity", "pulls", "earth", "objects"],
+        "desired_answer": "Gravity pulls objects toward Earth.",
+    }}
+
+
+def test_paraphrase_close_to_desired_answer_passes():
+    index = grading.SimilarityIndex([
+        "Gravity pulls objects toward Earth.",
+        "Plants make food from sunlight.",
+        "Mass is the amount of matter in an object.",
+        "The numerator is the top number of a fraction.",
+    ])
+    result = grading.grade_answer(_gravity(), "gravity pulls things to the earth", index)
+    assert result["missing"] == ["objects"]
+    assert result["similarity"] > 0.4
+    assert result["correct"] is True
+
+    weak = grading.grade_answer(_gravity(), "gravity", index)
+    assert weak["correct"] is False
+    assert weak["confidence"] < grading.ACCEPT_CONFIDENCE
+
+    unrelated = grading.grade_answer(_gravity(), "plants make food", index)
+    assert unrelated["similarity"] < grading.SIMILARITY_FLOOR
+    assert unrelated["confidence"] == 0
+
+
+def test_paraphrase_without_any_keyword_passes_on_similarity():
+    index = grading.SimilarityIndex([
+        "Gravity pulls objects toward Earth.",
+        "Plants make food from sunlight.",
+        "Mass is the amount of matter in an object.",
+    ])
+    concept = {"id": "gravity_force", "version": "1", "check": {
+        "keywords": ["gravity", "force"], "desired_answer": "Gravity pulls objects toward Earth.",
+    }}
+    result = grading.grade_answer(concept, "it pulls objects toward the earth", index)
+    assert result["matched"] == []
+    assert result["similarity"] >= grading.SIMILARITY_CEIL
+    assert result["correct"] is True
+
+    vague = grading.grade_answer(concept, "the earth", index)
+    assert vague["matched"] == [] and vague["correct"] is False
+
+
+def test_without_desired_answer_confidence_is_keyword_coverage():
+    result = grading.grade_answer(_concept(["gravity", "pull"], cid="kw_only"), "gravity")
+    assert result["similarity"] is None
+    assert result["confidence"] == 0.5
+    assert result["correct"] is False
+
+
+def test_nothing_to_grade_against_fails():
+    result = grading.grade_answer(_concept([], cid="empty"), "")
+    assert result["correct"] is False
+    assert result["confidence"] == 0.0
+
+
+def test_similarity_index_rebuilds_only_when_content_changes(tmp_path):
+    concepts = tmp_path / "concepts"
+    concepts.mkdir()
+    (concepts / "a.json").write_text(json.dumps(_gravity()), encoding="utf-8")
+
+    first = grading.similarity_index_for(str(concepts))
+    assert grading.similarity_index_for(str(concepts)) is first
+    vec = first.desired_vector(_gravity())
+    assert first.desired_vector(_gravity()) is vec
+
+    (concepts / "b.json").write_text(json.dumps({"check": {"desired_answer": "Mass is matter."}}), encoding="utf-8")
+    os.utime(concepts, ns=(0, os.stat(concepts).st_mtime_ns + 1))
+    assert grading.similarity_index_for(str(concepts)) is not first
@@ -0,0 +1,59 @@
+import sys
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import jobs  # noqa: E402
+
+
+def test_duplicate_submissions_coalesce_onto_in_flight_job():
+    manager = jobs.JobManager(max_workers=1)
+    release = threading.Event()
+    calls = []
+
+    def work(x):
+        calls.append(x)
+        release.wait(5)
+        return {"lesson_id": x}
+
+    first, created = manager.submit("gen", ("l1", "beginner"), work, "l1_beginner")
+    second, created_again = manager.submit("gen", ("l1", "beginner"), work, "l1_beginner")
+    assert created and not created_again
+    assert first["id"] == second["id"]
+
+    release.set()
+    done = manager.wait(first["id"], 5)
+    assert done["status"] == jobs.DONE
+    assert done["result"] == {"lesson_id": "l1_beginner"}
+    assert calls == ["l1_beginner"]
+
+    # Once finished, the same key starts a fresh job
+    third, created = manager.submit("gen", ("l1", "beginner"), lambda: {"lesson_id": "x"})
+    assert created and third["id"] != first["id"]
+
+
+def test_failures_and_none_results_are_reported():
+    manager = jobs.JobManager()
+
+    def boom():
+        raise RuntimeError("model offline")
+
+    failed, _ = manager.submit("gen", "a", boom)
+    empty, _ = manager.submit("gen", "b", lambda: None)
+
+    assert manager.wait(failed["id"], 5)["error"] == "model offline"
+    assert manager.wait(empty["id"], 5)["status"] == jobs.FAILED
+    assert manager.get("missing") is None
+
+
+def test_wait_returns_current_state_on_timeout():
+    manager = jobs.JobManager()
+    release = threading.Event()
+    job, _ = manager.submit("gen", "k", lambda: release.wait(5) or {"ok": True})
+
+    assert manager.wait(job["id"], 0.05)["status"] in (jobs.QUEUED, jobs.RUNNING)
+    release.set()
+    assert manager.wait(job["id"], 5)["status"] == jobs.DONE
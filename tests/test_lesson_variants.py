@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import lesson_variants  # noqa: E402
+from catalog import ContentCatalog  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    lessons = tmp_path / "lessons"
+    concepts = tmp_path / "concepts"
+    lessons.mkdir()
+    concepts.mkdir()
+    (lessons / "gravity_intro.json").write_text(json.dumps(
+        {"lesson_id": "gravity_intro", "title": "Gravity Intro", "concepts": ["c1"]}
+    ), encoding="utf-8")
+    (concepts / "c1.json").write_text(json.dumps(
+        {"id": "c1", "explain": "Gravity is an attractive force.", "check": {"keywords": ["gravity"]}}
+    ), encoding="utf-8")
+    return lesson_variants.LessonVariantStore(str(lessons), str(concepts), str(tmp_path / "meta.db"))
+
+
+def _generator(calls):
+    def generate(source, mode):
+        calls.append((source, mode))
+        return {"title": f"{source['title']} ({mode})", "concepts": source["concepts"]}
+    return generate
+
+
+def test_variants_derive_from_root_and_are_reused(store):
+    calls = []
+    gen = _generator(calls)
+
+    first = store.get_or_generate("gravity_intro", "Beginner", gen, "m1")
+    assert first == {"lesson_id": "gravity_intro_beginner", "cached": False}
+    # Concepts are resolved before generation
+    assert calls[0][0]["concepts"][0]["explain"] == "Gravity is an attractive force."
+    assert calls[0][1] == "Beginner"
+
+    # Asking from a variant (or a legacy chained id) never builds a chain
+    again = store.get_or_generate("gravity_intro_beginner", "beginner", gen, "m1")
+    legacy = store.get_or_generate("gravity_intro_beginner_beginner_beginner", "Beginner", gen, "m1")
+    assert again == legacy == {"lesson_id": "gravity_intro_beginner", "cached": True}
+    assert len(calls) == 1
+
+    saved = json.loads(Path(store.lessons_dir, "gravity_intro_beginner.json").read_text(encoding="utf-8"))
+    assert saved["source_lesson_id"] == "gravity_intro"
+
+
+def test_source_or_model_change_regenerates(store):
+    calls = []
+    gen = _generator(calls)
+    store.get_or_generate("gravity_intro", "Advance", gen, "m1")
+
+    assert store.get_or_generate("gravity_intro", "Advance", gen, "m2")["cached"] is False
+
+    concept = Path(store.concepts_dir, "c1.json")
+    concept.write_text(json.dumps({"id": "c1", "explain": "Updated."}), encoding="utf-8")
+    assert store.get_or_generate("gravity_intro", "Advance", gen, "m2")["cached"] is False
+    assert store.get_or_generate("gravity_intro", "Advance", gen, "m2")["cached"] is True
+    assert len(calls) == 3
+
+
+def test_errors(store):
+    with pytest.raises(ValueError):
+        store.get_or_generate("gravity_intro", "Expert", _generator([]), "m")
+    with pytest.raises(LookupError):
+        store.get_or_generate("missing", "Beginner", _generator([]), "m")
+    assert store.get_or_generate("gravity_intro", "Beginner", lambda s, m: None, "m") is None
+
+
+def test_saved_variant_is_indexed_in_catalog(tmp_path):
+    lessons = tmp_path / "lessons"
+    concepts = tmp_path / "concepts"
+    videos = tmp_path / "videos"
+    for d in (lessons, concepts, videos):
+        d.mkdir()
+    (lessons / "gravity_intro.json").write_text(json.dumps(
+        {"lesson_id": "gravity_intro", "title": "Gravity Intro", "concepts": []}
+    ), encoding="utf-8")
+    db = str(tmp_path / "meta.db")
+    catalog = ContentCatalog(db, str(lessons), str(concepts), str(videos))
+    store = lesson_variants.LessonVariantStore(str(lessons), str(concepts), db, catalog)
+
+    store.get_or_generate("gravity_intro", "beginner", _generator([]), "m1")
+    # Indexed at save time, not left for the next directory scan
+    conn = sqlite3.connect(db)
+    indexed = {Path(r[0]).name for r in conn.execute("SELECT path FROM catalog_files")}
+    conn.close()
+    assert "gravity_intro_beginner.json" in indexed
@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from llm_output import JSONStreamParser, parse_json  # noqa: E402
+
+
+def test_clean_json_inside_fence_and_prose():
+    text = 'Sure! Here it is:\n```json\n{"a": "x } y", "b": [1, 2]}\n```\nHope this helps {really}.'
+    assert parse_json(text) == ({"a": "x } y", "b": [1, 2]}, False)
+
+
+def test_trailing_commas_are_dropped():
+    value, repaired = parse_json('{"a": [1, 2, ], "b": {"c": "d",\n},}')
+    assert value == {"a": [1, 2], "b": {"c": "d"}}
+    assert repaired
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Cut mid-string: the partial member is dropped, not kept half-written
+    ('{"name": "Mass", "check": {"keywords": ["matter", "ma', {"name": "Mass", "check": {"keywords": ["matter"]}}),
+    # Cut after a complete member: only the brackets are missing
+    ('{"name": "Mass", "tags": ["a"]', {"name": "Mass", "tags": ["a"]}),
+    # Dangling key
+    ('{"name": "Mass", "explain": ', {"name": "Mass"}),
+    ('{"name": "Mass", "ex', {"name": "Mass"}),
+    ('[{"a": 1}, {"b": tr', [{"a": 1}, {}]),
+])
+def test_truncated_output_is_closed_at_last_complete_member(text, expected):
+    value, repaired = parse_json(text)
+    assert value == expected
+    assert repaired
+
+
+@pytest.mark.parametrize("text", [
+    'Note (see [1]) {"a":1}',
+    'Here is the lesson [v2]: {"a": 1}',
+    'Use {braces} like this: {"a": 1}',
+])
+def test_brackets_in_the_preamble_are_false_starts(text):
+    assert parse_json(text, openers="{") == ({"a": 1}, False)
+
+
+def test_invalid_bracketed_preamble_is_skipped_with_any_opener():
+    assert parse_json('Here is the lesson [v2]: {"a": 1}') == ({"a": 1}, False)
+
+
+def test_stream_does_not_stop_at_a_false_start():
+    parser = JSONStreamParser(openers="{")
+    assert not parser.feed("Sure {see below}: ")
+    assert parser.feed('{"a": 1}')
+    assert parser.result() == {"a": 1}
+
+
+def test_stream_reports_completion_and_ignores_the_rest():
+    parser = JSONStreamParser()
+    assert not parser.feed('```json\n{"a": "b\\"}')
+    assert parser.feed('"}\n``` and then more')
+    assert parser.feed("{ignored}")  # still complete, input ignored
+    assert parser.result() == {"a": 'b"}'}
+
+
+def test_output_without_json_raises():
+    with pytest.raises(ValueError):
+        parse_json("I cannot help with that.")
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import updater  # noqa: E402
+from bandwidth import LinkEstimator, SyncPolicy  # noqa: E402
+from catalog import ContentCatalog  # noqa: E402
+from mirror import ContentMirror, parse_query  # noqa: E402
+
+CLOUD_LESSON = {"lesson_id": "gravity", "title": "Gravity", "concepts": ["c1"]}
+CLOUD_CONCEPT = {"id": "c1", "explain": "Gravity pulls.", "check": {"question": "?", "keywords": ["gravity"]},
+                 "videos": [{"id": "v1", "url": "http://cloud.invalid/v1.mp4"}]}
+
+
+def _serve(handler_cls):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    for d in ("lessons", "concepts", "assets/videos", "assets/thumbnails"):
+        (root / d).mkdir(parents=True)
+    db = str(root / "metadata.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE cached_content (id TEXT, type TEXT, version INTEGER, PRIMARY KEY (id, type))")
+    conn.commit()
+    conn.close()
+    catalog = ContentCatalog(db, str(root / "lessons"), str(root / "concepts"), str(root / "assets" / "videos"))
+    pulls = []
+
+    def install(kind, item_id, data, version):
+        pulls.append((kind, item_id))
+        (root / f"{kind}s" / f"{item_id}.json").write_text(json.dumps(data), encoding="utf-8")
+        conn = sqlite3.connect(db)
+        conn.execute("INSERT OR REPLACE INTO cached_content VALUES (?, ?, ?)", (item_id, kind, version))
+        conn.commit()
+        conn.close()
+
+    def sync_lesson(lesson_id, version):
+        install("concept", "c1", CLOUD_CONCEPT, 1)
+        install("lesson", lesson_id, CLOUD_LESSON, version)
+
+    def download(url, dest):
+        pulls.append(("asset", url))
+        Path(dest).write_bytes(b"video-bytes")
+        return True
+
+    m = ContentMirror(str(root), db, catalog, sync={"lesson": sync_lesson},
+                      remote_versions=lambda: {"gravity": 2}, download=download)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if not m.handle(self, path, query):
+                self.send_response(404)
+                self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server, url = _serve(Handler)
+    yield m, url, pulls
+    server.shutdown()
+
+
+@pytest.fixture
+def cloud():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body = json.dumps([{"lesson_id": "gravity", "version": 2, "source": "cloud"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server, url = _serve(Handler)
+    yield url, hits
+    server.shutdown()
+
+
+def test_parse_query_handles_the_updater_filters():
+    select, filters = parse_query("select=json_data,version&id=eq.c1&lesson_id=in.(a,%22b%22)")
+    assert select == ["json_data", "version"]
+    assert filters == {"id": {"c1"}, "lesson_id": {"a", "b"}}
+
+
+def test_lessons_are_pulled_once_then_served_locally(mirror):
+    m, _, pulls = mirror
+    assert m.query("delivery_lessons", "select=lesson_id,version") == [{"lesson_id": "gravity", "version": 2}]
+
+    rows = m.query("delivery_lessons", "lesson_id=eq.gravity&select=json_data")
+    assert rows == [{"json_data": CLOUD_LESSON}]
+    assert m.query("delivery_concepts", "id=eq.c1&select=json_data,version") == [{"json_data": CLOUD_CONCEPT, "version": 1}]
+    m.query("delivery_lessons", "lesson_id=eq.gravity&select=json_data")
+    assert pulls == [("concept", "c1"), ("lesson", "gravity")]
+
+
+def test_updater_uses_the_mirror_over_loopback(mirror, cloud, tmp_path, monkeypatch):
+    _, mirror_url, pulls = mirror
+    cloud_url, cloud_hits = cloud
+    monkeypatch.setattr(updater, "SUPABASE_URL", cloud_url)
+    monkeypatch.setattr(updater, "MIRROR_URL", mirror_url)
+    # Keep the download bookkeeping off the repository's metadata.db
+    monkeypatch.setattr(updater, "DB_PATH", str(tmp_path / "client" / "metadata.db"))
+    monkeypatch.setattr(updater, "sync_policy", SyncPolicy(LinkEstimator(), str(tmp_path / "client" / "metadata.db")))
+
+    res = updater.rest_get(f"{cloud_url}/rest/v1/delivery_lessons?lesson_id=eq.gravity&select=json_data")
+    assert res.json() == [{"json_data": CLOUD_LESSON}]
+    # Not something the mirror serves: falls through to the cloud
+    assert updater.rest_get(f"{cloud_url}/rest/v1/delivery_subjects?course_id=eq.x").json()[0]["source"] == "cloud"
+    assert len(cloud_hits) == 1
+
+    # Two classroom devices fetch the same video; the uplink is used once
+    monkeypatch.setattr(updater, "ASSETS_DIR", str(tmp_path / "client" / "assets"))
+    for device in ("a", "b"):
+        dest = tmp_path / "client" / "assets" / "videos" / "v1.mp4"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        assert updater.download_file("http://cloud.invalid/v1.mp4", str(dest))
+        assert dest.read_bytes() == b"video-bytes"
+    assert pulls.count(("asset", "http://cloud.invalid/v1.mp4")) == 1
+
+
+def test_updater_falls_back_to_the_cloud_when_the_mirror_is_down(cloud, monkeypatch):
+    cloud_url, cloud_hits = cloud
+    monkeypatch.setattr(updater, "SUPABASE_URL", cloud_url)
+    monkeypatch.setattr(updater, "MIRROR_URL", "http://127.0.0.1:9")
+    res = updater.rest_get(f"{cloud_url}/rest/v1/delivery_lessons?select=lesson_id,version")
+    assert res.json()[0]["source"] == "cloud"
+    assert cloud_hits == ["/rest/v1/delivery_lessons?select=lesson_id,version"]
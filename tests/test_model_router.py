@@ -0,0 +1,107 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import model_router  # noqa: E402
+
+
+def test_slow_primary_is_hedged_and_fallback_wins():
+    release = threading.Event()
+    router = model_router.ModelRouter(["slow", "fast"], default_hedge_delay=0.05)
+
+    def send(model):
+        if model == "slow":
+            release.wait(5)
+            return "late"
+        return "quick"
+
+    try:
+        assert router.call(send) == ("fast", "quick")
+    finally:
+        release.set()
+
+
+def test_running_loser_is_told_to_stop_and_not_counted_as_failure():
+    stopped = threading.Event()
+    router = model_router.ModelRouter(["slow", "fast"], default_hedge_delay=0.05)
+
+    def send(model):
+        if model == "slow":
+            while not model_router.cancelled():
+                threading.Event().wait(0.01)
+            stopped.set()
+            raise model_router.Cancelled("lost")
+        return "quick"
+
+    assert router.call(send) == ("fast", "quick")
+    assert stopped.wait(2)
+    assert router.stats()["slow"]["samples"] == 0
+
+
+def test_hedges_are_not_starved_by_concurrent_callers():
+    release = threading.Event()
+    router = model_router.ModelRouter(["slow", "fast"], default_hedge_delay=0.05)
+
+    def send(model):
+        if model == "slow":
+            release.wait(5)
+            return "late"
+        return "quick"
+
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(router.call(send))) for _ in range(10)]
+    try:
+        for t in callers:
+            t.start()
+        for t in callers:
+            t.join(3)
+        assert results == [("fast", "quick")] * 10
+    finally:
+        release.set()
+
+
+def test_failed_primary_falls_back_without_waiting():
+    router = model_router.ModelRouter(["a", "b"], default_hedge_delay=30)
+
+    def send(model):
+        if model == "a":
+            raise RuntimeError("quota")
+        return "ok"
+
+    assert router.call(send) == ("b", "ok")
+    assert router.stats()["a"]["error_rate"] == 1.0
+
+
+def test_all_models_failing_raises_with_every_error():
+    router = model_router.ModelRouter(["a", "b"], default_hedge_delay=30)
+
+    def send(model):
+        raise RuntimeError(f"{model} down")
+
+    with pytest.raises(model_router.AllModelsFailed) as exc:
+        router.call(send)
+    assert [m for m, _ in exc.value.errors] == ["a", "b"]
+
+
+def test_unhealthy_models_move_to_the_back_and_p95_sets_hedge_delay(monkeypatch):
+    router = model_router.ModelRouter(["a", "b"])
+    for _ in range(model_router.MIN_SAMPLES):
+        router.record("a", 0.1, False)
+        router.record("b", 2.0, True)
+
+    assert router.ordered_models() == ["b", "a"]
+    assert router.hedge_delay("b") == 2.0
+    assert router.hedge_delay("a") == router.default_hedge_delay
+
+
+def test_models_from_env(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", "x, y ,p")
+    assert model_router.models_from_env("p") == ["p", "x", "y"]
+    monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", "")
+    assert model_router.models_from_env("p") == ["p"]
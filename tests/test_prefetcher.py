@@ -0,0 +1,123 @@
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from bandwidth import LinkEstimator, SyncPolicy  # noqa: E402
+from prefetcher import LessonPrefetcher  # noqa: E402
+
+CURRICULA = {
+    "physics": ["p1", "p2", "p3", "p4", "p5"],
+    "maths": ["m1", "m2", "m3"],
+}
+
+
+def _ago(minutes):
+    return (datetime.now() - timedelta(minutes=minutes)).isoformat()
+
+
+@pytest.fixture
+def setup(tmp_path):
+    db = str(tmp_path / "metadata.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE cached_content (id TEXT, type TEXT, version INTEGER, PRIMARY KEY (id, type))")
+    conn.commit()
+    conn.close()
+
+    progress_db = str(tmp_path / "progress.db")
+    conn = sqlite3.connect(progress_db)
+    conn.execute("CREATE TABLE user_progress (user_id TEXT, item_id TEXT, item_type TEXT, status TEXT, "
+                 "last_updated TEXT, PRIMARY KEY (user_id, item_id))")
+    conn.commit()
+    conn.close()
+
+    policy = SyncPolicy(LinkEstimator(), db)
+    synced = []
+
+    def sync_lesson(lesson_id, version):
+        synced.append((lesson_id, version, policy.in_background()))
+        conn = sqlite3.connect(db)
+        conn.execute("INSERT OR REPLACE INTO cached_content VALUES (?, 'lesson', ?)", (lesson_id, version))
+        conn.commit()
+        conn.close()
+
+    versions = {l: 1 for order in CURRICULA.values() for l in order}
+
+    def progress(*rows):
+        conn = sqlite3.connect(progress_db)
+        conn.executemany("INSERT OR REPLACE INTO user_progress VALUES (?, ?, 'lesson', ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    prefetcher = LessonPrefetcher(db, progress_db, sync_lesson, lambda: versions, lambda: CURRICULA, policy,
+                                  lookahead=2)
+    return prefetcher, progress, synced, versions
+
+
+def test_predicts_next_lessons_in_curriculum_order(setup):
+    prefetcher, progress, _, _ = setup
+    progress(("u1", "p2", "completed", _ago(5)))
+    assert prefetcher.predict() == ["p3", "p4"]
+
+
+def test_in_progress_lesson_counts_as_next(setup):
+    prefetcher, progress, _, _ = setup
+    progress(("u1", "p1", "completed", _ago(10)), ("u1", "p2", "in_progress", _ago(1)))
+    assert prefetcher.predict() == ["p2", "p3"]
+
+
+def test_every_learners_next_lesson_comes_first(setup):
+    prefetcher, progress, _, _ = setup
+    progress(("u1", "p1", "completed", _ago(1)), ("u2", "m1", "completed", _ago(5)),
+             ("u3", "p4", "completed", _ago(60 * 24 * 90)))
+    # u3 hasn't been active for months and isn't planned for
+    assert prefetcher.predict() == ["p2", "m2", "p3", "m3"]
+
+
+def test_run_once_syncs_missing_lessons_in_background(setup):
+    prefetcher, progress, synced, versions = setup
+    progress(("u1", "p1", "completed", _ago(1)))
+    assert prefetcher.run_once() == ["p2", "p3"]
+    assert synced == [("p2", 1, True), ("p3", 1, True)]
+    # Installed at the current version: nothing left to do
+    assert prefetcher.run_once() == []
+    versions["p3"] = 2
+    assert prefetcher.run_once() == ["p3"]
+
+
+def test_run_once_respects_max_per_run_and_offline(setup):
+    prefetcher, progress, synced, _ = setup
+    progress(("u1", "p1", "completed", _ago(1)), ("u2", "m1", "completed", _ago(2)))
+    prefetcher.max_per_run = 1
+    assert prefetcher.run_once() == ["p2"]
+
+    def offline():
+        raise ConnectionError("no route to host")
+
+    prefetcher.remote_versions = offline
+    assert prefetcher.run_once() == []
+    assert len(synced) == 1
+
+
+def test_status_reports_the_last_pass_without_fetching(setup):
+    prefetcher, progress, _, _ = setup
+
+    def unreachable():
+        raise AssertionError("status must not touch the network")
+
+    prefetcher.curricula = unreachable
+    assert prefetcher.status()["upcoming"] is None
+
+    prefetcher.curricula = lambda: CURRICULA
+    progress(("u1", "p1", "completed", _ago(1)))
+    prefetcher.run_once()
+    prefetcher.curricula = unreachable
+    status = prefetcher.status()
+    assert status["upcoming"] == ["p2", "p3"]
+    assert status["last_run"]["synced"] == ["p2", "p3"]
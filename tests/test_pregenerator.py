@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+from jobs import JobManager  # noqa: E402
+from lesson_variants import LessonVariantStore  # noqa: E402
+from pregenerator import VariantPregenerator  # noqa: E402
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+@pytest.fixture
+def setup(tmp_path):
+    lessons = tmp_path / "lessons"
+    concepts = tmp_path / "concepts"
+    lessons.mkdir()
+    concepts.mkdir()
+    for lid, cid in (("easy", "c_easy"), ("hard", "c_hard")):
+        _write(lessons / f"{lid}.json", {"lesson_id": lid, "title": lid, "concepts": [cid]})
+        _write(concepts / f"{cid}.json", {"id": cid, "explain": lid})
+
+    mastery_db = tmp_path / "mastery.db"
+    conn = sqlite3.connect(mastery_db)
+    conn.execute("CREATE TABLE local_mastery (user_id TEXT, concept_id TEXT, mastery_probability REAL, last_updated TEXT)")
+    conn.executemany("INSERT INTO local_mastery VALUES (?, ?, ?, '')", [
+        ("u1", "c_hard", 0.1), ("u2", "c_hard", 0.2),
+        ("u1", "c_easy", 0.95), ("u2", "c_easy", 0.3),
+    ])
+    conn.commit()
+    conn.close()
+
+    store = LessonVariantStore(str(lessons), str(concepts), str(tmp_path / "meta.db"))
+    calls = []
+
+    def generate(source, mode):
+        calls.append((source["lesson_id"], mode))
+        return {"title": mode, "concepts": source["concepts"]}
+
+    def make(**kwargs):
+        kwargs.setdefault("idle_seconds", 0)
+        kwargs.setdefault("min_interval", 0)
+        kwargs.setdefault("online_check", lambda: True)
+        return VariantPregenerator(store, JobManager(max_workers=1), generate, "m1",
+                                   str(mastery_db), str(tmp_path / "meta.db"), **kwargs)
+    return make, calls
+
+
+def test_struggling_lessons_get_beginner_first(setup):
+    make, _ = setup
+    pregen = make()
+    assert pregen.candidates() == [
+        (2, "hard", "beginner"),
+        (1, "easy", "beginner"),
+        (1, "easy", "advance"),
+        (0, "hard", "advance"),
+    ]
+
+
+def test_run_once_builds_variants_and_skips_cached(setup):
+    make, calls = setup
+    pregen = make()
+
+    job = pregen.run_once()
+    assert job["status"] == "done"
+    assert job["result"] == {"lesson_id": "hard_beginner", "cached": False}
+    assert calls == [("hard", "Beginner")]
+
+    # Generated variants are neither re-queued nor treated as roots
+    assert (2, "hard", "beginner") not in pregen.candidates()
+    assert all(lid != "hard_beginner" for _, lid, _ in pregen.candidates())
+    assert pregen.budget_used() == 1
+
+
+def test_gates_stop_generation(setup):
+    make, calls = setup
+
+    assert make(online_check=lambda: False).run_once() is None
+    assert make(idle_seconds=3600).run_once() is None
+    assert make(daily_budget=0).run_once() is None
+
+    limited = make(daily_budget=1, min_interval=3600)
+    assert limited.run_once() is not None
+    # Both the interval and the persisted daily budget now block further work
+    assert limited.run_once() is None
+    assert make(daily_budget=1).run_once() is None
+    assert len(calls) == 1
+
+
+def test_failed_lesson_backs_off_and_next_candidate_runs(setup, tmp_path):
+    make, calls = setup
+    pregen = make()
+    real_generate = pregen.generate
+
+    def flaky(source, mode):
+        if source["lesson_id"] == "hard":
+            calls.append((source["lesson_id"], mode))
+            raise RuntimeError("model refused")
+        return real_generate(source, mode)
+
+    pregen.generate = flaky
+    assert pregen.run_once()["status"] == "failed"
+    assert (2, "hard", "beginner") not in pregen.candidates()
+
+    job = pregen.run_once()
+    assert job["status"] == "done"
+    assert calls == [("hard", "Beginner"), ("easy", "Beginner")]
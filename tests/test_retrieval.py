@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ENGINE_DIR = BASE_DIR / "engine"
+sys.path.insert(0, str(ENGINE_DIR))
+
+import retrieval  # noqa: E402
+
+
+def test_chunk_text_covers_every_word_once_beyond_overlap():
+    text = " ".join(f"w{i}" for i in range(250)) + "\n\ntail words here"
+    chunks = retrieval.chunk_text(text, "doc", max_words=100, overlap=10)
+
+    assert [c["position"] for c in chunks] == list(range(len(chunks)))
+    assert chunks[0]["text"].split()[0] == "w0"
+    assert chunks[-1]["text"].endswith("tail words here")
+    joined = set(" ".join(c["text"] for c in chunks).split())
+    assert {f"w{i}" for i in range(250)} <= joined
+
+
+def test_bm25_ranks_matching_chunk_first():
+    chunks = [
+        {"source": "doc", "position": 0, "text": "Plants use sunlight to make food."},
+        {"source": "doc", "position": 1, "text": "Gravity pulls objects toward the Earth."},
+        {"source": "doc", "position": 2, "text": "Fractions have a numerator and denominator."},
+    ]
+    top = retrieval.BM25Index(chunks).search("why does gravity pull objects", top_k=1)
+    assert top[0][1]["position"] == 1
+
+
+def test_build_context_respects_token_budget():
+    filler = "\n\n".join(f"Paragraph {i} talks about unrelated history topics." for i in range(200))
+    doc = filler + "\n\nPhotosynthesis converts light energy into chemical energy in chlorophyll."
+
+    small = retrieval.build_context("what is photosynthesis", "short lesson", "tiny doc", token_budget=100)
+    assert small == {"lesson": "short lesson", "document": "tiny doc"}
+
+    ctx = retrieval.build_context("what is photosynthesis", None, doc, top_k=3, token_budget=120)
+    assert "Photosynthesis converts light" in ctx["document"]
+    assert retrieval.estimate_tokens(ctx["document"]) <= 130
+    assert ctx["lesson"] == ""
+
+
+def test_build_context_compares_stored_document_relative_to_its_own_scores():
+    # The stored document's larger corpus gives its matches far higher raw BM25 scores
+    doc_chunks = [{"source": "document", "position": i,
+                   "text": "Photosynthesis happens in leaves." if i < 3 else f"Unrelated history fact {i}."}
+                  for i in range(30)]
+    lesson = "Photosynthesis makes glucose from light, water and carbon dioxide."
+    ctx = retrieval.build_context("photosynthesis", lesson, None, retrieval.BM25Index(doc_chunks),
+                                  top_k=2, token_budget=500)
+    assert ctx["lesson"] == lesson
+    assert "Photosynthesis happens in leaves." in ctx["document"]